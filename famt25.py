@@ -8,6 +8,8 @@ from tikz import *
 import tikz_presentations_aliaume as tpa
 
 from tikz_presentations_aliaume.components.utils import *
+from tikz_presentations_aliaume.components.qr import QRCode
+from tikz_presentations_aliaume.geometry import brace, raised, snake
 from tikz_presentations_aliaume.components.graphs import *
 
 import yaml
@@ -55,7 +57,7 @@ class TitleFrame:
         pic.draw((0, -1.5), node("University of Warsaw", anchor="center"))
         pic.draw((0, -3), node(f"Les Houches", anchor="center", font="\\Large"))
         pic.draw((0, -3.5), node(f"FMT'25, 2025-05-29", anchor="center"))
-        pic.draw((6, -2), node(r"\qrcode{https://www.irif.fr/~alopez/}"))
+        QRCode("https://www.irif.fr/~alopez/", at=(6, -2)).draw(pic)
         pic.draw((6, -3.5), node(r"\url{https://www.irif.fr/~alopez/}"))
 
         logos = [
@@ -843,14 +845,15 @@ class MonoidTree:
         )
         pic.node("Leaves", at=(0, -0.7))
 
-        pic.node(r"$x$", name="X", at=(-2, 0))
+        x, y, z, r = (-2, 0), (2, 0), (0, 2), (0, 4)
+        pic.node(r"$x$", name="X", at=x)
 
-        pic.node(r"$y$", name="Y", at=(2, 0))
+        pic.node(r"$y$", name="Y", at=y)
 
         if self.show_lcm:
-            pic.node(r"$x \land y$", name="Z", at=(0, 2))
+            pic.node(r"$x \land y$", name="Z", at=z)
 
-        pic.node(r"root", name="R", at=(0, 4))
+        pic.node(r"root", name="R", at=r)
 
         if self.show_mon:
             pic.node(r"$m_x$", at=(-1.3, 1.3))
@@ -858,11 +861,9 @@ class MonoidTree:
             pic.node(r"$m_z$", at=(0.5, 3))
 
         if self.show_lcm:
-            pic.draw("(X)", topath("(Z)"), opt="->", decorate=True, decoration="snake")
-
-            pic.draw("(Y)", topath("(Z)"), opt="->", decorate=True, decoration="snake")
-
-            pic.draw("(Z)", topath("(R)"), opt="->", decorate=True, decoration="snake")
+            # snakes computed once, stopping at the node borders
+            for a, b in [(x, z), (y, z), (z, r)]:
+                pic.draw(snake(a, b, trim_start=0.3, trim_end=0.3), opt="->")
         if self.show_edg:
             pic.node(
                 r"$E(x,y) \iff (m_x, m_z, m_y) \in P$",
@@ -1040,13 +1041,15 @@ class NumberedTree:
         pic.node("$k$", at="(N3)", xshift="-0.3cm")
 
         pic.draw(
-            r"(-0.2,3.5) -- (-0.2,4.5) node[midway,xshift=3.5em]{$> k$}",
-            opt="decorate,decoration={brace,amplitude=5pt,mirror,raise=4ex}",
+            brace((-0.2, 3.5), (-0.2, 4.5), mirror=True),
+            shift=raised((-0.2, 3.5), (-0.2, 4.5), "4ex", True),
         )
+        pic.path(r"(-0.2,3.5) -- (-0.2,4.5) node[midway,xshift=3.5em]{$> k$}")
         pic.draw(
-            r"(-0.2,1.5) -- (-0.2,2.5) node[midway,xshift=3.5em]{$> k$}",
-            opt="decorate,decoration={brace,amplitude=5pt,mirror,raise=4ex}",
+            brace((-0.2, 1.5), (-0.2, 2.5), mirror=True),
+            shift=raised((-0.2, 1.5), (-0.2, 2.5), "4ex", True),
         )
+        pic.path(r"(-0.2,1.5) -- (-0.2,2.5) node[midway,xshift=3.5em]{$> k$}")
 
         if self.show_emb:
             pic.node("$k$", at="(M1)", xshift="0.3cm")
@@ -1057,12 +1060,20 @@ class NumberedTree:
             y3 = 1.5 * 0.4
             y4 = 6.5 * 0.4
             pic.draw(
-                f"(3,{y1}) -- (3,{y2})" + r" node[midway,xshift=3.5em]{$\geq k$}",
-                opt="decorate,decoration={brace,amplitude=5pt,mirror,raise=4ex},A5",
+                brace((3, y1), (3, y2), mirror=True),
+                shift=raised((3, y1), (3, y2), "4ex", True),
+                color="A5",
+            )
+            pic.path(
+                f"(3,{y1}) -- (3,{y2})" + r" node[midway,xshift=3.5em,A5]{$\geq k$}"
             )
             pic.draw(
-                f"(3,{y3}) -- (3,{y4})" + r" node[midway,xshift=3.5em]{$\geq k$}",
-                opt="decorate,decoration={brace,amplitude=5pt,mirror,raise=4ex},A5",
+                brace((3, y3), (3, y4), mirror=True),
+                shift=raised((3, y3), (3, y4), "4ex", True),
+                color="A5",
+            )
+            pic.path(
+                f"(3,{y3}) -- (3,{y4})" + r" node[midway,xshift=3.5em,A5]{$\geq k$}"
             )
 
         if self.show_mon:
@@ -1289,19 +1300,11 @@ class FinalSlide:
         yield (0, self)
 
 
-if __name__ == "__main__":
-    tc = TableOfColors()
+def deck():
+    tc = TableOfColors()  # noqa: F841
     tt = TitleFrame()
 
-    cfg = PresConfig(
-        title="Well-Quasi-Orders and Logic on Graphs",
-        author="Aliaume Lopez",
-        location="Les Houches",
-        date="2025-05-29",
-        draft=False,
-    )
-
-    hg = HalfGraph(3, 3)
+    hg = HalfGraph(3, 3)  # noqa: F841
 
     ws = WqoSeq(
         points=[
@@ -1365,7 +1368,7 @@ if __name__ == "__main__":
 
     st = WqoStatus()
 
-    hgg = SequenceOfHG.from_dims([(4, 3), (2, 5), (3, 3), (3, 7)], 2, 4)
+    hgg = SequenceOfHG.from_dims([(4, 3), (2, 5), (3, 3), (3, 7)], 2, 4)  # noqa: F841
 
     frames_list = [
         tt,
@@ -1380,6 +1383,18 @@ if __name__ == "__main__":
         FinalSlide(),
     ]
 
-    frames = Sequential(frames_list, pos=0)
+    return Sequential(frames_list, pos=0)
+
+
+if __name__ == "__main__":
+    cfg = PresConfig(
+        title="Well-Quasi-Orders and Logic on Graphs",
+        author="Aliaume Lopez",
+        location="Les Houches",
+        date="2025-05-29",
+        draft=False,
+    )
+
+    frames = deck()
 
     cfg.preview(frames)
@@ -12,6 +12,8 @@ from tikz import *
 import tikz_presentations_aliaume as tpa
 
 from tikz_presentations_aliaume.components.utils import *
+from tikz_presentations_aliaume.components.qr import QRCode
+from tikz_presentations_aliaume.preamble import need
 
 import yaml
 
@@ -75,7 +77,7 @@ class TitleFrame:
             pic.draw((0, -1.5), node("Université de Varsovie", anchor="center"))
             pic.draw((0, -3), node(f"à {LOCATION}", anchor="center", font="\\Large"))
             pic.draw((0, -3.5), node(f"le {DATE}", anchor="center"))
-            pic.draw((6, -2), node(r"\qrcode{https://www.irif.fr/~alopez/}"))
+            QRCode("https://www.irif.fr/~alopez/", at=(6, -2)).draw(pic)
             pic.draw((6, -3.5), node(r"\url{https://www.irif.fr/~alopez/}"))
 
             logos = [
@@ -902,6 +904,7 @@ class WQOWorks:
 @dataclasses.dataclass
 class AutomateOdd:
     def draw(self, autosc):
+        need("automata")
         autosc.node(r"$q_0$", name="q0", at=(-1, 0), state=True, initial=True)
 
         autosc.node(r"$q_1$", name="q1", at=(1, 0), state=True, accepting=True)
@@ -3206,13 +3209,14 @@ class Conclusion:
 
 # create a presentation
 
-if __name__ == "__main__":
-    tc = TableOfColors()
+
+def deck():
+    tc = TableOfColors()  # noqa: F841
 
     tf = TitleFrame(with_name=True)
     qs = QuiSuisJe(bib=Bibliometrie())
 
-    wqo = WQOWorks(
+    wqo = WQOWorks(  # noqa: F841
         nsquare=NSquareWqo(
             points=[(7, 3), (8, 2), (0, 8)],
             grid_size=10,
@@ -3220,18 +3224,18 @@ if __name__ == "__main__":
         utilite=WqoUtilite(),
     )
 
-    auto = AutomatesTransducteurs()
+    auto = AutomatesTransducteurs()  # noqa: F841
 
     rs = Research.default()
     te = Teaching()
     pr = Project.default()
-    pip = PipelineIngestion()
-    pstr = ProjetSystTrans()
-    pipl = ProjetPipeline()
+    pip = PipelineIngestion()  # noqa: F841
+    pstr = ProjetSystTrans()  # noqa: F841
+    pipl = ProjetPipeline()  # noqa: F841
 
     it = Integration.default()
 
-    dv = LosTarskiFiniteClasses.default()
+    dv = LosTarskiFiniteClasses.default()  # noqa: F841
 
     co = Conclusion()
 
@@ -3246,7 +3250,11 @@ if __name__ == "__main__":
         co,
     ]
 
-    frames = Sequential(frames_list, pos=0)
+    return Sequential(frames_list, pos=0)
+
+
+if __name__ == "__main__":
+    frames = deck()
 
     # preview_animation(frames)
     with open("preview.tex", "w") as f:
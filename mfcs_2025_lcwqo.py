@@ -65,16 +65,14 @@ class Edge:
     def target_name(self) -> str:
         return self.target.name if isinstance(self.target, Vertex) else self.target
 
+    def segment(self) -> EdgeSpec:
+        """source, target and options, as expected by draw_edges"""
+        extra = self._extra | ({"->": "true"} if self.directed else {})
+        eprops = {"label": self.label or "", "color": self.color, **extra}
+        return (self.source_name, self.target_name, eprops, {})
+
     def draw(self, pic: Picture):
-        if self.directed:
-            self._extra["->"] = "true"
-        pic.draw(
-            f"({self.source_name})",
-            topath(f"({self.target_name})"),
-            label=self.label or "",
-            color=self.color,
-            **self._extra,
-        )
+        draw_edges(pic, [self.segment()])
 
     def __iter__(self):
         yield (0, self)
@@ -137,8 +135,7 @@ class Graph:
         for v in self.vertices:
             v.draw(pic)
 
-        for e in self.edges:
-            e.draw(pic)
+        draw_edges(pic, [e.segment() for e in self.edges])
 
     def map(
         self, vfunc: Callable[[int, Vertex], Vertex], efunc: Callable[[int, Edge], Edge]
@@ -1701,12 +1698,12 @@ class Conclusion:
         yield (0, self)
 
 
-if __name__ == "__main__":
+def deck():
     tc = TableOfColors()
     tt = TitleFrame()
     ic = InducedGraph()
     fl = FreelyLabeled()
-    gs = GoodSequence()
+    gs = GoodSequence()  # noqa: F841
     wo = WellQuasiOrders()
     wd = WhyDoWeCare()
     rw = RelatedWork()
@@ -1715,6 +1712,14 @@ if __name__ == "__main__":
     ps = ProofSketch()
     cc = Conclusion()
 
+    frames_list = [tt, ic, fl, wo, wd, rw, nl, rs, ps, cc]
+
+    tmp_list = [tc, ps]  # noqa: F841
+
+    return Sequential(frames_list, pos=0)
+
+
+if __name__ == "__main__":
     cfg = PresConfig(
         title="Labelled Well Quasi Ordered Classes of Bounded Linear Clique-Width",
         author="Aliaume Lopez",
@@ -1723,10 +1728,6 @@ if __name__ == "__main__":
         draft=False,
     )
 
-    frames_list = [tt, ic, fl, wo, wd, rw, nl, rs, ps, cc]
-
-    tmp_list = [tc, ps]
-
-    frames = Sequential(frames_list, pos=0)
+    frames = deck()
 
     cfg.preview(frames)
@@ -8,6 +8,7 @@ from tikz import *
 import tikz_presentations_aliaume as tpa
 
 from tikz_presentations_aliaume.components.utils import *
+from tikz_presentations_aliaume.components.qr import QRCode
 from tikz_presentations_aliaume.components.graphs import *
 
 import yaml
@@ -51,7 +52,7 @@ class TitleFrame:
         pic.draw((0, -1.5), node("University of Warsaw", anchor="center"))
         pic.draw((0, -3), node(f"Paris", anchor="center", font="\\Large"))
         pic.draw((0, -3.5), node(f"Séminaire automates, 2025-06-13", anchor="center"))
-        pic.draw((6, -2), node(r"\qrcode{https://www.irif.fr/~alopez/}"))
+        QRCode("https://www.irif.fr/~alopez/", at=(6, -2)).draw(pic)
         pic.draw((6, -3.5), node(r"\url{https://www.irif.fr/~alopez/}"))
 
         logos = [
@@ -1682,29 +1683,18 @@ class Conclusion:
             text_width="8cm",
         )
 
-        pic.node(
-            r"\qrcode{https://github.com/AliaumeL/polyregular-model-checking}",
-            at=(0, -2),
-            anchor="center",
-            font="\\large",
-        )
+        QRCode(
+            "https://github.com/AliaumeL/polyregular-model-checking", at=(0, -2)
+        ).draw(pic)
 
     def __iter__(self):
         yield (0, self)
 
 
-if __name__ == "__main__":
-    tc = TableOfColors()
+def deck():
+    tc = TableOfColors()  # noqa: F841
     tt = TitleFrame()
 
-    cfg = PresConfig(
-        title="Polyczek",
-        author="Aliaume Lopez",
-        location="IRIF",
-        date="2025-06-13",
-        draft=False,
-    )
-
     architecture = Architecture.default()
 
     frames_list = [
@@ -1778,6 +1768,18 @@ if __name__ == "__main__":
         Conclusion(),
     ]
 
-    frames = Sequential(frames_list, pos=0)
+    return Sequential(frames_list, pos=0)
+
+
+if __name__ == "__main__":
+    cfg = PresConfig(
+        title="Polyczek",
+        author="Aliaume Lopez",
+        location="IRIF",
+        date="2025-06-13",
+        draft=False,
+    )
+
+    frames = deck()
 
     cfg.preview(frames)
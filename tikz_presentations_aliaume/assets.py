@@ -0,0 +1,88 @@
+"""
+Sub-drawings compiled once.
+
+``drawing_to_node`` and ``AnimateAndThenMinimize`` embed a whole nested
+tikzpicture in the frames that show a reduced drawing, so the same
+picture is typeset again on every such frame. When assets are enabled,
+the nested picture is instead written to a standalone document named
+after the hash of its code, compiled once to ``ASSET_DIR/<hash>.pdf``,
+and the frames include that PDF as an image. Snippets already present
+on disk are reused across builds.
+
+Pictures whose code refers to the rest of the document (links, labels,
+citations) are kept inline, as they cannot be resolved in a snippet.
+"""
+
+import hashlib
+import os
+import subprocess
+from typing import Dict, Optional
+
+from tikz_presentations_aliaume import preamble
+
+ASSET_DIR = "assets"
+
+# commands that need the main document to be typeset correctly
+DOCUMENT_REFERENCES = ("\\hyperlink", "\\hypertarget", "\\label", "\\ref", "\\cite")
+
+SNIPPET = r"""{header}
+\begin{{document}}
+{code}
+\end{{document}}
+"""
+
+ENABLED = False
+
+# hash -> snippet document, waiting to be compiled
+PENDING: Dict[str, str] = {}
+
+
+def set_assets(enabled: bool):
+    global ENABLED
+    ENABLED = enabled
+
+
+def asset_path(key: str) -> str:
+    return os.path.join(ASSET_DIR, key + ".pdf")
+
+
+def include(code: str, size: float) -> Optional[str]:
+    """node contents showing a compiled picture, None to keep it inline"""
+    if not ENABLED or any(ref in code for ref in DOCUMENT_REFERENCES):
+        return None
+    header = preamble.assemble(preamble.detect(code))
+    document = SNIPPET.format(header=header, code=code)
+    key = hashlib.sha1(document.encode()).hexdigest()[:16]
+    if not os.path.exists(asset_path(key)):
+        PENDING[key] = document
+    return f"\\includegraphics[width={size:0.2f}cm]{{{asset_path(key)}}}"
+
+
+def compile_pending(engine: str = "xelatex"):
+    """compile the snippets requested since the last call"""
+    if not PENDING:
+        return
+    os.makedirs(ASSET_DIR, exist_ok=True)
+    print(f"Compiling {len(PENDING)} sub-drawings")
+    for key, document in sorted(PENDING.items()):
+        source = os.path.join(ASSET_DIR, key + ".tex")
+        with open(source, "w") as f:
+            f.write(document)
+        # compiled from the current directory, where the colour scheme lives
+        result = subprocess.run(
+            [
+                engine,
+                "-interaction=nonstopmode",
+                "-halt-on-error",
+                f"-output-directory={ASSET_DIR}",
+                source,
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(
+                f"could not compile sub-drawing {key}, "
+                f"see {os.path.join(ASSET_DIR, key + '.log')}"
+            )
+    PENDING.clear()
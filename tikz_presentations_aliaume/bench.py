@@ -0,0 +1,245 @@
+"""
+Benchmark of the drawing backends.
+
+Draws and serialises every frame of the decks, once through pytikz
+pictures and once through the compact representation of ir.py, and
+reports the time spent and the amount of TikZ code produced.
+
+``--pdf N`` benchmarks the assembly of compiled frames instead (see
+pdf.py) on N synthetic frames shaped like those xdvipdfmx writes: every
+frame links to every other one through named destinations, and they
+share an image and a font subsetted under random tags. The merged
+document is read back, with and without object streams, and checked:
+links go to their pages, destinations are in the name tree, the image
+and each font are written once.
+
+Run from the repository root:
+
+    uv run python -m tikz_presentations_aliaume.bench
+    uv run python -m tikz_presentations_aliaume.bench --pdf 300
+"""
+
+import argparse
+import importlib
+import random
+import time
+from typing import List, Tuple
+
+from tikz_presentations_aliaume import pdf
+from tikz_presentations_aliaume.components import utils
+
+DECKS = ["mcf_bordeaux", "famt25", "mfcs_2025_lcwqo", "polyczek"]
+
+
+def render(states: list, native: bool) -> int:
+    """draw and serialise all states, returns the size of the code"""
+    utils.NATIVE_IR = native
+    size = 0
+    for _, state in states:
+        pic = utils.new_picture()
+        state.draw(pic)
+        size += len(pic.code())
+    return size
+
+
+def measure(states: list, native: bool, repeat: int) -> Tuple[float, int]:
+    best = float("inf")
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = render(states, native)
+        best = min(best, time.perf_counter() - start)
+    return best, size
+
+
+def synthetic_frame(
+    number: int, frames: int, image: bytes, font: bytes, rng: random.Random
+) -> bytes:
+    """a compiled frame linking to every frame, pages numbered from 1"""
+    N = pdf.Name
+    writer = pdf.Writer()
+    tree, page = writer.reserve(), writer.reserve()
+    links = [
+        writer.add(
+            {
+                N("Type"): N("Annot"),
+                N("Subtype"): N("Link"),
+                N("Rect"): [target, 0, target + 1, 10],
+                N("A"): {
+                    N("S"): N("GoTo"),
+                    N("D"): pdf.String(b"page.%d" % target),
+                },
+            }
+        )
+        for target in range(1, frames + 1)
+    ]
+    # two subsets of the font, each under a tag of its own in every frame
+    tag = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(6))
+    glyphs = font if number % 3 else font[: len(font) // 2]
+    descriptor = writer.add(
+        {
+            N("Type"): N("FontDescriptor"),
+            N("FontName"): N(f"{tag}+EBGaramond"),
+            N("FontFile2"): writer.add(pdf.Stream({}, glyphs)),
+        }
+    )
+    subset = writer.add(
+        {
+            N("Type"): N("Font"),
+            N("Subtype"): N("Type0"),
+            N("BaseFont"): N(f"{tag}+EBGaramond-Identity-H"),
+            N("DescendantFonts"): [
+                writer.add(
+                    {
+                        N("Type"): N("Font"),
+                        N("Subtype"): N("CIDFontType2"),
+                        N("BaseFont"): N(f"{tag}+EBGaramond"),
+                        N("FontDescriptor"): descriptor,
+                    }
+                )
+            ],
+        }
+    )
+    picture = writer.add(
+        pdf.Stream(
+            {
+                N("Type"): N("XObject"),
+                N("Subtype"): N("Image"),
+                N("Filter"): N("DCTDecode"),
+            },
+            image,
+        )
+    )
+    content = b"q /Im1 Do Q BT /F1 12 Tf (frame %d) Tj ET" % number
+    writer.set(
+        page,
+        {
+            N("Type"): N("Page"),
+            N("Parent"): tree,
+            N("MediaBox"): [0, 0, 100, 100],
+            N("Annots"): links,
+            N("Contents"): writer.add(pdf.encode({}, content)),
+            N("Resources"): {
+                N("Font"): {N("F1"): subset},
+                N("XObject"): {N("Im1"): picture},
+            },
+        },
+    )
+    writer.set(tree, {N("Type"): N("Pages"), N("Kids"): [page], N("Count"): 1})
+    names = writer.add(
+        {
+            N("Names"): [
+                pdf.String(b"Doc-Start"),
+                [page, N("Fit")],
+                pdf.String(b"page.%d" % number),
+                [page, N("Fit")],
+            ]
+        }
+    )
+    root = writer.add(
+        {
+            N("Type"): N("Catalog"),
+            N("Pages"): tree,
+            N("Names"): {N("Dests"): writer.add({N("Kids"): [names]})},
+        }
+    )
+    return writer.write(root)
+
+
+def check_merged(data: bytes, frames: int) -> List[str]:
+    """what is wrong with a merged synthetic deck"""
+    document = pdf.Document.read(data)
+    pages = {ref: k for k, ref in enumerate(document.pages(), 1)}
+    problems = []
+    if len(pages) != frames:
+        problems.append(f"{len(pages)} pages instead of {frames}")
+    wrong = 0
+    for ref in pages:
+        page = document.resolve(ref)
+        for link in document.resolve(page["Annots"]):
+            link = document.resolve(link)
+            target = link.get("Dest")
+            if "A" in link or pages.get(target[0]) != link["Rect"][0]:
+                wrong += 1
+    if wrong:
+        problems.append(f"{wrong} links do not go to their page")
+    named = document.destinations()
+    missing = [k for k in range(1, frames + 1) if b"page.%d" % k not in named]
+    if missing:
+        problems.append(f"{len(missing)} destinations missing")
+    images, fonts = set(), set()
+    for ref in pages:
+        resources = document.page(ref)["Resources"]
+        images.add(resources["XObject"]["Im1"])
+        fonts.add(document.resolve(resources["Font"]["F1"])["BaseFont"])
+    if len(images) != 1:
+        problems.append(f"the image is written {len(images)} times")
+    if len(fonts) != min(frames, 2):
+        problems.append(f"{len(fonts)} font subsets instead of 2")
+    return problems
+
+
+def measure_pdf(frames: int):
+    rng = random.Random(1)
+    image, font = rng.randbytes(300_000), rng.randbytes(40_000)
+    compiled = [
+        synthetic_frame(k, frames, image, font, rng) for k in range(1, frames + 1)
+    ]
+    start = time.perf_counter()
+    documents = [pdf.Document.read(data) for data in compiled]
+    read = time.perf_counter() - start
+
+    # written as the pipeline does, every few frames
+    start = time.perf_counter()
+    merger = pdf.Merger()
+    for k, document in enumerate(documents, 1):
+        merger.append(document)
+        if k % 50 == 0:
+            merger.write()
+    data = merger.write()
+    merge = time.perf_counter() - start
+    compressed = merger.write(object_streams=True)
+
+    size = sum(map(len, compiled))
+    print(
+        f"{frames} frames, {size / 1e6:.1f}MB: read {read:.2f}s,"
+        f" merged in {merge:.2f}s to {len(data) / 1e6:.1f}MB"
+        f" ({len(compressed) / 1e6:.1f}MB with object streams)"
+    )
+    for name, written in [("merged", data), ("object streams", compressed)]:
+        for problem in check_merged(written, frames):
+            print(f"{name}: {problem}")
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("decks", nargs="*", default=DECKS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--pdf", type=int, default=None, metavar="FRAMES", help="assemble frames"
+    )
+    args = parser.parse_args(argv)
+
+    if args.pdf is not None:
+        measure_pdf(args.pdf)
+        return
+
+    previous = utils.NATIVE_IR
+    print(f"{'deck':<18}{'frames':>7}{'pytikz':>11}{'native':>11}{'speedup':>9}")
+    try:
+        for name in args.decks:
+            states = list(importlib.import_module(name).deck())
+            slow, slow_size = measure(states, False, args.repeat)
+            fast, fast_size = measure(states, True, args.repeat)
+            print(
+                f"{name:<18}{len(states):>7}"
+                f"{slow * 1000:>9.1f}ms{fast * 1000:>9.1f}ms"
+                f"{slow / fast:>8.1f}x"
+                f"   ({slow_size} / {fast_size} bytes of code)"
+            )
+    finally:
+        utils.NATIVE_IR = previous
+
+
+if __name__ == "__main__":
+    main()
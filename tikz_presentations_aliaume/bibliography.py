@@ -0,0 +1,265 @@
+"""
+Bibliography rendered in Python.
+
+With biblatex, a deck showing a page of references needs a biber run
+and two more LaTeX passes. Instead, the cited entries of ``papers.bib``
+are formatted here as plain LaTeX, following the options the decks used
+with biblatex (``style=alphabetic, sorting=ydnt``):
+
+* labels are alphabetic (``Tai59``, ``BC19``, ``Ats+04``), with a
+  letter added to the labels shared by several entries;
+* entries are sorted by year, newest first, then by name and title.
+
+``\\cite{...}`` commands of the frames are replaced by their labels and
+``Bibliography`` shows the ``\\tpabibliography`` macro, defined in the
+preamble once the citations of every frame are known. Rendered lists
+are cached by hash of the bibliography file and set of cited keys.
+"""
+
+import functools
+import hashlib
+import re
+from typing import Dict, FrozenSet, List, Set, Tuple
+
+import bibtexparser
+from bibtexparser.bparser import BibTexParser
+
+from tikz_presentations_aliaume.build import BIBLIOGRAPHY
+
+# labels show the initials of up to that many names, else the first
+# three letters of the first name followed by a +
+MAX_ALPHA_NAMES = 3
+
+MACRO = "\\tpabibliography"
+
+CITE = re.compile(r"\\cite\{([^}]*)\}")
+
+# a TeX accent or letter command with its argument, or a single character
+_GLYPH = re.compile(r"\\[^a-zA-Z\s]\s*(?:\{[^}]*\}|\w)|\\[a-zA-Z]+\s*(?:\{[^}]*\})?|.")
+
+# keys added without being cited, "*" for every entry
+NOCITE: Set[str] = set()
+
+# parsed bibliography files, by hash
+_ENTRIES: Dict[str, Dict[str, dict]] = {}
+
+
+def nocite(*keys: str):
+    NOCITE.update(keys)
+
+
+def reset():
+    NOCITE.clear()
+
+
+def load(path: str = BIBLIOGRAPHY) -> str:
+    """hash of a bibliography file, parsed once"""
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha1(data).hexdigest()
+    if digest not in _ENTRIES:
+        parser = BibTexParser(common_strings=True)
+        database = bibtexparser.loads(data.decode(), parser=parser)
+        _ENTRIES[digest] = {entry["ID"]: entry for entry in database.entries}
+    return digest
+
+
+def _split(text: str, separator: str) -> List[str]:
+    """split at the separators outside braces"""
+    parts, depth, start = [], 0, 0
+    for m in re.finditer(r"\{|\}|" + separator, text):
+        if m.group() == "{":
+            depth += 1
+        elif m.group() == "}":
+            depth -= 1
+        elif depth == 0:
+            parts.append(text[start : m.start()])
+            start = m.end()
+    parts.append(text[start:])
+    return [part.strip() for part in parts]
+
+
+def names(field: str) -> List[Tuple[str, str]]:
+    """(first names, last name) of a list of names"""
+    result = []
+    for name in _split(" ".join(field.split()), r"\s+and\s+"):
+        parts = [part for part in _split(name, ",") if part]
+        if len(parts) > 1:
+            result.append((" ".join(parts[1:]), parts[0]))
+        else:
+            words = _split(name, r"\s+")
+            result.append((" ".join(words[:-1]), words[-1]))
+    return result
+
+
+def _glyphs(text: str) -> List[str]:
+    """the characters of a TeX string, accented letters included"""
+    glyphs = []
+    for glyph in _GLYPH.findall(text):
+        if glyph in "{}" or glyph.isspace():
+            continue
+        if len(glyph) == 1 and not glyph.isalpha():
+            continue
+        glyphs.append(glyph)
+    return glyphs
+
+
+def _family(last: str) -> str:
+    """last name without its lowercase prefix (von, de...)"""
+    words = last.split()
+    while len(words) > 1 and words[0][:1].islower():
+        words = words[1:]
+    return " ".join(words)
+
+
+def _authors(entry: dict) -> List[Tuple[str, str]]:
+    return names(entry.get("author") or entry.get("editor") or "")
+
+
+def _year(entry: dict) -> str:
+    return re.sub(r"\D", "", entry.get("year", entry.get("date", "")))[:4]
+
+
+def alpha(entry: dict) -> str:
+    """alphabetic label of an entry, before disambiguation"""
+    authors = _authors(entry)
+    if not authors:
+        prefix = "".join(_glyphs(entry.get("title", entry["ID"]))[:3])
+    elif len(authors) > MAX_ALPHA_NAMES:
+        prefix = "".join(_glyphs(_family(authors[0][1]))[:3]) + "+"
+    elif len(authors) == 1:
+        prefix = "".join(_glyphs(_family(authors[0][1]))[:3])
+    else:
+        prefix = "".join(_glyphs(_family(last))[0] for _, last in authors)
+    return prefix + _year(entry)[-2:]
+
+
+def _sort_key(entry: dict):
+    """ydnt: year descending, then name and title"""
+    year = _year(entry)
+    name = " ".join(
+        _family(last) + " " + first for first, last in _authors(entry)
+    ).lower()
+    return (-int(year) if year else 0, name, entry.get("title", "").lower())
+
+
+def _list(authors: List[Tuple[str, str]]) -> str:
+    shown = [f"{first} {last}".strip() for first, last in authors]
+    if len(shown) <= 2:
+        return " and ".join(shown)
+    return ", ".join(shown[:-1]) + ", and " + shown[-1]
+
+
+def _pages(entry: dict) -> str:
+    pages = re.sub(r"(?<!-)[-–](?!-)", "--", entry.get("pages", ""))
+    if not pages:
+        return ""
+    return ("pp.~" if "-" in pages else "p.~") + pages
+
+
+def _join(*parts: str) -> str:
+    return ". ".join(part for part in parts if part) + "."
+
+
+def format_entry(entry: dict) -> str:
+    """plain LaTeX of an entry, close to the biblatex standard drivers"""
+    authors = _list(names(entry["author"])) if "author" in entry else ""
+    title = " ".join(entry.get("title", "").split())
+    year = _year(entry)
+    kind = entry["ENTRYTYPE"]
+    if kind == "article":
+        issue = entry.get("volume", "")
+        if "number" in entry:
+            issue += "." + entry["number"]
+        venue = " ".join(
+            part
+            for part in [
+                f"In: \\emph{{{entry['journal']}}}" if "journal" in entry else "",
+                issue,
+                f"({year})" if year else "",
+            ]
+            if part
+        )
+        return _join(
+            authors,
+            f"\\enquote{{{title}}}",
+            ", ".join(part for part in [venue, _pages(entry)] if part),
+        )
+    if kind in ("inproceedings", "incollection"):
+        booktitle = " ".join(entry.get("booktitle", "").split())
+        where = ", ".join(
+            part for part in [entry.get("publisher", ""), year, _pages(entry)] if part
+        )
+        return _join(
+            authors, f"\\enquote{{{title}}}", f"In: \\emph{{{booktitle}}}", where
+        )
+    if kind == "book":
+        return _join(
+            authors,
+            f"\\emph{{{title}}}",
+            ", ".join(part for part in [entry.get("publisher", ""), year] if part),
+        )
+    eprint = entry.get("eprint", "")
+    if eprint and (entry.get("archiveprefix") or entry.get("eprinttype")):
+        eprint = f"{entry.get('archiveprefix') or entry.get('eprinttype')}: {eprint}"
+    return _join(authors, f"\\emph{{{title}}}", entry.get("note", ""), year, eprint)
+
+
+@functools.lru_cache(maxsize=None)
+def render(digest: str, keys: FrozenSet[str]) -> Tuple[Dict[str, str], str]:
+    """labels of the keys and the list of their entries"""
+    entries = _ENTRIES[digest]
+    if "*" in keys:
+        keys = (keys - {"*"}) | frozenset(entries)
+    cited = sorted((entries[k] for k in keys if k in entries), key=_sort_key)
+
+    labels: Dict[str, str] = {}
+    shared: Dict[str, List[str]] = {}
+    for entry in cited:
+        shared.setdefault(alpha(entry), []).append(entry["ID"])
+    for label, ids in shared.items():
+        for k, key in enumerate(ids):
+            labels[key] = label + (
+                "abcdefghijklmnopqrstuvwxyz"[k] if len(ids) > 1 else ""
+            )
+    for key in keys - set(entries):
+        print(f"bibliography: no entry {key}")
+        labels[key] = f"\\textbf{{{key}}}"
+
+    if not cited:
+        return labels, ""
+    widest = max((labels[entry["ID"]] for entry in cited), key=len)
+    items = "\n".join(
+        f"\\item[{{[{labels[entry['ID']]}]}}]"
+        f"\\hypertarget{{cite.{entry['ID']}}}{{}}{format_entry(entry)}"
+        for entry in cited
+    )
+    code = (
+        "\\begin{list}{}{\\settowidth{\\labelwidth}{["
+        + widest
+        + "]}\\setlength{\\leftmargin}{\\labelwidth}"
+        + "\\addtolength{\\leftmargin}{\\labelsep}}\n"
+        + items
+        + "\n\\end{list}"
+    )
+    return labels, code
+
+
+def resolve(code: str, path: str = BIBLIOGRAPHY) -> Tuple[str, str]:
+    """the code with its citations replaced, and the definition of MACRO"""
+    keys = {key.strip() for m in CITE.finditer(code) for key in m.group(1).split(",")}
+    keys |= NOCITE
+    if not keys and MACRO not in code:
+        return code, ""
+    labels, listing = render(load(path), frozenset(keys))
+
+    def cite(m: re.Match) -> str:
+        cited = [key.strip() for key in m.group(1).split(",")]
+        return (
+            "["
+            + ", ".join(f"\\hyperlink{{cite.{key}}}{{{labels[key]}}}" for key in cited)
+            + "]"
+        )
+
+    code = CITE.sub(cite, code)
+    return code, f"\\newcommand{{{MACRO}}}{{%\n{listing}}}"
@@ -0,0 +1,190 @@
+"""
+Multi-pass build.
+
+A single xelatex run leaves the bibliography empty (``backend=biber``)
+and the hyperref destinations unresolved. ``build`` runs the engine
+until the auxiliary files stop changing between two passes:
+
+* the auxiliary files (``AUXILIARY``) are hashed before and after every
+  pass, the build stops at the first pass that leaves them unchanged;
+* biber only runs when the citations recorded in the ``.bcf`` or the
+  bibliography file changed since its last run, which is remembered
+  in a ``.bibstamp`` file next to the document across builds.
+
+A deck rebuilt without any change to its references thus costs a single
+pass, and a new citation costs one biber run and the passes it needs.
+
+Passes never wait at a prompt: they stop at the first error, or after
+``TIMEOUT`` seconds, and raise a ``CompileError`` listing the errors
+of the log, located in the frames with a ``sourcemap.SourceMap``.
+"""
+
+import dataclasses
+import hashlib
+import os
+import re
+import subprocess
+from typing import Dict, List, Optional
+
+from tikz_presentations_aliaume.sourcemap import Location, SourceMap
+
+# files written by the passes that later passes read
+AUXILIARY = (".aux", ".bbl", ".out", ".toc", ".nav", ".snm")
+
+# passes after which a build that has not converged is an error
+MAX_PASSES = 5
+
+BIBLIOGRAPHY = "papers.bib"
+
+# seconds a pass may take
+TIMEOUT = 600
+
+# "file:line: message", as printed with -file-line-error
+FILE_LINE_ERROR = re.compile(r"^(.+?\.tex):(\d+): (.*)$", re.MULTILINE)
+# "! message" followed later by "l.<line> context"
+BANG_ERROR = re.compile(r"^! (.*)$(?:.*\n)*?^l\.(\d+) ?(.*)$", re.MULTILINE)
+
+
+@dataclasses.dataclass
+class TexError:
+    message: str
+    line: Optional[int]
+    location: Optional[Location] = None
+
+    def __str__(self):
+        where = f"line {self.line}" if self.line is not None else "unknown line"
+        if self.location is not None:
+            where += f" ({self.location})"
+        return f"{where}: {self.message}"
+
+
+class CompileError(RuntimeError):
+    def __init__(self, message: str, errors: List[TexError], log: str = ""):
+        super().__init__("\n".join([message, *(f"  {error}" for error in errors)]))
+        self.errors = errors
+        self.log = log
+
+
+class CompileTimeout(CompileError):
+    """the engine did not finish in time, it may on a less busy machine"""
+
+
+def parse_log(log: str, source_map: Optional[SourceMap] = None) -> List[TexError]:
+    """errors of a TeX log, located in the frames when a map is given"""
+    errors = [
+        TexError(m.group(3), int(m.group(2))) for m in FILE_LINE_ERROR.finditer(log)
+    ]
+    if not errors:
+        errors = [
+            TexError(m.group(1), int(m.group(2))) for m in BANG_ERROR.finditer(log)
+        ]
+    if not errors and "Emergency stop" in log:
+        errors = [TexError("emergency stop", None)]
+    if source_map is not None:
+        for error in errors:
+            if error.line is not None:
+                error.location = source_map.locate(error.line)
+    return errors
+
+
+def _digest(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def auxiliary_state(job: str) -> Dict[str, Optional[str]]:
+    """hashes of the auxiliary files of a job (path without extension)"""
+    return {ext: _digest(job + ext) for ext in AUXILIARY}
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _bibliography_stamp(job: str, bibliography: str) -> Optional[str]:
+    """what biber depends on, None when the document has no bibliography"""
+    bcf = _digest(job + ".bcf")
+    if bcf is None:
+        return None
+    return f"{bcf} {_digest(bibliography)}"
+
+
+def run(
+    command: List[str],
+    directory: str,
+    log: str,
+    timeout: float,
+    source_map: Optional[SourceMap] = None,
+):
+    """run a step of a build, a failure raises a located CompileError"""
+    try:
+        result = subprocess.run(
+            command,
+            cwd=directory,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        raise CompileTimeout(f"{command[0]} timed out after {timeout}s", [])
+    if result.returncode != 0:
+        try:
+            with open(log, errors="replace") as f:
+                text = f.read()
+        except FileNotFoundError:
+            text = ""
+        raise CompileError(
+            f"{command[0]} failed, see {log}", parse_log(text, source_map), text
+        )
+
+
+def build(
+    source: str,
+    engine: str = "xelatex",
+    bibliography: str = BIBLIOGRAPHY,
+    max_passes: int = MAX_PASSES,
+    timeout: float = TIMEOUT,
+    source_map: Optional[SourceMap] = None,
+) -> int:
+    """compile a document to a fixed point, returns the number of passes"""
+    directory = os.path.dirname(source) or "."
+    job = os.path.splitext(source)[0]
+    name = os.path.basename(job)
+    stamp_file = job + ".bibstamp"
+    bibliography = os.path.join(directory, bibliography)
+
+    for passes in range(1, max_passes + 1):
+        before = auxiliary_state(job)
+        print(f"{engine} pass {passes}")
+        run(
+            [
+                engine,
+                "-interaction=nonstopmode",
+                "-halt-on-error",
+                "-file-line-error",
+                name + ".tex",
+            ],
+            directory,
+            job + ".log",
+            timeout,
+            source_map,
+        )
+
+        stamp = _bibliography_stamp(job, bibliography)
+        if stamp is not None and stamp != _read(stamp_file):
+            print("biber")
+            run(["biber", name], directory, job + ".blg", timeout)
+            with open(stamp_file, "w") as f:
+                f.write(stamp)
+
+        if auxiliary_state(job) == before:
+            return passes
+    raise CompileError(f"{source} did not converge after {max_passes} passes", [])
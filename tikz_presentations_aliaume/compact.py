@@ -0,0 +1,400 @@
+"""
+Compact PDF.
+
+Consecutive frames of an animation draw mostly the same thing: a frame
+usually adds a few elements to the previous one, and the same images
+and fonts come back on every page. A viewer parses every page on its
+own, which is slow on a presentation laptop. This post-optimiser:
+
+* writes identical streams, fonts and graphics states once (see
+  ``pdf.Merger``);
+* puts the content that consecutive pages start with in a form XObject
+  shared by these pages, each page drawing it and then its own end,
+  when the compressed streams get smaller. A page is only cut where the
+  drawing state is known: outside of ``q``/``Q`` groups, text objects,
+  marked content and paths. The state set before the cut (``cm``,
+  colours, line width, font...) is set again after the form, which
+  restores the state it was drawn in;
+* writes the objects that are not streams compressed together, in
+  object streams.
+
+The outline, the page labels and the document information are kept.
+The bytes each step saves are reported:
+
+    uv run python -m tikz_presentations_aliaume.compact preview.pdf
+"""
+
+import argparse
+import collections
+import dataclasses
+import io
+import os
+import re
+import zlib
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from tikz_presentations_aliaume import pdf
+
+# bytes the pages must start with to try a form
+MIN_SHARED = 256
+
+# bytes an object costs besides its content: "n 0 obj", "endobj" and
+# its cross-reference entry, which stays once it is dropped
+OBJECT_COST = 40
+FREE_ENTRY_COST = 20
+
+# bytes naming a form in the resources of a page, at most
+ENTRY_COST = 32
+
+_SPACE = re.compile(rb"(?:[\x00\t\n\x0c\r ]+|%[^\r\n]*)*")
+_OPERATOR = re.compile(rb"[A-Za-z'\"][^\x00\t\n\x0c\r ()<>\[\]{}/%]*")
+_KEYWORDS = {b"true", b"false", b"null"}
+_BOUNDARY = frozenset(pdf.WHITESPACE + pdf.DELIMITERS)
+
+# operators changing the drawing state for the rest of the content,
+# unless a Q restores it
+STATE = {
+    b"cm", b"w", b"J", b"j", b"M", b"d", b"ri", b"i", b"gs",
+    b"CS", b"cs", b"SC", b"SCN", b"sc", b"scn", b"G", b"g", b"RG", b"rg",
+    b"K", b"k", b"Tc", b"Tw", b"Tz", b"TL", b"Tf", b"Tr", b"Ts",
+}  # fmt: skip
+
+# operators building a path, and those ending it
+PATH = {b"m", b"l", b"c", b"v", b"y", b"h", b"re"}
+PAINT = {b"S", b"s", b"f", b"F", b"f*", b"B", b"B*", b"b", b"b*", b"n"}
+
+# resources a content stream names
+RESOURCES = [
+    "ExtGState", "ColorSpace", "Pattern", "Shading", "XObject", "Font",
+    "Properties",
+]  # fmt: skip
+
+
+def operators(
+    content: bytes, limit: Optional[int] = None
+) -> Iterator[Tuple[int, int, bytes, List[Any]]]:
+    """(start of the operands, end, operator, operands) of the operators
+    of a content stream, up to limit"""
+    pos = start = 0
+    operands: List[Any] = []
+    end = len(content) if limit is None else min(limit, len(content))
+    while True:
+        pos = _SPACE.match(content, pos).end()
+        if pos >= end:
+            return
+        m = _OPERATOR.match(content, pos)
+        if m is not None and m.group() not in _KEYWORDS:
+            yield start, m.end(), m.group(), operands
+            if m.group() == b"BI":
+                # inline image data is not made of tokens
+                return
+            pos = start = m.end()
+            operands = []
+        else:
+            operand, pos = pdf.parse_object(content, pos)
+            operands.append(operand)
+
+
+@dataclasses.dataclass
+class Cut:
+    # where the content can be cut
+    position: int
+    # the operators setting the drawing state before the cut
+    state: bytes
+    # names used before the cut
+    names: Set[str]
+
+
+def cuts(content: bytes, limit: int) -> List[Cut]:
+    """the places a content stream can be cut at, up to limit"""
+    result = []
+    depth = 0
+    text = path = False
+    marked = 0
+    state: List[bytes] = []
+    names: Set[str] = set()
+    for start, end, operator, operands in operators(content, limit):
+        names.update(o for o in operands if isinstance(o, pdf.Name))
+        if operator == b"q":
+            depth += 1
+        elif operator == b"Q":
+            depth -= 1
+        elif operator == b"BT":
+            text = True
+        elif operator == b"ET":
+            text = False
+        elif operator in (b"BMC", b"BDC"):
+            marked += 1
+        elif operator == b"EMC":
+            marked -= 1
+        elif operator in PATH:
+            path = True
+        elif operator in PAINT:
+            path = False
+        elif depth == 0 and operator in (b"W", b"W*", b"BI"):
+            # the clipping path or the image would have to be drawn again
+            break
+        elif depth == 0 and operator in STATE:
+            state.append(content[start:end].strip())
+        if depth == 0 and not text and not marked and not path:
+            result.append(Cut(end, b"\n".join(state), set(names)))
+    return result
+
+
+def common_prefix(a: bytes, b: bytes) -> int:
+    """length of the longest common prefix"""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+@dataclasses.dataclass
+class Report:
+    pages: int = 0
+    forms: int = 0
+    # pages drawing a form
+    shared_pages: int = 0
+    # step -> size of the document after it
+    sizes: Dict[str, int] = dataclasses.field(default_factory=dict)
+
+    def __str__(self):
+        forms = f"{self.forms} shared forms"
+        lines = [f"{self.pages} pages, {self.shared_pages} drawing one of {forms}"]
+        previous = None
+        for step, size in self.sizes.items():
+            saved = "" if previous is None else f"  saved {previous - size:>10}"
+            lines.append(f"{step:<24}{size:>10} bytes{saved}")
+            previous = size
+        sizes = list(self.sizes.values())
+        lines.append(f"{'total saved':<24}{sizes[0] - sizes[-1]:>10} bytes")
+        return "\n".join(lines)
+
+
+class Compactor:
+    def __init__(self, document: pdf.Document):
+        self.merger = pdf.Merger()
+        self.merger.append(document, keep=True)
+        self.writer = self.merger.writer
+        self.pages = list(self.merger.kids)
+        self.contents = [self._content(ref) for ref in self.pages]
+        # content stream -> pages drawing it
+        self.uses = collections.Counter(
+            r for ref in self.pages for r in self._streams(ref)
+        )
+        self.forms = 0
+        self.shared_pages = 0
+        # content streams of the pages drawing a form
+        self.replaced: Set[pdf.Ref] = set()
+
+    def _streams(self, ref: pdf.Ref) -> List[pdf.Ref]:
+        """the objects holding the content of a page"""
+        contents = self.writer.get(ref).get("Contents")
+        refs = [contents] if isinstance(contents, pdf.Ref) else []
+        resolved = self.writer.get(contents)
+        if isinstance(resolved, list):
+            refs += [r for r in resolved if isinstance(r, pdf.Ref)]
+        return refs
+
+    def _content(self, ref: pdf.Ref) -> Optional[bytes]:
+        """the content of a page, None when it cannot be read"""
+        streams = self.writer.get(self.writer.get(ref).get("Contents"))
+        if not isinstance(streams, list):
+            streams = [streams]
+        try:
+            return b"\n".join(pdf.decode(self.writer.get(s)) for s in streams)
+        except (pdf.PDFError, AttributeError, zlib.error):
+            return None
+
+    def _resources(self, page: Dict[pdf.Name, Any]) -> Dict[str, Dict]:
+        resources = self.writer.get(page.get("Resources", {}))
+        return {
+            kind: self.writer.get(resources.get(kind, {}))
+            for kind in RESOURCES
+            if kind in resources
+        }
+
+    def _used(self, pages: List[int], names: Set[str]) -> Optional[Dict]:
+        """the resources the names are in, None when the pages do not
+        agree on them"""
+        used: Dict[pdf.Name, Dict] = {}
+        resources = [self._resources(self.writer.get(self.pages[k])) for k in pages]
+        for kind in RESOURCES:
+            for name in names:
+                values = [r.get(kind, {}).get(name) for r in resources]
+                if all(v is None for v in values):
+                    continue
+                written = {_serialised(v) for v in values}
+                if len(written) > 1 or values[0] is None:
+                    return None
+                used.setdefault(pdf.Name(kind), {})[pdf.Name(name)] = values[0]
+        return used
+
+    def _cut(self, first: int, last: int, length: int) -> Optional[Tuple[Cut, Dict]]:
+        """the last place pages first to last can all be cut at, before
+        length, with the resources of what comes before"""
+        contents = self.contents[first : last + 1]
+        for cut in reversed(cuts(contents[0], length)):
+            if cut.position < MIN_SHARED:
+                return None
+            if cut.position > length:
+                continue
+            # the operator ends there in every page
+            if any(
+                cut.position < len(c) and c[cut.position] not in _BOUNDARY
+                for c in contents
+            ):
+                continue
+            used = self._used(list(range(first, last + 1)), cut.names)
+            if used is not None:
+                return cut, used
+        return None
+
+    def share(self):
+        """put the content consecutive pages start with in forms"""
+        common = [
+            common_prefix(a, b) if a is not None and b is not None else 0
+            for a, b in zip(self.contents, self.contents[1:])
+        ]
+        first = 0
+        while first < len(common):
+            length, last = common[first], first + 1
+            # a page more while the bytes shared do not decrease
+            while last < len(common) and min(length, common[last]) * (
+                last + 2 - first
+            ) >= length * (last + 1 - first):
+                length = min(length, common[last])
+                last += 1
+            found = self._cut(first, last, length) if length >= MIN_SHARED else None
+            if found is None:
+                first += 1
+                continue
+            if not self._form(first, last, *found):
+                first += 1
+                continue
+            first = last + 1
+        # streams of other pages are the same objects when identical
+        kept = {ref for page in self.pages for ref in self._streams(page)}
+        for ref in self.replaced - kept:
+            self.writer.set(ref, None)
+
+    def _updated(self, obj: Any, update: Callable[[Dict], None]) -> Any:
+        """a dictionary updated, in place when obj refers to it"""
+        value = dict(self.writer.get(obj) or {})
+        update(value)
+        if isinstance(obj, pdf.Ref):
+            self.writer.set(obj, value)
+            return obj
+        return value
+
+    def _form(self, first: int, last: int, cut: Cut, used: Dict) -> bool:
+        """draw the start of the pages from a form, unless the document
+        would not be smaller"""
+        run = self.pages[first : last + 1]
+        pages = [self.writer.get(ref) for ref in run]
+        names = set()
+        for page in pages:
+            resources = self.writer.get(page.get("Resources", {}))
+            names.update(self.writer.get(resources.get("XObject", {})))
+        name = f"Shared{self.forms + 1}"
+        while name in names:
+            name += "x"
+        form = pdf.encode(
+            {
+                pdf.Name("Type"): pdf.Name("XObject"),
+                pdf.Name("Subtype"): pdf.Name("Form"),
+                pdf.Name("BBox"): pages[0]["MediaBox"],
+                pdf.Name("Resources"): used,
+            },
+            self.contents[first][: cut.position],
+        )
+        drawn = [
+            b"/%s Do\n%s\n%s" % (name.encode(), cut.state, content[cut.position :])
+            for content in self.contents[first : last + 1]
+        ]
+        # identical pages have their content once
+        contents = {content: pdf.encode({}, content) for content in drawn}
+
+        # the streams no other page draws go
+        streams = collections.Counter(r for ref in run for r in self._streams(ref))
+        gone = [r for r, uses in streams.items() if uses == self.uses[r]]
+        before = sum(
+            len(_serialised(self.writer.get(r))) + OBJECT_COST - FREE_ENTRY_COST
+            for r in gone
+        )
+        after = sum(
+            len(_serialised(stream)) + OBJECT_COST
+            for stream in [form, *contents.values()]
+        )
+        if after + ENTRY_COST * len(run) >= before:
+            return False
+        self.forms += 1
+
+        form_ref = self.writer.add(form)
+        refs = {
+            content: self.writer.add(stream) for content, stream in contents.items()
+        }
+
+        def add_form(resources: Dict):
+            resources[pdf.Name("XObject")] = self._updated(
+                resources.get("XObject"),
+                lambda xobjects: xobjects.update({pdf.Name(name): form_ref}),
+            )
+
+        for ref, content in zip(run, drawn):
+            page = dict(self.writer.get(ref))
+            page[pdf.Name("Resources")] = self._updated(page.get("Resources"), add_form)
+            self.replaced.update(self._streams(ref))
+            page[pdf.Name("Contents")] = refs[content]
+            self.writer.set(ref, page)
+            self.shared_pages += 1
+        return True
+
+
+def _serialised(obj: Any) -> bytes:
+    out = io.BytesIO()
+    pdf.serialise(obj, out)
+    return out.getvalue()
+
+
+def compact(data: bytes, object_streams: bool = True) -> Tuple[bytes, Report]:
+    """the document with shared content and resources, and what it saved"""
+    compactor = Compactor(pdf.Document.read(data))
+    report = Report(pages=len(compactor.pages))
+    report.sizes["input"] = len(data)
+    result = compactor.merger.write()
+    report.sizes["shared resources"] = len(result)
+    compactor.share()
+    report.forms = compactor.forms
+    report.shared_pages = compactor.shared_pages
+    result = compactor.merger.write()
+    report.sizes["shared content"] = len(result)
+    if object_streams:
+        result = compactor.merger.write(object_streams=True)
+        report.sizes["object streams"] = len(result)
+    return result, report
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("input")
+    parser.add_argument("-o", "--output", default=None, help="input by default")
+    parser.add_argument("--no-object-streams", action="store_true")
+    args = parser.parse_args(argv)
+
+    with open(args.input, "rb") as f:
+        data = f.read()
+    result, report = compact(data, object_streams=not args.no_object_streams)
+    output = args.output or args.input
+    with open(output + ".part", "wb") as f:
+        f.write(result)
+    os.replace(output + ".part", output)
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,45 @@ from typing import Literal, Generator, Callable, List, Union, Tuple, Optional
 import random
 
 from tikz_presentations_aliaume.components.utils import *
+from tikz_presentations_aliaume.components.lod import LevelOfDetail, keep
+
+EdgeSpec = Tuple[str, str, dict, dict]
+
+
+def batchable(options: dict) -> bool:
+    """whether an edge can share its path with other edges
+
+    TikZ puts arrow tips only at the ends of a path and decorates a path
+    as a whole, so edges with tips, decorations or labels stay alone.
+    """
+    for key, value in options.items():
+        text = f"{key}={value}"
+        if "<" in text or ">" in text or "decor" in text or "action" in text:
+            return False
+        if key == "label" and value:
+            return False
+    return True
+
+
+def draw_edges(pic, edges: List[EdgeSpec]):
+    """draw edges as one path per shared style
+
+    ``edges`` are (source name, target name, path options, to options),
+    edges with the same options become segments of a single path.
+    """
+    # paths are emitted in the order of their first edge
+    groups: dict[object, Tuple[dict, list]] = {}
+    for index, (source, target, eprops, toprops) in enumerate(edges):
+        if batchable(eprops) and batchable(toprops):
+            key = repr((sorted(eprops.items()), sorted(toprops.items())))
+        else:
+            key = index
+        if key not in groups:
+            groups[key] = (eprops, [])
+        groups[key][1].extend([f"({source})", topath(f"({target})", **toprops)])
+
+    for eprops, spec in groups.values():
+        pic.draw(*spec, **eprops)
 
 
 @dataclasses.dataclass
@@ -32,6 +71,7 @@ class Cycle:
             }
             pic.node("", **(prps | myProps))
 
+        edges = []
         for i in range(self.size):
             pi = self.verticesProps[i] if i < len(self.verticesProps) else {}
             j = (i + 1) % self.size
@@ -41,7 +81,9 @@ class Cycle:
 
             eprops = self.edgesProps.get((i, j), {})
 
-            pic.draw(f"({ni})", topath(f"({nj})"), **eprops)
+            edges.append((ni, nj, eprops, {}))
+
+        draw_edges(pic, edges)
 
     def __iter__(self):
         yield (0, self)
@@ -68,6 +110,7 @@ class Path:
             }
             pic.node("", **(prps | myProps))
 
+        edges = []
         for i in range(self.length - 1):
             pi = self.verticesProps[i] if i < len(self.verticesProps) else {}
             j = i + 1
@@ -77,7 +120,9 @@ class Path:
 
             eprops = self.edgesProps.get((i, j), {})
 
-            pic.draw(f"(v{i})", topath(f"(v{i + 1})"), **eprops)
+            edges.append((ni, nj, eprops, {}))
+
+        draw_edges(pic, edges)
 
     def __iter__(self):
         yield (0, self)
@@ -87,6 +132,7 @@ class Path:
 class Clique:
     size: int
     radius: float | int
+    lod: Optional[LevelOfDetail] = None
 
     def draw(self, pic):
         # place nodes in a circle
@@ -98,10 +144,15 @@ class Clique:
                 "", at=(x, y), circle=True, inner_sep="2pt", draw=True, name=f"v{i}"
             )
 
-        # draw all edges
+        # draw all edges, short chords may be dropped by the level of detail
+        edges = []
         for i in range(self.size):
             for j in range(i + 1, self.size):
-                pic.draw(f"(v{i})", topath(f"(v{j})"))
+                chord = 2 * self.radius * math.sin(math.pi * (j - i) / self.size)
+                if keep("Clique", size=chord, lod=self.lod):
+                    edges.append((f"v{i}", f"v{j}", {}, {}))
+
+        draw_edges(pic, edges)
 
     def __iter__(self):
         yield (0, self)
@@ -148,38 +199,24 @@ class HalfGraph:
                 nprops = self.verticesProps.get(n, {})
                 pic.node("", **(nprops | props))
 
-        # draw all edges
-        nodes = [
-            (s, i)
-            for (s, r) in [("top", self.topsize), ("bot", self.botsize)]
-            for i in range(r)
-        ]
-        for n1 in nodes:
-            for n2 in nodes:
+        # edges from top i to bottom j <= i are always drawn
+        edges = []
+        for i in range(self.topsize):
+            for j in range(min(i + 1, self.botsize)):
+                n1, n2 = ("top", i), ("bot", j)
                 eprops = self.edgesProps.get((n1, n2), {})
-                print(eprops)
-                n1prop = self.verticesProps.get(n1, {}) | {"name": nodename(n1)}
-                n2prop = self.verticesProps.get(n2, {}) | {"name": nodename(n2)}
-
-                side1, i = n1
-                side2, j = n2
-
-                name1 = n1prop["name"]
-                name2 = n2prop["name"]
-
-                # n1 top, n2 bot : i <= j
-                if side1 == "top" and side2 == "bot" and j <= i:
-                    pic.draw(f"({name1})", topath(f"({name2})"), **eprops)
-
-                # n1/n2 on the same layer => i < j too
-                if side1 == side2 and i < j:
-                    if eprops:  # if we are asked to draw it
-                        angle = "90" if side1 == "top" else "-90"
-                        pic.draw(
-                            f"({name1})",
-                            topath(f"({name2})", _in=angle, _out=angle),
-                            **eprops,
-                        )
+                edges.append((nodename(n1), nodename(n2), eprops, {}))
+
+        # edges within a layer only when they are given a style
+        for (n1, n2), eprops in self.edgesProps.items():
+            (side1, i), (side2, j) = n1, n2
+            size = self.topsize if side1 == "top" else self.botsize
+            if side1 == side2 and i < j < size and eprops:
+                angle = "90" if side1 == "top" else "-90"
+                toprops = {"_in": angle, "_out": angle}
+                edges.append((nodename(n1), nodename(n2), eprops, toprops))
+
+        draw_edges(pic, edges)
 
     def __iter__(self):
         yield (0, self)
@@ -0,0 +1,104 @@
+"""
+Level of detail for dense decorations.
+
+Components that emit many faint or tiny elements ask ``keep`` before
+emitting each of them. Elements below the opacity or size thresholds
+are dropped, and so are decorated elements (markings, decorations)
+once the per-frame budget is spent. Every drop is counted in ``REPORT``
+so that a build can tell what was left out.
+
+The default level of detail keeps everything. It can be changed for
+the whole deck with ``set_level_of_detail`` or per component through
+their ``lod`` field.
+"""
+
+import dataclasses
+from typing import Dict, Optional, Tuple
+
+
+@dataclasses.dataclass(frozen=True)
+class LevelOfDetail:
+    # elements fainter than this are dropped
+    min_opacity: float = 0.0
+    # elements smaller than this (in cm, at the component scale) are dropped
+    min_size: float = 0.0
+    # maximal number of decorated elements per frame, None for no limit
+    max_decorated: Optional[int] = None
+
+    @staticmethod
+    def full() -> "LevelOfDetail":
+        return LevelOfDetail()
+
+    @staticmethod
+    def draft() -> "LevelOfDetail":
+        return LevelOfDetail(min_opacity=0.25, min_size=0.2, max_decorated=12)
+
+
+@dataclasses.dataclass
+class DetailReport:
+    # (component, reason) -> number of dropped elements
+    dropped: Dict[Tuple[str, str], int] = dataclasses.field(default_factory=dict)
+    frames: int = 0
+    decorated_in_frame: int = 0
+
+    def record(self, component: str, reason: str):
+        key = (component, reason)
+        self.dropped[key] = self.dropped.get(key, 0) + 1
+
+    @property
+    def total(self) -> int:
+        return sum(self.dropped.values())
+
+    def merge(self, other: "DetailReport"):
+        for key, count in other.dropped.items():
+            self.dropped[key] = self.dropped.get(key, 0) + count
+        self.frames += other.frames
+
+    def summary(self) -> str:
+        if not self.dropped:
+            return "Level of detail: nothing dropped"
+        lines = [f"Level of detail: {self.total} elements dropped"]
+        for (component, reason), count in sorted(self.dropped.items()):
+            lines.append(f"  {component:<24} {reason:<10} {count}")
+        return "\n".join(lines)
+
+
+LOD = LevelOfDetail()
+REPORT = DetailReport()
+
+
+def set_level_of_detail(lod: LevelOfDetail):
+    global LOD
+    LOD = lod
+
+
+def start_frame():
+    """reset the per-frame budgets, called before drawing each frame"""
+    REPORT.frames += 1
+    REPORT.decorated_in_frame = 0
+
+
+def keep(
+    component: str,
+    opacity: float = 1.0,
+    size: Optional[float] = None,
+    decorated: bool = False,
+    lod: Optional[LevelOfDetail] = None,
+) -> bool:
+    """whether an element should be emitted, recording it when dropped"""
+    lod = lod or LOD
+    if opacity < lod.min_opacity:
+        REPORT.record(component, "opacity")
+        return False
+    if size is not None and size < lod.min_size:
+        REPORT.record(component, "size")
+        return False
+    if decorated:
+        if (
+            lod.max_decorated is not None
+            and REPORT.decorated_in_frame >= lod.max_decorated
+        ):
+            REPORT.record(component, "budget")
+            return False
+        REPORT.decorated_in_frame += 1
+    return True
@@ -0,0 +1,325 @@
+"""
+QR codes computed in Python.
+
+The ``qrcode`` LaTeX package runs the Reed-Solomon encoding in TeX
+macros on every compilation. ``QRCode`` encodes its payload here
+instead (byte mode, versions 1 to 10, that is up to 213 bytes at level
+M), caches the module matrix by payload, and draws it as a single
+filled path of rectangles.
+"""
+
+from tikz import *
+
+import dataclasses
+import functools
+from typing import List, Tuple
+
+# error correction level -> format bits
+LEVELS = {"L": 1, "M": 0, "Q": 3, "H": 2}
+
+# version -> level -> (ecc codewords per block, [(blocks, data codewords)])
+BLOCKS = {
+    1: {"L": (7, [(1, 19)]), "M": (10, [(1, 16)]), "Q": (13, [(1, 13)]), "H": (17, [(1, 9)])},
+    2: {"L": (10, [(1, 34)]), "M": (16, [(1, 28)]), "Q": (22, [(1, 22)]), "H": (28, [(1, 16)])},
+    3: {"L": (15, [(1, 55)]), "M": (26, [(1, 44)]), "Q": (18, [(2, 17)]), "H": (22, [(2, 13)])},
+    4: {"L": (20, [(1, 80)]), "M": (18, [(2, 32)]), "Q": (26, [(2, 24)]), "H": (16, [(4, 9)])},
+    5: {"L": (26, [(1, 108)]), "M": (24, [(2, 43)]), "Q": (18, [(2, 15), (2, 16)]), "H": (22, [(2, 11), (2, 12)])},
+    6: {"L": (18, [(2, 68)]), "M": (16, [(4, 27)]), "Q": (24, [(4, 19)]), "H": (28, [(4, 15)])},
+    7: {"L": (20, [(2, 78)]), "M": (18, [(4, 31)]), "Q": (18, [(2, 14), (4, 15)]), "H": (26, [(4, 13), (1, 14)])},
+    8: {"L": (24, [(2, 97)]), "M": (22, [(2, 38), (2, 39)]), "Q": (22, [(4, 18), (2, 19)]), "H": (26, [(4, 14), (2, 15)])},
+    9: {"L": (30, [(2, 116)]), "M": (22, [(3, 36), (2, 37)]), "Q": (20, [(4, 16), (4, 17)]), "H": (24, [(4, 12), (4, 13)])},
+    10: {"L": (18, [(2, 68), (2, 69)]), "M": (26, [(4, 43), (1, 44)]), "Q": (24, [(6, 19), (2, 20)]), "H": (28, [(6, 15), (2, 16)])},
+}  # fmt: skip
+
+ALIGNMENTS = {
+    1: [],
+    2: [6, 18],
+    3: [6, 22],
+    4: [6, 26],
+    5: [6, 30],
+    6: [6, 34],
+    7: [6, 22, 38],
+    8: [6, 24, 42],
+    9: [6, 26, 46],
+    10: [6, 28, 50],
+}
+
+MASKS = [
+    lambda x, y: (x + y) % 2 == 0,
+    lambda x, y: y % 2 == 0,
+    lambda x, y: x % 3 == 0,
+    lambda x, y: (x + y) % 3 == 0,
+    lambda x, y: (x // 3 + y // 2) % 2 == 0,
+    lambda x, y: x * y % 2 + x * y % 3 == 0,
+    lambda x, y: (x * y % 2 + x * y % 3) % 2 == 0,
+    lambda x, y: ((x + y) % 2 + x * y % 3) % 2 == 0,
+]
+
+Matrix = Tuple[Tuple[bool, ...], ...]
+
+
+def _gf_multiply(x: int, y: int) -> int:
+    """product in GF(256) modulo x^8 + x^4 + x^3 + x^2 + 1"""
+    z = 0
+    for i in reversed(range(8)):
+        z = (z << 1) ^ ((z >> 7) * 0x11D)
+        z ^= ((y >> i) & 1) * x
+    return z
+
+
+@functools.lru_cache(maxsize=None)
+def _rs_divisor(degree: int) -> Tuple[int, ...]:
+    """generator polynomial of degree ``degree``, leading term omitted"""
+    result = [0] * (degree - 1) + [1]
+    root = 1
+    for _ in range(degree):
+        for j in range(degree):
+            result[j] = _gf_multiply(result[j], root)
+            if j + 1 < degree:
+                result[j] ^= result[j + 1]
+        root = _gf_multiply(root, 0x02)
+    return tuple(result)
+
+
+def _rs_remainder(data: List[int], degree: int) -> List[int]:
+    divisor = _rs_divisor(degree)
+    result = [0] * degree
+    for b in data:
+        factor = b ^ result.pop(0)
+        result.append(0)
+        for i, coefficient in enumerate(divisor):
+            result[i] ^= _gf_multiply(coefficient, factor)
+    return result
+
+
+def _data_capacity(version: int, level: str) -> int:
+    return sum(n * k for n, k in BLOCKS[version][level][1])
+
+
+def _codewords(payload: bytes, level: str) -> Tuple[int, List[int]]:
+    """smallest version holding the payload and its final codewords"""
+    for version in BLOCKS:
+        count_bits = 8 if version < 10 else 16
+        capacity = _data_capacity(version, level) * 8
+        if 4 + count_bits + 8 * len(payload) <= capacity:
+            break
+    else:
+        raise ValueError(f"QR payload too long: {len(payload)} bytes")
+
+    bits = "0100" + format(len(payload), f"0{count_bits}b")
+    bits += "".join(format(b, "08b") for b in payload)
+    bits += "0" * min(4, capacity - len(bits))
+    bits += "0" * (-len(bits) % 8)
+    data = [int(bits[i : i + 8], 2) for i in range(0, len(bits), 8)]
+    pad = [0xEC, 0x11]
+    data += [pad[i % 2] for i in range(capacity // 8 - len(data))]
+
+    ecc_length, groups = BLOCKS[version][level]
+    blocks = []
+    for n, k in groups:
+        for _ in range(n):
+            blocks.append(data[:k])
+            data = data[k:]
+    eccs = [_rs_remainder(block, ecc_length) for block in blocks]
+
+    result = []
+    for i in range(max(len(b) for b in blocks)):
+        result += [b[i] for b in blocks if i < len(b)]
+    for i in range(ecc_length):
+        result += [e[i] for e in eccs]
+    return version, result
+
+
+class _Symbol:
+    def __init__(self, version: int):
+        self.version = version
+        self.size = 17 + 4 * version
+        self.modules = [[False] * self.size for _ in range(self.size)]
+        self.function = [[False] * self.size for _ in range(self.size)]
+
+    def set_function(self, x: int, y: int, dark: bool):
+        self.modules[y][x] = dark
+        self.function[y][x] = True
+
+    def draw_function_patterns(self):
+        size = self.size
+        for i in range(size):
+            self.set_function(6, i, i % 2 == 0)
+            self.set_function(i, 6, i % 2 == 0)
+        for cx, cy in [(3, 3), (size - 4, 3), (3, size - 4)]:
+            for dy in range(-4, 5):
+                for dx in range(-4, 5):
+                    x, y = cx + dx, cy + dy
+                    if 0 <= x < size and 0 <= y < size:
+                        self.set_function(x, y, max(abs(dx), abs(dy)) not in (2, 4))
+        positions = ALIGNMENTS[self.version]
+        last = len(positions) - 1
+        for i, cx in enumerate(positions):
+            for j, cy in enumerate(positions):
+                if (i, j) in [(0, 0), (0, last), (last, 0)]:
+                    continue
+                for dy in range(-2, 3):
+                    for dx in range(-2, 3):
+                        self.set_function(cx + dx, cy + dy, max(abs(dx), abs(dy)) != 1)
+        # reserved, written again once the mask is known
+        self.draw_format_bits(0, 0)
+        if self.version >= 7:
+            self.draw_version_bits()
+
+    def draw_format_bits(self, level_bits: int, mask: int):
+        data = level_bits << 3 | mask
+        rem = data
+        for _ in range(10):
+            rem = (rem << 1) ^ ((rem >> 9) * 0x537)
+        bits = (data << 10 | rem) ^ 0x5412
+        bit = [(bits >> i) & 1 == 1 for i in range(15)]
+        size = self.size
+        for i in range(6):
+            self.set_function(8, i, bit[i])
+        self.set_function(8, 7, bit[6])
+        self.set_function(8, 8, bit[7])
+        self.set_function(7, 8, bit[8])
+        for i in range(9, 15):
+            self.set_function(14 - i, 8, bit[i])
+        for i in range(8):
+            self.set_function(size - 1 - i, 8, bit[i])
+        for i in range(8, 15):
+            self.set_function(8, size - 15 + i, bit[i])
+        self.set_function(8, size - 8, True)
+
+    def draw_version_bits(self):
+        rem = self.version
+        for _ in range(12):
+            rem = (rem << 1) ^ ((rem >> 11) * 0x1F25)
+        bits = self.version << 12 | rem
+        for i in range(18):
+            dark = (bits >> i) & 1 == 1
+            a, b = self.size - 11 + i % 3, i // 3
+            self.set_function(a, b, dark)
+            self.set_function(b, a, dark)
+
+    def draw_codewords(self, codewords: List[int]):
+        i = 0
+        total = len(codewords) * 8
+        right = self.size - 1
+        while right >= 1:
+            if right == 6:
+                right = 5
+            upward = ((right + 1) & 2) == 0
+            for vertical in range(self.size):
+                y = self.size - 1 - vertical if upward else vertical
+                for x in (right, right - 1):
+                    if not self.function[y][x] and i < total:
+                        self.modules[y][x] = (
+                            codewords[i >> 3] >> (7 - (i & 7))
+                        ) & 1 == 1
+                        i += 1
+            right -= 2
+
+    def apply_mask(self, mask: int):
+        test = MASKS[mask]
+        for y in range(self.size):
+            for x in range(self.size):
+                if not self.function[y][x] and test(x, y):
+                    self.modules[y][x] = not self.modules[y][x]
+
+    def penalty(self) -> int:
+        size = self.size
+        rows = self.modules
+        columns = [[rows[y][x] for y in range(size)] for x in range(size)]
+        result = 0
+        for line in rows + columns:
+            run = 1
+            for a, b in zip(line, line[1:]):
+                if a == b:
+                    run += 1
+                else:
+                    result += run - 2 if run >= 5 else 0
+                    run = 1
+            result += run - 2 if run >= 5 else 0
+            code = "".join("1" if m else "0" for m in line)
+            for pattern in ("10111010000", "00001011101"):
+                start = code.find(pattern)
+                while start != -1:
+                    result += 40
+                    start = code.find(pattern, start + 1)
+        for y in range(size - 1):
+            for x in range(size - 1):
+                if rows[y][x] == rows[y][x + 1] == rows[y + 1][x] == rows[y + 1][x + 1]:
+                    result += 3
+        dark = sum(sum(row) for row in rows)
+        total = size * size
+        result += ((abs(dark * 20 - total * 10) + total - 1) // total - 1) * 10
+        return result
+
+
+@functools.lru_cache(maxsize=None)
+def qr_matrix(payload: str, level: str = "M") -> Matrix:
+    """modules of the QR code of ``payload``, True for dark, row by row"""
+    version, codewords = _codewords(payload.encode("utf-8"), level)
+    symbol = _Symbol(version)
+    symbol.draw_function_patterns()
+    symbol.draw_codewords(codewords)
+
+    best, best_penalty = None, None
+    for mask in range(8):
+        symbol.apply_mask(mask)
+        symbol.draw_format_bits(LEVELS[level], mask)
+        penalty = symbol.penalty()
+        if best_penalty is None or penalty < best_penalty:
+            best, best_penalty = mask, penalty
+        symbol.apply_mask(mask)
+    symbol.apply_mask(best)
+    symbol.draw_format_bits(LEVELS[level], best)
+    return tuple(tuple(row) for row in symbol.modules)
+
+
+@functools.lru_cache(maxsize=None)
+def qr_path(payload: str, level: str = "M") -> str:
+    """the dark modules as rectangles, one unit per module, rows going down"""
+    matrix = qr_matrix(payload, level)
+    runs = []
+    for row in matrix:
+        row_runs = set()
+        x = 0
+        while x < len(row):
+            if row[x]:
+                start = x
+                while x < len(row) and row[x]:
+                    x += 1
+                row_runs.add((start, x))
+            x += 1
+        runs.append(row_runs)
+
+    # runs repeated on the following rows are merged into one rectangle
+    rectangles = []
+    for y, row_runs in enumerate(runs):
+        for start, end in sorted(row_runs):
+            height = 1
+            while y + height < len(runs) and (start, end) in runs[y + height]:
+                runs[y + height].remove((start, end))
+                height += 1
+            rectangles.append(f"({start},{-y}) rectangle ({end},{-y - height})")
+    return " ".join(rectangles)
+
+
+@dataclasses.dataclass
+class QRCode:
+    payload: str
+    at: Tuple[float, float] = (0, 0)
+    # width of the code, in cm
+    size: float = 2.0
+    level: str = "M"
+    color: str = "black"
+
+    def draw(self, pic: Picture):
+        modules = len(qr_matrix(self.payload, self.level))
+        scope = pic.scope(
+            xshift=f"{self.at[0] - self.size / 2:.3f}cm",
+            yshift=f"{self.at[1] + self.size / 2:.3f}cm",
+            scale=round(self.size / modules, 5),
+        )
+        scope.fill(qr_path(self.payload, self.level), color=self.color)
+
+    def __iter__(self):
+        yield (0, self)
@@ -0,0 +1,102 @@
+"""
+Higman subword embeddings.
+
+A word u embeds in a word v (u <=* v) when there is an increasing
+sequence of positions j_0 < j_1 < ... of v such that u[i] <= v[j_i]
+for every i. The leftmost such sequence is found greedily; with
+next-occurrence tables of v every letter of u is matched in constant
+time, so a query is linear in the length of u once v is indexed.
+"""
+
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+Letter = Hashable
+LetterOrder = Callable[[Letter, Letter], bool]
+
+
+class NextOccurrence:
+    """next-occurrence tables of a word
+
+    ``table(a)[p]`` is the smallest position ``q >= p`` such that
+    ``a <= word[q]`` for the letter ordering ``leq`` (equality when
+    ``leq`` is None), and ``len(word)`` when there is no such position.
+    Tables are built lazily, once per queried letter.
+    """
+
+    def __init__(self, word: Sequence[Letter], leq: Optional[LetterOrder] = None):
+        self.word = word
+        self.leq = leq
+        self._tables: Dict[Letter, List[int]] = {}
+        if leq is None:
+            self._index_equality()
+
+    def _index_equality(self):
+        # one right-to-left sweep builds the table of every letter of the word
+        n = len(self.word)
+        for a in set(self.word):
+            self._tables[a] = [n] * (n + 1)
+        for p in range(n - 1, -1, -1):
+            for a, table in self._tables.items():
+                table[p] = p if self.word[p] == a else table[p + 1]
+
+    def table(self, a: Letter) -> List[int]:
+        if a not in self._tables:
+            n = len(self.word)
+            table = [n] * (n + 1)
+            if self.leq is not None:
+                for p in range(n - 1, -1, -1):
+                    table[p] = p if self.leq(a, self.word[p]) else table[p + 1]
+            self._tables[a] = table
+        return self._tables[a]
+
+    def embed(self, small: Sequence[Letter]) -> Optional[List[int]]:
+        """leftmost embedding of ``small`` in the indexed word, if any"""
+        n = len(self.word)
+        embedding = []
+        p = 0
+        for a in small:
+            q = self.table(a)[p]
+            if q == n:
+                return None
+            embedding.append(q)
+            p = q + 1
+        return embedding
+
+
+def leftmost_embedding(
+    small: Sequence[Letter],
+    big: Sequence[Letter],
+    leq: Optional[LetterOrder] = None,
+) -> Optional[List[int]]:
+    """positions of ``big`` used by the leftmost embedding of ``small``
+
+    Returns None when ``small`` does not embed in ``big``.
+    """
+    return NextOccurrence(big, leq).embed(small)
+
+
+def is_subword(
+    small: Sequence[Letter],
+    big: Sequence[Letter],
+    leq: Optional[LetterOrder] = None,
+) -> bool:
+    return leftmost_embedding(small, big, leq) is not None
+
+
+def leftmost_embeddings(
+    pairs: Iterable[Tuple[Sequence[Letter], Sequence[Letter]]],
+    leq: Optional[LetterOrder] = None,
+) -> List[Optional[List[int]]]:
+    """leftmost embeddings of many (small, big) pairs
+
+    The index of every distinct big word is built once and shared by all
+    the pairs that use it.
+    """
+    indexes: Dict[Tuple[Letter, ...], NextOccurrence] = {}
+    result = []
+    for small, big in pairs:
+        key = tuple(big)
+        if key not in indexes:
+            indexes[key] = NextOccurrence(big, leq)
+        result.append(indexes[key].embed(small))
+    return result
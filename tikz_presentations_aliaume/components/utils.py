@@ -5,6 +5,104 @@ import dataclasses
 from typing import Literal, Generator, Callable, List, Union, Tuple, Optional
 import random
 
+from tikz_presentations_aliaume import (
+    assets,
+    bibliography,
+    build,
+    daemon,
+    framefile,
+    ir,
+    parallel,
+    pipeline,
+    preamble,
+    sourcemap,
+    validate,
+)
+from tikz_presentations_aliaume.components import lod
+from tikz_presentations_aliaume.passes import loops
+from tikz_presentations_aliaume.passes.dead import DeadElements
+from tikz_presentations_aliaume.passes.pics import PicRegistry
+from tikz_presentations_aliaume.passes.styles import StyleRegistry
+
+# frames are recorded in the compact representation of ir.py,
+# set to False to draw them through pytikz pictures instead
+NATIVE_IR = True
+
+
+def new_picture():
+    return ir.Picture() if NATIVE_IR else Picture()
+
+
+# passes rewriting native pictures before they are serialised
+OPTIMIZATIONS: List[Callable[[ir.Scope], None]] = [loops.compress_loops]
+
+
+def picture_code(pic, passes: Optional[List[Callable[[ir.Scope], None]]] = None) -> str:
+    if isinstance(pic, ir.Scope):
+        for optimize in OPTIMIZATIONS if passes is None else passes:
+            optimize(pic)
+    return pic.code()
+
+
+def slide_ends(depths: List[int]) -> List[int]:
+    """the last frame of every slide, slides starting at depth 0"""
+    return [k for k in range(len(depths)) if k + 1 == len(depths) or depths[k + 1] == 0]
+
+
+def frame_jobs(
+    anim, frame: Callable[[Picture, "Progress"], Picture], handout: bool = False
+) -> List[parallel.Job]:
+    """the jobs drawing the framed frames of an animation; a handout
+    only has the last frame of every slide, framed as a deck of its own
+    so that the progress bar and its links stay within the handout"""
+    states = list(anim)
+    if handout:
+        states = [states[k] for k in slide_ends([d for d, _ in states])]
+        depths = [0.5] * len(states)
+    else:
+        depths = [0.5 / (d + 1) for d, _ in states]
+    return [
+        parallel.Job(
+            num, d, state, Progress(num, depths), frame, new_picture, OPTIMIZATIONS
+        )
+        for num, (d, state) in enumerate(states)
+    ]
+
+
+def frames_code(
+    anim, frame: Callable[[Picture, "Progress"], Picture], handout: bool = False
+) -> Tuple[str, str, List[sourcemap.Frame]]:
+    """code of the framed frames of an animation, their definitions,
+    and where each frame starts; frames are drawn in parallel, see
+    parallel.py"""
+    results = parallel.render(frame_jobs(anim, frame, handout))
+
+    # colours, styles, braces and node names are checked before TeX runs
+    validator = validate.Validator()
+    # invisible elements become placeholders, style and pic
+    # definitions go once to the preamble
+    dead = DeadElements()
+    styles = StyleRegistry()
+    pics = PicRegistry()
+    chunks = []
+    mapped = []
+    line = 1
+    for result in results:
+        validator.errors += result.errors
+        validator.warnings += result.warnings
+        dead.merge(result.dead)
+        styles.merge(result.styles)
+        pics.merge(result.pics)
+        num, d = result.number, result.depth
+        chunks.append(f"% Frame number {num}, animation depth {d} \n" + result.code)
+        mapped.append(sourcemap.Frame(num, d, line + 1, result.origins))
+        line += chunks[-1].count("\n") + 3
+    validator.report()
+    definitions = "\n".join(
+        filter(None, [dead.preamble(), styles.preamble(), pics.preamble()])
+    )
+    return "\n\n\n".join(chunks), definitions, mapped
+
 
 @dataclasses.dataclass
 class Progress:
@@ -22,6 +120,19 @@ class PresConfig:
     date: str = "Please select date"
     draft: bool = True
     packgages: List[str] = dataclasses.field(default_factory=list)
+    level_of_detail: lod.LevelOfDetail = dataclasses.field(
+        default_factory=lod.LevelOfDetail
+    )
+    # compile reduced sub-drawings once, see assets.py
+    compile_assets: bool = False
+    # check the frames before compiling, see validate.py
+    check_frames: bool = True
+    # processes drawing the frames, None for one per CPU, see parallel.py
+    workers: Optional[int] = None
+    # socket of a compile daemon streamed frames are compiled by, see daemon.py
+    compile_daemon: Optional[str] = None
+    # only the last frame of every slide, for reviews and printing
+    handout: bool = False
 
     @property
     def height(self):
@@ -30,77 +141,73 @@ class PresConfig:
     def preview(self, anim):
         with open("preview.tex", "w") as f:
             f.write(self.to_tikz(anim))
-        os.system("xelatex preview.tex")
-        # if osx, then open, else xdg-open
-        if os.name == "posix":
-            if os.uname().sysname == "Darwin":
-                os.system("open preview.pdf")
-            else:
-                # spawn and do not wait for the process
-                os.system("xdg-open preview.pdf &")
+        print(lod.REPORT.summary())
+        assets.compile_pending()
+        build.build("preview.tex", source_map=sourcemap.LAST)
+        open_viewer("preview.pdf")
         print("DONE.")
 
-    def to_tikz(self, anim) -> str:
-        slides = list(self.to_slide_with_depth(anim))
-        packages = ["ensps-colorscheme", "amsmath", "amsfonts", "qrcode", "amssymb"]
-        imports = "\n".join(f"\\usepackage{{{p}}}" for p in packages)
-
-        depths = [0.5 / (d + 1) for d, _ in slides]
-
-        code = "\n\n\n".join(
-            [
-                f"% Frame number {num}, animation depth {d} \n"
-                + self.frame(p, Progress(num, depths)).code()
-                for num, (d, p) in enumerate(slides)
-            ]
+    def apply_settings(self):
+        lod.set_level_of_detail(self.level_of_detail)
+        assets.set_assets(self.compile_assets)
+        validate.set_validation(self.check_frames)
+        parallel.set_workers(self.workers)
+
+    def stream(self, anim):
+        """compile the frames while they are drawn, see pipeline.py"""
+        self.apply_settings()
+        compile_document = None
+        if self.compile_daemon is not None:
+            compile_document = daemon.Client(self.compile_daemon).compile
+        pipeline.stream(
+            frame_jobs(anim, self.frame, self.handout),
+            "preview.pdf",
+            packages=self.packgages,
+            on_first_page=lambda: open_viewer("preview.pdf"),
+            compile_document=compile_document,
         )
+        print(lod.REPORT.summary())
+        print("DONE.")
 
-        return r"""
-    \documentclass[tikz,9pt]{{standalone}}
-    \usepackage[maxbibnames=99,
-        style=alphabetic,
-        backend=biber,
-        sorting=ydnt,
-    ]{{biblatex}}
-    \usepackage{{hyperref}}
-    \hypersetup{{
-        colorlinks,
-        anchorcolor=A2,
-        linkcolor=A4,
-        citecolor=Prune,
-    }}
-    \usepackage[french]{{babel}}
-    \usepackage{{csquotes}}
-    \usepackage{{fontspec}}
-    \usepackage{{booktabs}}
-    \setmainfont{{EB Garamond}}
-    \usetikzlibrary{{decorations.markings}}
-    \usetikzlibrary{{decorations.pathmorphing,shapes}}
-    \usetikzlibrary{{decorations.pathreplacing}}
-    \usetikzlibrary{{arrows}}
-    \usetikzlibrary{{automata}}
-    \addbibresource{{papers.bib}}
-    \usepackage{{pifont}}% http://ctan.org/pkg/pifont
-    \newcommand{{\cmark}}{{\ding{{51}}}}%
-    \newcommand{{\xmark}}{{\ding{{55}}}}%
-    {imports}
-    \begin{{document}}
-    {code}
-    \end{{document}}
-    """.format(code=code, imports=imports)
+    def write_frames(self, anim, path: str):
+        """draw the frames to a frame file, compiled apart, see framefile.py"""
+        self.apply_settings()
+        count = framefile.write(
+            frame_jobs(anim, self.frame, self.handout), path, packages=self.packgages
+        )
+        print(f"{path}: {count} frames")
+
+    def to_tikz(self, anim) -> str:
+        self.apply_settings()
+        preamble.reset()
+        bibliography.reset()
+        code, definitions, frames = frames_code(anim, self.frame, self.handout)
+
+        # citations are resolved in Python, see bibliography.py
+        code, references = bibliography.resolve(code)
+        definitions = "\n".join(filter(None, [definitions, references]))
+
+        # only the packages and libraries used by the frames are loaded,
+        # hoisted styles and pics count as frame code
+        needs = preamble.NEEDED | preamble.detect(definitions + code)
+        header = preamble.assemble(needs, packages=self.packgages)
+
+        document = r"""
+{header}
+{definitions}
+\begin{{document}}
+{code}
+\end{{document}}
+""".format(code=code, header=header, definitions=definitions)
+        sourcemap.document_map(document, code, frames)
+        return document
 
     def to_slide(self, anim) -> Generator[Picture, None, None]:
         for state in anim:
-            pic = Picture()
+            pic = new_picture()
             state.draw(pic)
             yield pic
 
-    def to_slide_with_depth(self, anim) -> Generator[Tuple[int, Picture], None, None]:
-        for depth, state in anim:
-            pic = Picture()
-            state.draw(pic)
-            yield (depth, pic)
-
     def frame(self, pic: Picture, p: Progress) -> Picture:
         i = p.current
         pic.draw((0, 0), node("\\hypertarget{page-" + str(i + 1) + "}{}"), opacity=0)
@@ -207,65 +314,33 @@ def extract_author(author):
     return [name.split(",")[0] for name in names]
 
 
-def animation_to_slides(anim) -> Generator[Tuple[int, Picture], None, None]:
-    for depth, state in anim:
-        pic = Picture()
-        state.draw(pic)
-        yield (depth, pic)
+def tikz_of_animation(anim):
+    preamble.reset()
+    bibliography.reset()
+    code, definitions, frames = frames_code(anim, animation_frame)
 
+    code, references = bibliography.resolve(code)
+    definitions = "\n".join(filter(None, [definitions, references]))
 
-def tikz_of_animation(anim):
-    slides = list(animation_to_slides(anim))
-    packages = ["ensps-colorscheme", "amsmath", "amsfonts", "qrcode", "amssymb"]
-    imports = "\n".join(f"\\usepackage{{{p}}}" for p in packages)
-
-    depths = [0.5 / (d + 1) for d, _ in slides]
-
-    code = "\n\n\n".join(
-        [
-            f"% Frame number {num}, animation depth {d} \n"
-            + framing(Progress(num, depths), p).code()
-            for num, (d, p) in enumerate(slides)
-        ]
+    header = preamble.assemble(
+        preamble.NEEDED | preamble.detect(definitions + code),
+        hypersetup=["hidelinks", *preamble.HYPERSETUP],
     )
 
-    return r"""
-\documentclass[tikz,9pt]{{standalone}}
-\usepackage[maxbibnames=99,
-    style=alphabetic,
-    backend=biber,
-    sorting=ydnt,
-]{{biblatex}}
-\usepackage{{hyperref}}
-\hypersetup{{
-    hidelinks,
-    colorlinks,
-    anchorcolor=A2,
-    linkcolor=A4,
-    citecolor=Prune,
-}}
-\usepackage[french]{{babel}}
-\usepackage{{csquotes}}
-\usepackage{{fontspec}}
-\usepackage{{booktabs}}
-\setmainfont{{EB Garamond}}
-\usetikzlibrary{{decorations.markings}}
-\usetikzlibrary{{arrows}}
-\usetikzlibrary{{automata}}
-\addbibresource{{papers.bib}}
-\usepackage{{pifont}}% http://ctan.org/pkg/pifont
-\newcommand{{\cmark}}{{\ding{{51}}}}%
-\newcommand{{\xmark}}{{\ding{{55}}}}%
-{imports}
+    document = r"""
+{header}
+{definitions}
 \begin{{document}}
 {code}
 \end{{document}}
-""".format(code=code, imports=imports)
+""".format(code=code, header=header, definitions=definitions)
+    sourcemap.document_map(document, code, frames)
+    return document
 
 
 def to_slide(anim):
     for state in anim:
-        pic = Picture()
+        pic = new_picture()
         state.draw(pic)
         yield pic
 
@@ -275,17 +350,35 @@ def preview_animation(anim):
     with open("preview.tex", "w") as f:
         print(tikz_of_animation(anim))
         f.write(tikz_of_animation(anim))
+    print(lod.REPORT.summary())
+    assets.compile_pending()
     print("Compiling generated tex")
-    os.system("xelatex preview.tex")
+    build.build("preview.tex", source_map=sourcemap.LAST)
     print("Opening pdf viewer")
+    open_viewer("preview.pdf")
+    print("DONE.")
+
+
+def stream_animation(anim, handout: bool = False):
+    """compile the frames while they are drawn, see pipeline.py"""
+    pipeline.stream(
+        frame_jobs(anim, animation_frame, handout),
+        "preview.pdf",
+        hypersetup=["hidelinks", *preamble.HYPERSETUP],
+        on_first_page=lambda: open_viewer("preview.pdf"),
+    )
+    print(lod.REPORT.summary())
+    print("DONE.")
+
+
+def open_viewer(path: str):
     # if osx, then open, else xdg-open
     if os.name == "posix":
         if os.uname().sysname == "Darwin":
-            os.system("open preview.pdf")
+            os.system(f"open {path}")
         else:
             # spawn and do not wait for the process
-            os.system("xdg-open preview.pdf &")
-    print("DONE.")
+            os.system(f"xdg-open {path} &")
 
 
 @dataclasses.dataclass
@@ -363,6 +456,10 @@ def framing(p: Progress, pic: Picture) -> Picture:
         return progress_bar(p, pic)
 
 
+def animation_frame(pic: Picture, p: Progress) -> Picture:
+    return framing(p, pic)
+
+
 @dataclasses.dataclass
 class Sequential:
     frames: list
@@ -393,12 +490,18 @@ class SequentialAnimation:
             notFirst = 1
 
 
+def reduced_picture(code: str, size: float) -> str:
+    """node contents showing a picture scaled to the given width"""
+    included = assets.include(code, size)
+    if included is not None:
+        return included
+    return f"\\resizebox{{{size:0.2f}cm}}{{!}}{{ {code} }}"
+
+
 def drawing_to_node(d, size: float):
-    pic = Picture()
+    pic = new_picture()
     d.draw(pic)
-    code = pic.code()
-    node_ctn = f"\\resizebox{{{size:0.2f}cm}}{{!}}{{ {code} }}"
-    return node_ctn
+    return reduced_picture(picture_code(pic), size)
 
 
 @dataclasses.dataclass
@@ -411,10 +514,9 @@ class AnimateAndThenMinimize[T]:
 
     def draw(self, pic: Picture):
         if self.finished:
-            final_pic = Picture()
+            final_pic = new_picture()
             self.anim.draw(final_pic)
-            code = final_pic.code()
-            node_ctn = f"\\resizebox{{{self.size:0.2f}cm}}{{!}}{{ {code} }}"
+            node_ctn = reduced_picture(picture_code(final_pic), self.size)
             pic.node(
                 node_ctn,
                 **self.fin_args,
@@ -441,20 +543,24 @@ class AnimateAndThenMinimize[T]:
 
 @dataclasses.dataclass
 class Bibliography:
+    # entries shown without being cited, "*" for the whole papers.bib
+    keys: List[str] = dataclasses.field(default_factory=list)
+
     def draw(self, pic):
+        bibliography.nocite(*self.keys)
         pic.draw(
             (0, 0),
             node(
                 r"""
 \begin{minipage}{10cm}
-\printbibliography
+\tpabibliography
 \end{minipage}
         """
             ),
         )
 
     def __iter__(self):
-        yield (0, Bibliography())
+        yield (0, self)
 
 
 @dataclasses.dataclass
@@ -9,6 +9,12 @@ import bibtexparser
 
 from graphs import *
 from utils import *
+from tikz_presentations_aliaume.components.subwords import (
+    leftmost_embedding,
+    leftmost_embeddings,
+)
+from tikz_presentations_aliaume.components.lod import LevelOfDetail, keep
+from tikz_presentations_aliaume.geometry import arrow_at, to_curve
 
 
 @dataclasses.dataclass
@@ -225,11 +231,35 @@ class WQOWorks:
 class HigmanSubword:
     small_word: str
     big_word: str
-    embedding: List[int]
-    show_big_word: bool
-    show_embedding: bool
-    show_orders: bool
+    embedding: Optional[List[int]] = None
+    show_big_word: bool = True
+    show_embedding: bool = True
+    show_orders: bool = True
     show_thm: bool = False
+    leq: Optional[Callable[[str, str], bool]] = None
+    lod: Optional[LevelOfDetail] = None
+
+    def __post_init__(self):
+        # leftmost embedding for the letter ordering, None if there is none
+        if self.embedding is None:
+            self.embedding = leftmost_embedding(
+                self.small_word, self.big_word, self.leq
+            )
+
+    @staticmethod
+    def from_pairs(
+        pairs: List[Tuple[str, str]],
+        leq: Optional[Callable[[str, str], bool]] = None,
+    ) -> Sequential:
+        """one animation per (small, big) pair, embeddings computed in batch"""
+        embeddings = leftmost_embeddings(pairs, leq)
+        return Sequential(
+            [
+                HigmanSubword(small, big, embedding, leq=leq)
+                for (small, big), embedding in zip(pairs, embeddings)
+            ],
+            pos=0,
+        )
 
     def draw(self, pic: Picture):
         small_size = len(self.small_word)
@@ -279,25 +309,58 @@ class HigmanSubword:
                 sc.draw("(B0.north west)", rectangle(f"(B{big_size - 1}.south east)"))
 
         if self.show_orders:
-            for x, word, angle in [
-                ("A", self.small_word, "-90"),
-                ("B", self.big_word, "90"),
-            ]:
-                for i in range(len(word)):
-                    for j in range(i):
-                        sc.draw(
-                            f"({x}{i})",
-                            topath(f"({x}{j})", _in=angle, out=angle),
-                            opacity=1 / (i - j + 1),
-                            postaction=r"{decorate,decoration={markings,mark=at position 0.5 with {\arrow{>}}}}",
-                            opt="->",
-                        )
+            arrows = [
+                (x, angle, i, j)
+                for x, word, angle in [
+                    ("A", self.small_word, "-90"),
+                    ("B", self.big_word, "90"),
+                ]
+                for i in range(len(word))
+                for j in range(i)
+            ]
+            # the decoration budget goes to the most visible arrows first
+            kept = {
+                arrow
+                for arrow in sorted(arrows, key=lambda a: a[2] - a[3])
+                if keep(
+                    "HigmanSubword",
+                    opacity=1 / (arrow[2] - arrow[3] + 1),
+                    size=(arrow[2] - arrow[3]) * coef,
+                    decorated=True,
+                    lod=self.lod,
+                )
+            }
+            for x, angle, i, j in arrows:
+                if (x, angle, i, j) in kept:
+                    sc.draw(
+                        f"({x}{i})",
+                        topath(f"({x}{j})", _in=angle, out=angle),
+                        opacity=1 / (i - j + 1),
+                        opt="->",
+                    )
+                    # middle arrow, the curve leaves from the anchor facing
+                    # the angle and ends on the same anchor of the other node
+                    anchor = "north" if angle == "90" else "south"
+                    curve = to_curve(
+                        (0, 0), ((j - i) * coef, 0), int(angle), int(angle)
+                    )
+                    sc.draw(
+                        arrow_at(curve, 0.5, base=f"{x}{i}.{anchor}"),
+                        opacity=1 / (i - j + 1),
+                        opt="->",
+                    )
 
         if self.show_big_word and self.show_embedding:
-            for i, j in enumerate(self.embedding):
-                sc.draw(f"(A{i})", topath(f"(B{j})"), opt="->")
+            if self.embedding is None:
+                sc.draw(
+                    (0, -2),
+                    node(r"$u \not\leq^* v$", font="\\large", color="A2"),
+                )
+            else:
+                for i, j in enumerate(self.embedding):
+                    sc.draw(f"(A{i})", topath(f"(B{j})"), opt="->")
 
-            sc.draw((0, -2), node(r"$\sigma = \{ (\leq, 2) \}$", font="\\large"))
+                sc.draw((0, -2), node(r"$\sigma = \{ (\leq, 2) \}$", font="\\large"))
 
         if self.show_thm:
             pic.node(
@@ -316,48 +379,24 @@ class HigmanSubword:
             )
 
     def __iter__(self):
-        yield (
-            0,
-            HigmanSubword(
-                self.small_word,
-                self.big_word,
-                self.embedding,
-                False,
-                False,
-                False,
-                False,
-            ),
-        )
-        yield (
-            1,
-            HigmanSubword(
-                self.small_word,
-                self.big_word,
-                self.embedding,
-                True,
-                False,
-                False,
-                False,
-            ),
-        )
-        yield (
-            1,
-            HigmanSubword(
-                self.small_word, self.big_word, self.embedding, True, True, False, False
-            ),
-        )
-        yield (
-            1,
-            HigmanSubword(
-                self.small_word, self.big_word, self.embedding, True, True, True, False
-            ),
-        )
-        yield (
-            1,
-            HigmanSubword(
-                self.small_word, self.big_word, self.embedding, True, True, True, True
-            ),
-        )
+        steps = [
+            (0, False, False, False, False),
+            (1, True, False, False, False),
+            (1, True, True, False, False),
+            (1, True, True, True, False),
+            (1, True, True, True, True),
+        ]
+        for depth, big_word, embedding, orders, thm in steps:
+            yield (
+                depth,
+                dataclasses.replace(
+                    self,
+                    show_big_word=big_word,
+                    show_embedding=embedding,
+                    show_orders=orders,
+                    show_thm=thm,
+                ),
+            )
 
 
 @dataclasses.dataclass
@@ -781,7 +820,7 @@ if __name__ == "__main__":
                     ),
                     utilite=WqoUtilite(),
                 ),
-                HigmanSubword("psl", "paris-saclay", [0, 4, 9], True, True, True),
+                HigmanSubword("psl", "paris-saclay"),
                 GraphWqo(),
                 FinitePaths(0),
                 PouzetConjectures(0),
@@ -0,0 +1,398 @@
+"""
+Compile daemon.
+
+An engine compiling a frame spends most of its time before the frame:
+loading the fonts (EB Garamond through fontspec), pgf, TikZ and the
+colour scheme. The daemon keeps engines that already went through the
+preamble of the frames, so that a frame only costs its own code:
+
+* a warm engine is started on the preamble of a frame document, what
+  comes before ``framefile.PREAMBLE``, and then waits on its terminal
+  for the name of the file holding the rest, which it ``\\input``s;
+* TeX cannot be reset between two documents, a warm engine compiles a
+  single frame: the daemon starts the next engine for the same preamble
+  as soon as one is taken. At most ``WARM`` engines wait, the least
+  recently used preamble goes first, and an engine waiting for more
+  than ``MAX_IDLE`` seconds is restarted, so that a change to the
+  colour scheme or the fonts is seen;
+* requests come over a Unix socket, one JSON request and one JSON
+  response per line as in farm.py, from the pipeline (``--daemon``,
+  following a frame file or not) and from ``PresConfig.stream``;
+  compiled frames go to the frame cache (``pipeline.FRAME_DIR``).
+
+``status`` tells the requests queued and running, the warm engines and
+the time the last requests waited and took:
+
+    uv run python -m tikz_presentations_aliaume.daemon serve
+    uv run python -m tikz_presentations_aliaume.pipeline deck.frames --daemon
+    uv run python -m tikz_presentations_aliaume.daemon status
+"""
+
+import argparse
+import collections
+import dataclasses
+import json
+import os
+import queue
+import shutil
+import socket
+import socketserver
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from tikz_presentations_aliaume import build, framefile, pipeline, sourcemap
+
+SOCKET = ".compile-daemon.sock"
+
+# requests compiled at once
+WORKERS = os.cpu_count() or 1
+
+# engines waiting for a frame, over all preambles
+WARM = 4
+
+# seconds after which a waiting engine is restarted
+MAX_IDLE = 300.0
+
+# requests the latency statistics are taken over
+LATENCY_WINDOW = 200
+
+# the end of a warm document: the name of the rest, from the terminal
+WAIT = "{\\endlinechar=-1 \\global\\read-1 to \\framebody}\\input{\\framebody}\n"
+
+
+def split(document: str) -> Optional[Tuple[str, str]]:
+    """preamble and rest of a frame document, None when not a frame"""
+    head, marker, rest = document.partition(framefile.PREAMBLE + "\n")
+    if not marker:
+        return None
+    return head + marker, rest
+
+
+def _read(path: str) -> str:
+    try:
+        with open(path, errors="replace") as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
+
+
+class WarmEngine:
+    """an engine that went through a preamble and waits for a frame"""
+
+    def __init__(self, head: str, engine: str = "xelatex"):
+        self.head = head
+        self.engine = engine
+        self.started = time.monotonic()
+        self.directory = tempfile.mkdtemp(prefix="warm-")
+        source = os.path.join(self.directory, "frame.tex")
+        with open(source, "w") as f:
+            f.write(head + WAIT)
+        # reading the terminal is not allowed in nonstop mode; run from
+        # here, where the colour scheme and assets are
+        self.process = subprocess.Popen(
+            [
+                engine,
+                "-interaction=scrollmode",
+                "-halt-on-error",
+                "-file-line-error",
+                f"-output-directory={self.directory}",
+                source,
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def compile(self, rest: str, path: str, timeout: float = build.TIMEOUT):
+        """compile the rest of the document to path, raises build.CompileError"""
+        body = os.path.join(self.directory, "body.tex")
+        log = os.path.splitext(path)[0] + ".log"
+        # lines of the rest numbered as in the whole document
+        with open(body, "w") as f:
+            f.write("\n" * self.head.count("\n") + rest)
+        try:
+            self.process.communicate(body.encode() + b"\n", timeout=timeout)
+        except subprocess.TimeoutExpired:
+            raise build.CompileTimeout(
+                f"{self.engine} timed out after {timeout}s", []
+            ) from None
+        finally:
+            self.close()
+            if os.path.exists(os.path.join(self.directory, "frame.log")):
+                shutil.copyfile(os.path.join(self.directory, "frame.log"), log)
+            if self.process.returncode == 0:
+                os.replace(os.path.join(self.directory, "frame.pdf"), path)
+            shutil.rmtree(self.directory, ignore_errors=True)
+        if self.process.returncode != 0:
+            text = _read(log)
+            raise build.CompileError(
+                f"{self.engine} failed, see {log}", build.parse_log(text), text
+            )
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+    def discard(self):
+        self.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+@dataclasses.dataclass
+class Request:
+    document: str
+    engine: str
+    received: float = dataclasses.field(default_factory=time.monotonic)
+    done: threading.Event = dataclasses.field(default_factory=threading.Event)
+    path: str = ""
+    error: str = ""
+    log: str = ""
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    values = sorted(values)
+    return {
+        "mean": round(sum(values) / len(values), 3),
+        "p50": round(values[len(values) // 2], 3),
+        "p90": round(values[int(len(values) * 0.9)], 3),
+        "max": round(values[-1], 3),
+    }
+
+
+class Daemon:
+    def __init__(self, workers: int = WORKERS, warm: int = WARM):
+        self.warm = warm
+        self.requests: "queue.Queue[Optional[Request]]" = queue.Queue()
+        self.lock = threading.Lock()
+        # (engine, preamble) -> waiting engines, least recently used first
+        self.idle: "collections.OrderedDict[Tuple[str, str], List[WarmEngine]]" = (
+            collections.OrderedDict()
+        )
+        self.running = 0
+        self.compiled = 0
+        self.failed = 0
+        # (seconds queued, seconds compiling) of the last requests
+        self.latencies: "collections.deque[Tuple[float, float]]" = collections.deque(
+            maxlen=LATENCY_WINDOW
+        )
+        self.threads = [
+            threading.Thread(target=self.worker, daemon=True) for _ in range(workers)
+        ]
+
+    def start(self):
+        os.makedirs(pipeline.FRAME_DIR, exist_ok=True)
+        for thread in self.threads:
+            thread.start()
+
+    def compile(self, document: str, engine: str = "xelatex") -> Request:
+        """the request once compiled or failed"""
+        request = Request(document, engine)
+        self.requests.put(request)
+        request.done.wait()
+        return request
+
+    def _take(self, key: Tuple[str, str]) -> WarmEngine:
+        """a waiting engine for a preamble, started now if there is none"""
+        with self.lock:
+            engines = self.idle.get(key, [])
+            while engines:
+                engine = engines.pop(0)
+                if time.monotonic() - engine.started <= MAX_IDLE:
+                    return engine
+                engine.discard()
+        return WarmEngine(key[1], key[0])
+
+    def _prepare(self, key: Tuple[str, str]):
+        """start the next engine for a preamble"""
+        engine = WarmEngine(key[1], key[0])
+        with self.lock:
+            self.idle.setdefault(key, []).append(engine)
+            self.idle.move_to_end(key)
+            while sum(map(len, self.idle.values())) > self.warm:
+                oldest, engines = next(iter(self.idle.items()))
+                engines.pop(0).discard()
+                if not engines:
+                    del self.idle[oldest]
+
+    def _compile(self, request: Request) -> str:
+        key = framefile.content_hash(request.document)
+        path = pipeline.frame_path(key)
+        if os.path.exists(path):
+            return path
+        parts = split(request.document)
+        if parts is None:
+            return pipeline.compile_frame(request.document, None, request.engine)
+        head, rest = parts
+        engine = self._take((request.engine, head))
+        self._prepare((request.engine, head))
+        engine.compile(rest, path)
+        return path
+
+    def worker(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            start = time.monotonic()
+            with self.lock:
+                self.running += 1
+            try:
+                request.path = os.path.abspath(self._compile(request))
+            except build.CompileError as error:
+                request.error = str(error).partition("\n")[0]
+                request.log = error.log
+            except Exception as error:
+                request.error = f"{type(error).__name__}: {error}"
+            end = time.monotonic()
+            with self.lock:
+                self.running -= 1
+                if request.error:
+                    self.failed += 1
+                else:
+                    self.compiled += 1
+                self.latencies.append((start - request.received, end - start))
+            request.done.set()
+
+    def status(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "queued": self.requests.qsize(),
+                "running": self.running,
+                "warm": sum(map(len, self.idle.values())),
+                "compiled": self.compiled,
+                "failed": self.failed,
+                "queued_seconds": _summary([queued for queued, _ in self.latencies]),
+                "compile_seconds": _summary([taken for _, taken in self.latencies]),
+            }
+
+    def close(self):
+        for _ in self.threads:
+            self.requests.put(None)
+        for thread in self.threads:
+            thread.join()
+        with self.lock:
+            for engines in self.idle.values():
+                for engine in engines:
+                    engine.discard()
+            self.idle.clear()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.respond(json.loads(line))
+            except (ValueError, KeyError, TypeError) as error:
+                # the connection stays usable
+                response = {"error": f"malformed request: {error!r}", "log": ""}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+    def respond(self, request: dict) -> Any:
+        daemon: Daemon = self.server.daemon
+        op = request["op"]
+        if op == "compile":
+            if not isinstance(request["document"], str):
+                raise TypeError("the document is not a string")
+            done = daemon.compile(request["document"], str(request["engine"]))
+            if done.error:
+                return {"error": done.error, "log": done.log}
+            return {"path": done.path}
+        if op == "status":
+            return daemon.status()
+        return {"error": f"unknown operation {op}", "log": ""}
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, daemon: Daemon, path: str = SOCKET):
+        self.daemon = daemon
+        if os.path.exists(path):
+            # left over by a daemon that did not exit cleanly
+            os.remove(path)
+        super().__init__(path, _Handler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+class Client:
+    """compiles through a daemon, a pipeline.Compiler"""
+
+    def __init__(self, path: str = SOCKET):
+        self.path = path
+        # the pipeline compiles from several threads, a connection each
+        self.local = threading.local()
+
+    def _request(self, **request) -> Any:
+        file = getattr(self.local, "file", None)
+        if file is None:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.connect(self.path)
+            file = self.local.file = connection.makefile("rwb")
+        file.write(json.dumps(request).encode() + b"\n")
+        file.flush()
+        line = file.readline()
+        if not line:
+            self.local.file = None
+            raise ConnectionError("compile daemon went away")
+        return json.loads(line)
+
+    def compile(
+        self,
+        document: str,
+        source_map: Optional[sourcemap.SourceMap] = None,
+        engine: str = "xelatex",
+    ) -> str:
+        """path of the compiled frame, raises build.CompileError"""
+        response = self._request(op="compile", document=document, engine=engine)
+        if "error" in response:
+            raise build.CompileError(
+                response["error"],
+                build.parse_log(response["log"], source_map),
+                response["log"],
+            )
+        return response["path"]
+
+    def status(self) -> Dict[str, Any]:
+        return self._request(op="status")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="run the daemon")
+    serve_parser.add_argument("--socket", default=SOCKET)
+    serve_parser.add_argument("--workers", type=int, default=WORKERS)
+    serve_parser.add_argument("--warm", type=int, default=WARM)
+    status_parser = commands.add_parser("status", help="ask a daemon how it does")
+    status_parser.add_argument("--socket", default=SOCKET)
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        print(json.dumps(Client(args.socket).status(), indent=2))
+        return
+
+    daemon = Daemon(args.workers, args.warm)
+    daemon.start()
+    with DaemonServer(daemon, args.socket) as server:
+        print(f"compile daemon listening on {args.socket}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            daemon.close()
+
+
+if __name__ == "__main__":
+    main()
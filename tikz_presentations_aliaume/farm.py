@@ -0,0 +1,454 @@
+"""
+Compile farm.
+
+Frames can be compiled by worker processes that are not children of the
+build, on other machines or in containers, which pull jobs from a work
+queue:
+
+* ``WorkQueue`` holds the jobs, one per frame document, named after the
+  hash of the document. A worker leases a job for ``LEASE`` seconds; a
+  job whose lease expires goes back to the queue, at most
+  ``MAX_ATTEMPTS`` times, as does a job that timed out on a busy worker
+  or met a system error (full disk, missing engine) on its worker. A TeX
+  error or an asset that is not base64 fails the job at once, retrying
+  would fail the same way.
+  The compiled frame a worker uploads is stored in the frame cache
+  (``pipeline.FRAME_DIR``).
+* ``QueueServer`` serves a queue over a socket, one JSON request and
+  one JSON response per line, and ``RemoteQueue`` is the client with
+  the same methods as ``WorkQueue``. Requests are not authenticated:
+  the queue listens on localhost unless told otherwise, serve it to a
+  network you trust only.
+* ``work`` is the loop of a worker, on a ``WorkQueue`` in the same
+  process or on a ``RemoteQueue``. Workers run from a checkout of the
+  decks, where the images and the colour scheme are; the assets a frame
+  includes travel with its job.
+* ``Farm.compile`` queues a frame and waits for it, it is the compiler
+  the pipeline uses instead of running the engine itself.
+
+The build serves its queue and may run local workers too:
+
+    uv run python -m tikz_presentations_aliaume.farm build deck.frames --host 0.0.0.0
+    uv run python -m tikz_presentations_aliaume.farm work host:7878
+"""
+
+import argparse
+import base64
+import binascii
+import dataclasses
+import json
+import os
+import re
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from tikz_presentations_aliaume import assets, build, framefile, pipeline, sourcemap
+
+# seconds a worker has to compile a job
+LEASE = build.TIMEOUT + 60
+
+# leases of a job before it fails
+MAX_ATTEMPTS = 3
+
+# seconds a worker waits for a job in a request
+POLL = 5.0
+
+# jobs waited for at once by a build
+IN_FLIGHT = 64
+
+PORT = 7878
+
+# the assets a frame includes, see assets.asset_path
+ASSET = re.compile(re.escape(assets.ASSET_DIR) + r"/(\w+)\.pdf")
+
+
+@dataclasses.dataclass
+class Job:
+    key: str
+    document: str
+    # hash -> compiled asset, base64
+    assets: Dict[str, str] = dataclasses.field(default_factory=dict)
+    # pending, leased, done or failed
+    state: str = "pending"
+    attempts: int = 0
+    worker: str = ""
+    deadline: float = 0.0
+    error: str = ""
+    log: str = ""
+
+    def message(self) -> dict:
+        return {"key": self.key, "document": self.document, "assets": self.assets}
+
+
+class WorkQueue:
+    def __init__(self, lease: float = LEASE, max_attempts: int = MAX_ATTEMPTS):
+        self.lease_time = lease
+        self.max_attempts = max_attempts
+        self.jobs: Dict[str, Job] = {}
+        # keys of the pending jobs, oldest first
+        self.pending: List[str] = []
+        self.closed = False
+        self.changed = threading.Condition()
+
+    def put(self, key: str, document: str, assets: Dict[str, str]):
+        with self.changed:
+            job = self.jobs.get(key)
+            if job is not None and job.state != "failed":
+                return
+            self.jobs[key] = Job(key, document, assets)
+            self.pending.append(key)
+            self.changed.notify_all()
+
+    def _expire(self):
+        now = time.monotonic()
+        for job in self.jobs.values():
+            if job.state == "leased" and job.deadline < now:
+                self._retry(job, f"lease of {job.worker} expired")
+
+    def _retry(self, job: Job, error: str):
+        job.error = error
+        if job.attempts >= self.max_attempts:
+            job.state = "failed"
+        else:
+            job.state = "pending"
+            self.pending.append(job.key)
+        self.changed.notify_all()
+
+    def lease(self, worker: str, wait: float = 0.0) -> Optional[dict]:
+        """a job for the worker, None when there is none after wait seconds"""
+        end = time.monotonic() + wait
+        with self.changed:
+            while True:
+                self._expire()
+                if self.pending:
+                    job = self.jobs[self.pending.pop(0)]
+                    job.state = "leased"
+                    job.attempts += 1
+                    job.worker = worker
+                    job.deadline = time.monotonic() + self.lease_time
+                    return job.message()
+                remaining = end - time.monotonic()
+                if self.closed or remaining <= 0:
+                    return None
+                self.changed.wait(min(remaining, self.lease_time))
+
+    def _leased(self, key: str, worker: str) -> Optional[Job]:
+        job = self.jobs.get(key)
+        # a late worker whose lease was given to another one
+        if job is None or job.state != "leased" or job.worker != worker:
+            return None
+        return job
+
+    def complete(self, key: str, worker: str, data: bytes):
+        """store the compiled frame in the frame cache"""
+        with self.changed:
+            job = self._leased(key, worker)
+            if job is None:
+                return
+            path = pipeline.frame_path(key)
+            with open(path + ".part", "wb") as f:
+                f.write(data)
+            os.replace(path + ".part", path)
+            job.state = "done"
+            self.changed.notify_all()
+
+    def fail(self, key: str, worker: str, error: str, log: str, retry: bool):
+        with self.changed:
+            job = self._leased(key, worker)
+            if job is None:
+                return
+            job.log = log
+            if retry:
+                self._retry(job, error)
+            else:
+                job.error = error
+                job.state = "failed"
+                self.changed.notify_all()
+
+    def wait(self, key: str) -> Job:
+        """the job once done or failed"""
+        with self.changed:
+            while self.jobs[key].state not in ("done", "failed"):
+                self._expire()
+                self.changed.wait(self.lease_time)
+            return self.jobs[key]
+
+    def close(self):
+        """let the workers waiting for jobs go"""
+        with self.changed:
+            self.closed = True
+            self.changed.notify_all()
+
+    def status(self) -> Dict[str, int]:
+        with self.changed:
+            counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+            for job in self.jobs.values():
+                counts[job.state] += 1
+            return counts
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.respond(json.loads(line))
+            except (ValueError, KeyError, TypeError, AttributeError) as error:
+                # the connection stays usable
+                response = {"error": f"malformed request: {error!r}"}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+    def respond(self, request: dict) -> Any:
+        queue: WorkQueue = self.server.queue
+        op = request["op"]
+        if op == "lease":
+            return {
+                "job": queue.lease(
+                    str(request["worker"]), float(request.get("wait", 0.0))
+                ),
+                "closed": queue.closed,
+            }
+        if op == "complete":
+            queue.complete(
+                str(request["key"]),
+                str(request["worker"]),
+                base64.b64decode(request["pdf"], validate=True),
+            )
+            return {}
+        if op == "fail":
+            queue.fail(
+                str(request["key"]),
+                str(request["worker"]),
+                str(request["error"]),
+                str(request["log"]),
+                bool(request["retry"]),
+            )
+            return {}
+        if op == "status":
+            return queue.status()
+        return {"error": f"unknown operation {op}"}
+
+
+class QueueServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, queue: WorkQueue, address: Tuple[str, int]):
+        self.queue = queue
+        super().__init__(address, _Handler)
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class RemoteQueue:
+    """the worker side of a WorkQueue served by a QueueServer"""
+
+    def __init__(self, address: Tuple[str, int]):
+        self.connection = socket.create_connection(address)
+        self.file = self.connection.makefile("rwb")
+        self.closed = False
+
+    def _request(self, **request) -> Any:
+        self.file.write(json.dumps(request).encode() + b"\n")
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("queue server went away")
+        return json.loads(line)
+
+    def lease(self, worker: str, wait: float = 0.0) -> Optional[dict]:
+        response = self._request(op="lease", worker=worker, wait=wait)
+        self.closed = response["closed"]
+        return response["job"]
+
+    def complete(self, key: str, worker: str, data: bytes):
+        self._request(
+            op="complete",
+            key=key,
+            worker=worker,
+            pdf=base64.b64encode(data).decode(),
+        )
+
+    def fail(self, key: str, worker: str, error: str, log: str, retry: bool):
+        self._request(
+            op="fail", key=key, worker=worker, error=error, log=log, retry=retry
+        )
+
+    def status(self) -> Dict[str, int]:
+        return self._request(op="status")
+
+    def close(self):
+        self.file.close()
+        self.connection.close()
+
+
+def compile_job(job: dict, engine: str = "xelatex") -> bytes:
+    """compiled frame of a job, raises build.CompileError, OSError or
+    binascii.Error for an asset that is not base64"""
+    for key, data in job["assets"].items():
+        path = assets.asset_path(key)
+        if not os.path.exists(path):
+            content = base64.b64decode(data, validate=True)
+            os.makedirs(assets.ASSET_DIR, exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(content)
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, job["key"] + ".tex")
+        log = os.path.join(directory, job["key"] + ".log")
+        with open(source, "w") as f:
+            f.write(job["document"])
+        # run from here, where the colour scheme and assets are
+        build.run(
+            [
+                engine,
+                "-interaction=nonstopmode",
+                "-halt-on-error",
+                "-file-line-error",
+                f"-output-directory={directory}",
+                source,
+            ],
+            ".",
+            log,
+            build.TIMEOUT,
+        )
+        with open(os.path.join(directory, job["key"] + ".pdf"), "rb") as f:
+            return f.read()
+
+
+def work(
+    queue,
+    worker: Optional[str] = None,
+    engine: str = "xelatex",
+    until_closed: bool = True,
+) -> int:
+    """compile jobs of a WorkQueue or RemoteQueue, returns the jobs done;
+    stops when the queue is closed, or never when until_closed is False"""
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    done = 0
+    while True:
+        job = queue.lease(worker, POLL)
+        if job is None:
+            if until_closed and queue.closed:
+                return done
+            continue
+        try:
+            data = compile_job(job, engine)
+        except build.CompileTimeout as error:
+            # a slow or busy worker, another one may make it
+            queue.fail(job["key"], worker, str(error), "", True)
+            continue
+        except build.CompileError as error:
+            queue.fail(job["key"], worker, str(error), error.log, False)
+            continue
+        except binascii.Error as error:
+            # the job itself is broken, no worker can compile it
+            queue.fail(job["key"], worker, f"bad asset: {error}", "", False)
+            continue
+        except OSError as error:
+            # a full disk or a missing engine here, another worker may do
+            queue.fail(job["key"], worker, f"{type(error).__name__}: {error}", "", True)
+            continue
+        queue.complete(job["key"], worker, data)
+        done += 1
+
+
+class Farm:
+    """compile frames through a work queue, see pipeline.Compiler"""
+
+    def __init__(self, queue: WorkQueue):
+        self.queue = queue
+
+    def compile(
+        self,
+        document: str,
+        source_map: Optional[sourcemap.SourceMap] = None,
+        engine: str = "xelatex",
+    ) -> str:
+        key = framefile.content_hash(document)
+        path = pipeline.frame_path(key)
+        if os.path.exists(path):
+            return path
+        included = {}
+        for asset in set(ASSET.findall(document)):
+            with open(assets.asset_path(asset), "rb") as f:
+                included[asset] = base64.b64encode(f.read()).decode()
+        self.queue.put(key, document, included)
+        job = self.queue.wait(key)
+        if job.state == "failed":
+            reason = job.error.partition("\n")[0]
+            raise build.CompileError(
+                f"frame {key} failed on {job.worker}: {reason}",
+                build.parse_log(job.log, source_map),
+                job.log,
+            )
+        return path
+
+
+def _address(text: str) -> Tuple[str, int]:
+    host, _, port = text.rpartition(":")
+    return host or "localhost", int(port)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="compile a frame file on the farm")
+    build_parser.add_argument("frames")
+    build_parser.add_argument("-o", "--output", default=None)
+    build_parser.add_argument(
+        "--host",
+        default="localhost",
+        help="address to serve the queue on, 0.0.0.0 for every interface",
+    )
+    build_parser.add_argument("--port", type=int, default=PORT)
+    build_parser.add_argument("--local-workers", type=int, default=0)
+    build_parser.add_argument("--follow", action="store_true")
+    build_parser.add_argument("--engine", default="xelatex")
+    work_parser = commands.add_parser("work", help="compile jobs of a farm")
+    work_parser.add_argument("address")
+    work_parser.add_argument("--engine", default="xelatex")
+    args = parser.parse_args(argv)
+
+    if args.command == "work":
+        queue = RemoteQueue(_address(args.address))
+        try:
+            work(queue, engine=args.engine, until_closed=False)
+        except ConnectionError:
+            pass
+        return
+
+    queue = WorkQueue()
+    server = QueueServer(queue, (args.host, args.port))
+    server.start()
+    workers = [
+        threading.Thread(
+            target=work, args=(queue,), kwargs={"engine": args.engine}, daemon=True
+        )
+        for _ in range(args.local_workers)
+    ]
+    for thread in workers:
+        thread.start()
+    try:
+        pipeline.compile_file(
+            args.frames,
+            args.output or os.path.splitext(args.frames)[0] + ".pdf",
+            args.engine,
+            IN_FLIGHT,
+            args.follow,
+            Farm(queue).compile,
+        )
+    finally:
+        queue.close()
+        server.shutdown()
+    print(queue.status())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Frame files.
+
+A frame file holds the drawn frames of a deck, so that they can be
+compiled elsewhere, later, or by several machines, without importing
+the deck module. It is written frame by frame and only ever appended
+to; a reader sees the frames written so far.
+
+Layout: the magic line ``MAGIC``, then records, each made of an 8 bytes
+header (payload length and frame index, big endian) and a payload of
+zlib compressed JSON. The first record (index ``DECK``) holds the
+settings of the deck, the hyperref options, the extra packages and
+the number of frames, the other ones a ``Record`` each. Frames are not necessarily in order:
+frames citing the bibliography come last, once every citation is known.
+The reader indexes the record headers and seeks to a frame on demand.
+
+The hash of a record is that of its standalone document, which is also
+the key of the compiled frame in ``pipeline.FRAME_DIR``: a cache can
+tell whether a frame has to be compiled from the record alone.
+
+    uv run python -m tikz_presentations_aliaume.framefile mcf_bordeaux
+"""
+
+import argparse
+import dataclasses
+import hashlib
+import importlib
+import json
+import random
+import struct
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from tikz_presentations_aliaume import (
+    bibliography,
+    parallel,
+    preamble,
+    sourcemap,
+    validate,
+)
+from tikz_presentations_aliaume.components import lod
+
+MAGIC = b"TPA frames 1\n"
+
+HEADER = struct.Struct(">II")
+
+# index of the record holding the settings of the deck
+DECK = 0xFFFFFFFF
+
+# line closing the preamble of a frame document, before its definitions;
+# warm engines are started on what comes before, see daemon.py
+PREAMBLE = "% end of the preamble"
+
+
+@dataclasses.dataclass
+class Record:
+    index: int
+    depth: int
+    # module.qualname of the state drawing the frame
+    component: str
+    # preamble requirements, see preamble.py
+    needs: List[str]
+    # hash -> snippet document of the assets to compile first, see assets.py
+    assets: Dict[str, str]
+    # styles, pics and bibliography the picture uses
+    definitions: str
+    code: str
+    # emitter of every line of the code, see sourcemap.py
+    origins: List[str]
+    hash: str = ""
+
+
+def document(
+    record: Record,
+    hypersetup: Optional[List[str]] = None,
+    packages: Iterable[str] = (),
+) -> Tuple[str, sourcemap.SourceMap]:
+    """standalone document of a frame, and where its lines come from"""
+    header = preamble.assemble(
+        set(record.needs) | preamble.detect(record.definitions + record.code),
+        hypersetup=hypersetup,
+        packages=packages,
+    )
+    head = f"{header}\n{PREAMBLE}\n{record.definitions}\n\\begin{{document}}\n"
+    frame = sourcemap.Frame(
+        record.index, record.depth, head.count("\n") + 1, record.origins
+    )
+    return f"{head}{record.code}\\end{{document}}\n", sourcemap.SourceMap([frame])
+
+
+def content_hash(document: str) -> str:
+    return hashlib.sha1(document.encode()).hexdigest()[:16]
+
+
+def _record(result: parallel.Result, code: str, references: str = "") -> Record:
+    definitions = "\n".join(
+        filter(
+            None,
+            [
+                result.dead.preamble(),
+                result.styles.preamble(),
+                result.pics.preamble(),
+                references,
+            ],
+        )
+    )
+    return Record(
+        result.number,
+        result.depth,
+        result.component,
+        sorted(result.needs),
+        result.pending,
+        definitions,
+        code,
+        result.origins,
+    )
+
+
+def _cited(code: str) -> set:
+    return {
+        key.strip()
+        for m in bibliography.CITE.finditer(code)
+        for key in m.group(1).split(",")
+    }
+
+
+def records(jobs: Iterable[parallel.Job]) -> Iterator[Record]:
+    """draw the frames one by one, frames citing the bibliography last;
+    the issues of a frame are reported as soon as it is drawn, before
+    it is compiled (see validate.py)"""
+    report = lod.REPORT
+    state = random.getstate()
+    validator = validate.Validator()
+    deferred: List[parallel.Result] = []
+    cited = set()
+    try:
+        for job in jobs:
+            result = parallel.render_frame(job)
+            report.merge(result.report)
+            validator.errors, validator.warnings = result.errors, result.warnings
+            validator.report()
+            cited |= result.nocite | _cited(result.code)
+            if (
+                bibliography.CITE.search(result.code)
+                or bibliography.MACRO in result.code
+            ):
+                deferred.append(result)
+            else:
+                yield _record(result, result.code)
+
+        # every citation is known, labels are those of the whole deck
+        bibliography.reset()
+        bibliography.nocite(*cited)
+        for result in deferred:
+            yield _record(result, *bibliography.resolve(result.code))
+    finally:
+        random.setstate(state)
+        lod.REPORT = report
+
+
+def _pack(index: int, payload: dict) -> bytes:
+    data = zlib.compress(json.dumps(payload, separators=(",", ":")).encode())
+    return HEADER.pack(len(data), index) + data
+
+
+class FrameWriter:
+    def __init__(
+        self,
+        path: str,
+        hypersetup: Optional[List[str]] = None,
+        packages: Iterable[str] = (),
+        frames: Optional[int] = None,
+    ):
+        self.hypersetup = hypersetup
+        self.packages = list(packages)
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        deck = {"hypersetup": hypersetup, "packages": self.packages, "frames": frames}
+        self.file.write(_pack(DECK, deck))
+        self.file.flush()
+
+    def write(self, record: Record):
+        """append a frame, its hash is set on the way"""
+        record.hash = content_hash(document(record, self.hypersetup, self.packages)[0])
+        self.file.write(_pack(record.index, dataclasses.asdict(record)))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self) -> "FrameWriter":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class FrameReader:
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a frame file")
+        # frame index -> (offset of the payload, length), in file order
+        self.offsets: Dict[int, Tuple[int, int]] = {}
+        self.end = len(MAGIC)
+        self.hypersetup: Optional[List[str]] = None
+        self.packages: List[str] = []
+        # frames the deck has, None when unknown
+        self.frames: Optional[int] = None
+        self.refresh()
+
+    def refresh(self) -> int:
+        """index the records appended since, returns the number of frames"""
+        size = self.file.seek(0, 2)
+        while self.end + HEADER.size <= size:
+            self.file.seek(self.end)
+            length, index = HEADER.unpack(self.file.read(HEADER.size))
+            start = self.end + HEADER.size
+            if start + length > size:
+                # a record being written
+                break
+            self.end = start + length
+            if index == DECK:
+                deck = self._payload(start, length)
+                self.hypersetup = deck["hypersetup"]
+                self.packages = deck["packages"]
+                self.frames = deck["frames"]
+            else:
+                self.offsets[index] = (start, length)
+        return len(self.offsets)
+
+    def _payload(self, start: int, length: int) -> dict:
+        self.file.seek(start)
+        return json.loads(zlib.decompress(self.file.read(length)))
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def indices(self) -> List[int]:
+        return sorted(self.offsets)
+
+    def __getitem__(self, index: int) -> Record:
+        return Record(**self._payload(*self.offsets[index]))
+
+    def __iter__(self) -> Iterator[Record]:
+        """frames in file order"""
+        for index in list(self.offsets):
+            yield self[index]
+
+    def document(self, record: Record) -> Tuple[str, sourcemap.SourceMap]:
+        return document(record, self.hypersetup, self.packages)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self) -> "FrameReader":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def write(
+    jobs: List[parallel.Job],
+    path: str,
+    hypersetup: Optional[List[str]] = None,
+    packages: Iterable[str] = (),
+) -> int:
+    """draw frames to a frame file, returns the number of frames"""
+    count = 0
+    with FrameWriter(path, hypersetup, packages, len(jobs)) as writer:
+        for record in records(jobs):
+            writer.write(record)
+            count += 1
+    return count
+
+
+def main(argv: Optional[List[str]] = None):
+    from tikz_presentations_aliaume.components import utils
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("deck")
+    parser.add_argument("-o", "--output", default=None)
+    parser.add_argument(
+        "--handout", action="store_true", help="the last frame of every slide only"
+    )
+    args = parser.parse_args(argv)
+
+    deck = importlib.import_module(args.deck).deck()
+    output = args.output or args.deck + ".frames"
+    count = write(
+        utils.frame_jobs(deck, utils.animation_frame, args.handout),
+        output,
+        hypersetup=["hidelinks", *preamble.HYPERSETUP],
+    )
+    print(f"{output}: {count} frames")
+
+
+if __name__ == "__main__":
+    main()
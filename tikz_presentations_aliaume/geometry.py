@@ -0,0 +1,200 @@
+"""
+Decoration geometry computed in Python.
+
+pgf's decoration engine walks the path to decorate in TeX arithmetic on
+every compilation, which makes decorated paths some of the slowest
+elements of a frame. The functions below compute the same shapes once
+(results are cached by parameters) and return plain TikZ path code:
+
+* ``snake``: the ``snake`` decoration of a straight edge, as a chain of
+  Bézier half-waves followed by a straight end for the arrow tip;
+* ``to_curve`` and ``arrow_at``: the curve drawn by
+  ``to[out=..,in=..]`` and a short segment ending at a given fraction of
+  its length, replacing ``markings`` with ``mark=at position f with
+  {\\arrow{>}}``;
+* ``brace``: the outline of the ``brace`` decoration, and ``raised``
+  for its ``raise`` key.
+
+Lengths are in cm, ``PT`` converts TeX points.
+"""
+
+import functools
+import math
+from typing import Optional, Tuple
+
+from tikz_presentations_aliaume.ir import fmt_coordinate, fmt_number
+
+PT = 2.54 / 72.27
+
+# distance of the control points of to[out,in], relative to the chord
+TO_DISTANCE = 0.3915
+
+# points sampled on a curve to measure its length
+SAMPLES = 64
+
+Point = Tuple[float, float]
+Curve = Tuple[Point, Point, Point, Point]
+
+
+def _frame(start: Point, end: Point) -> Tuple[float, Point, Point]:
+    """length, unit direction and left normal of a segment"""
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    length = math.hypot(dx, dy)
+    if length == 0:
+        raise ValueError("degenerate segment")
+    u = (dx / length, dy / length)
+    return length, u, (-u[1], u[0])
+
+
+def _place(start: Point, u: Point, n: Point, x: float, y: float) -> str:
+    return fmt_coordinate(
+        (
+            round(start[0] + x * u[0] + y * n[0], 3),
+            round(start[1] + x * u[1] + y * n[1], 3),
+        )
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def snake(
+    start: Point,
+    end: Point,
+    amplitude: float = 2.5 * PT,
+    segment: float = 10 * PT,
+    trim_start: float = 0.0,
+    trim_end: float = 0.0,
+) -> str:
+    """snake from start to end, shortened by the trims (node borders)"""
+    length, u, n = _frame(start, end)
+    start = (start[0] + trim_start * u[0], start[1] + trim_start * u[1])
+    length -= trim_start + trim_end
+
+    # half-waves of a sine, the tangents at their ends match the sine
+    half = segment / 2
+    waves = max(0, int((length - 0.3 * segment) // half))
+    a = 4 * half / (3 * math.pi)
+    b = 4 * amplitude / 3
+
+    parts = [_place(start, u, n, 0, 0)]
+    for k in range(waves):
+        x, side = k * half, (1 if k % 2 == 0 else -1)
+        parts.append(
+            ".. controls "
+            + _place(start, u, n, x + a, side * b)
+            + " and "
+            + _place(start, u, n, x + half - a, side * b)
+            + " .. "
+            + _place(start, u, n, x + half, 0)
+        )
+    parts.append("-- " + _place(start, u, n, length, 0))
+    return " ".join(parts)
+
+
+def to_curve(
+    start: Point, end: Point, out: float, in_: float, looseness: float = 1.0
+) -> Curve:
+    """control points of start to[out=out,in=in_] end"""
+    d = TO_DISTANCE * looseness * math.hypot(end[0] - start[0], end[1] - start[1])
+    c1 = (
+        start[0] + d * math.cos(math.radians(out)),
+        start[1] + d * math.sin(math.radians(out)),
+    )
+    c2 = (
+        end[0] + d * math.cos(math.radians(in_)),
+        end[1] + d * math.sin(math.radians(in_)),
+    )
+    return start, c1, c2, end
+
+
+def _bezier(curve: Curve, t: float) -> Point:
+    s = 1 - t
+    w = (s * s * s, 3 * s * s * t, 3 * s * t * t, t * t * t)
+    return (
+        sum(wi * p[0] for wi, p in zip(w, curve)),
+        sum(wi * p[1] for wi, p in zip(w, curve)),
+    )
+
+
+def _derivative(curve: Curve, t: float) -> Point:
+    s = 1 - t
+    p0, p1, p2, p3 = curve
+    w = (3 * s * s, 6 * s * t, 3 * t * t)
+    deltas = [(b[0] - a[0], b[1] - a[1]) for a, b in [(p0, p1), (p1, p2), (p2, p3)]]
+    return (
+        sum(wi * d[0] for wi, d in zip(w, deltas)),
+        sum(wi * d[1] for wi, d in zip(w, deltas)),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def point_at(curve: Curve, fraction: float) -> Tuple[Point, Point]:
+    """point and unit tangent at a fraction of the length of a curve"""
+    points = [_bezier(curve, k / SAMPLES) for k in range(SAMPLES + 1)]
+    lengths = [0.0]
+    for a, b in zip(points, points[1:]):
+        lengths.append(lengths[-1] + math.hypot(b[0] - a[0], b[1] - a[1]))
+    target = fraction * lengths[-1]
+    k = 1
+    while k < SAMPLES and lengths[k] < target:
+        k += 1
+    piece = lengths[k] - lengths[k - 1]
+    t = (k - 1 + ((target - lengths[k - 1]) / piece if piece else 0)) / SAMPLES
+    dx, dy = _derivative(curve, t)
+    norm = math.hypot(dx, dy) or 1
+    return _bezier(curve, t), (dx / norm, dy / norm)
+
+
+def arrow_at(
+    curve: Curve, fraction: float, base: Optional[str] = None, length: float = 0.02
+) -> str:
+    """
+    short segment ending at a fraction of the curve, to be drawn with an
+    arrow tip; coordinates are relative to the node anchor ``base`` if any
+    """
+    (x, y), (tx, ty) = point_at(curve, fraction)
+    ends = [(x - length * tx, y - length * ty), (x, y)]
+    if base is None:
+        return " -- ".join(fmt_coordinate((round(a, 3), round(b, 3))) for a, b in ends)
+    return " -- ".join(
+        f"([shift={{{fmt_coordinate((round(a, 3), round(b, 3)))}}}]{base})"
+        for a, b in ends
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def brace(
+    start: Point,
+    end: Point,
+    amplitude: float = 5 * PT,
+    aspect: float = 0.5,
+    mirror: bool = False,
+) -> str:
+    """outline of the brace decoration of the segment, before its raise"""
+    length, u, n = _frame(start, end)
+    a = amplitude
+    side = -1 if mirror else 1
+
+    def p(x: float, y: float) -> str:
+        return _place(start, u, n, x, side * y)
+
+    tip = aspect * length
+    return " ".join(
+        [
+            p(0, 0),
+            f".. controls {p(0.15 * a, 0.3 * a)} and {p(0.5 * a, 0.5 * a)} .. {p(a, 0.5 * a)}",
+            f"-- {p(tip - a, 0.5 * a)}",
+            f".. controls {p(tip - 0.5 * a, 0.5 * a)} and {p(tip - 0.15 * a, 0.7 * a)} .. {p(tip, a)}",
+            f".. controls {p(tip + 0.15 * a, 0.7 * a)} and {p(tip + 0.5 * a, 0.5 * a)} .. {p(tip + a, 0.5 * a)}",
+            f"-- {p(length - a, 0.5 * a)}",
+            f".. controls {p(length - 0.5 * a, 0.5 * a)} and {p(length - 0.15 * a, 0.3 * a)} .. {p(length, 0)}",
+        ]
+    )
+
+
+def raised(start: Point, end: Point, distance: str, mirror: bool = False) -> str:
+    """value of ``shift`` applying the raise key of a brace, any TeX length"""
+    _, _, n = _frame(start, end)
+    if mirror:
+        n = (-n[0], -n[1])
+    angle = fmt_number(math.degrees(math.atan2(n[1], n[0])))
+    return f"{{({angle}:{distance})}}"
@@ -0,0 +1,262 @@
+"""
+Compact drawing representation.
+
+``Picture`` and ``Scope`` accept the calls the components make on pytikz
+pictures (``node``, ``draw``, ``path``, ``coordinate``, ``scope``,
+``style``) but only record them as small records. ``code`` serialises
+the whole tree through a single string buffer, one command per line,
+with numbers written in a canonical form so that equal drawings always
+produce equal code.
+
+Path specifications may mix coordinates (tuples), verbatim TikZ code
+(strings, e.g. ``"(A0)"``) and pytikz path operations (``node``,
+``topath``, ``lineto``...), which render themselves.
+"""
+
+import io
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+Options = Tuple[Tuple[str, Any], ...]
+
+# remember the function that emitted each command, see sourcemap.py
+TRACE_ORIGINS = True
+
+
+def fmt_number(x) -> str:
+    """canonical form of a number: at most 5 decimals, no trailing zeros"""
+    if isinstance(x, bool):
+        return "true" if x else "false"
+    if isinstance(x, int):
+        return str(x)
+    code = f"{x:.5f}".rstrip("0").rstrip(".")
+    return "0" if code in ("-0", "") else code
+
+
+def fmt_coordinate(c) -> str:
+    if isinstance(c, str):
+        return c
+    return "(" + ",".join(fmt_number(x) for x in c) + ")"
+
+
+def fmt_value(v) -> str:
+    if isinstance(v, (int, float)):
+        return fmt_number(v)
+    if isinstance(v, tuple):
+        return "{" + fmt_coordinate(v) + "}"
+    return str(v)
+
+
+def make_options(opt: Optional[str], kwoptions: dict) -> Options:
+    """options as (key, value) pairs, ``opt`` is kept verbatim under key ''"""
+    options = [] if opt is None else [("", opt)]
+    options += [
+        (key.replace("_", " ").strip(), value)
+        for key, value in kwoptions.items()
+        if value is not None
+    ]
+    return tuple(options)
+
+
+def fmt_options(options: Options) -> str:
+    if not options:
+        return ""
+    parts = []
+    for key, value in options:
+        if key == "":
+            parts.append(value)
+        elif value is True:
+            parts.append(key)
+        else:
+            parts.append(f"{key}={fmt_value(value)}")
+    return "[" + ",".join(parts) + "]"
+
+
+def fmt_operation(op) -> str:
+    if isinstance(op, str):
+        return op
+    if isinstance(op, tuple):
+        return fmt_coordinate(op)
+    # pytikz path operation
+    code = op._code()
+    return "" if code is None else code
+
+
+class Node:
+    __slots__ = ("contents", "name", "at", "options")
+
+    def __init__(self, contents: str, name, at, options: Options):
+        self.contents = contents
+        self.name = name
+        self.at = at
+        self.options = options
+
+    def write(self, out: io.StringIO):
+        out.write("\\node")
+        out.write(fmt_options(self.options))
+        if self.name is not None:
+            out.write(f" ({self.name})")
+        if self.at is not None:
+            out.write(" at ")
+            out.write(fmt_coordinate(self.at))
+        out.write(" {")
+        out.write(str(self.contents))
+        out.write("};\n")
+
+
+class Path:
+    __slots__ = ("command", "spec", "options")
+
+    def __init__(self, command: str, spec: tuple, options: Options):
+        self.command = command
+        self.spec = spec
+        self.options = options
+
+    def write(self, out: io.StringIO):
+        out.write("\\")
+        out.write(self.command)
+        out.write(fmt_options(self.options))
+        for op in self.spec:
+            code = fmt_operation(op)
+            if code:
+                out.write(" ")
+                out.write(code)
+        out.write(";\n")
+
+
+class Coordinate:
+    __slots__ = ("name", "at", "options")
+
+    def __init__(self, name: str, at, options: Options):
+        self.name = name
+        self.at = at
+        self.options = options
+
+    def write(self, out: io.StringIO):
+        out.write("\\coordinate")
+        out.write(fmt_options(self.options))
+        out.write(f" ({self.name})")
+        if self.at is not None:
+            out.write(" at ")
+            out.write(fmt_coordinate(self.at))
+        out.write(";\n")
+
+
+class Style:
+    __slots__ = ("name", "options")
+
+    def __init__(self, name: str, options: Options):
+        self.name = name
+        self.options = options
+
+    def write(self, out: io.StringIO):
+        out.write(f"\\tikzset{{{self.name}/.style={{")
+        out.write(fmt_options(self.options)[1:-1])
+        out.write("}}\n")
+
+
+class Pic:
+    __slots__ = ("kind", "arguments", "options")
+
+    def __init__(self, kind: str, arguments: Tuple[str, ...], options: Options):
+        self.kind = kind
+        self.arguments = arguments
+        self.options = options
+
+    def write(self, out: io.StringIO):
+        out.write("\\pic")
+        out.write(fmt_options(self.options))
+        out.write(" at (0,0) {")
+        out.write(self.kind)
+        if self.arguments:
+            out.write("=")
+            out.write("".join(f"{{{a}}}" for a in self.arguments))
+        out.write("};\n")
+
+
+class Raw:
+    __slots__ = ("code",)
+
+    def __init__(self, code: str):
+        self.code = code
+
+    def write(self, out: io.StringIO):
+        out.write(self.code)
+        out.write("\n")
+
+
+class Scope:
+    """environment recording drawing commands"""
+
+    environment = "scope"
+
+    # emitter of the commands of a picture that have no origin of their own
+    origin = ""
+
+    def __init__(self, opt: Optional[str] = None, **kwoptions):
+        self.options = make_options(opt, kwoptions)
+        self.items: List[Any] = []
+        # id of an item -> qualified name of the function that emitted it
+        self.origins: Dict[int, str] = {}
+
+    def _add(self, item):
+        self.items.append(item)
+        if TRACE_ORIGINS:
+            self.origins[id(item)] = sys._getframe(2).f_code.co_qualname
+
+    def inherit_origin(self, new, old):
+        """give a rewritten item the origin of the item it replaces"""
+        origin = self.origins.get(id(old))
+        if origin is not None:
+            self.origins[id(new)] = origin
+
+    def node(self, contents, opt: Optional[str] = None, **kwoptions):
+        name = kwoptions.pop("name", None)
+        at = kwoptions.pop("at", None)
+        self._add(Node(contents, name, at, make_options(opt, kwoptions)))
+
+    def path(self, *spec, opt: Optional[str] = None, **kwoptions):
+        self._add(Path("path", spec, make_options(opt, kwoptions)))
+
+    def draw(self, *spec, opt: Optional[str] = None, **kwoptions):
+        self._add(Path("draw", spec, make_options(opt, kwoptions)))
+
+    def fill(self, *spec, opt: Optional[str] = None, **kwoptions):
+        self._add(Path("fill", spec, make_options(opt, kwoptions)))
+
+    def filldraw(self, *spec, opt: Optional[str] = None, **kwoptions):
+        self._add(Path("filldraw", spec, make_options(opt, kwoptions)))
+
+    def clip(self, *spec, opt: Optional[str] = None, **kwoptions):
+        self._add(Path("clip", spec, make_options(opt, kwoptions)))
+
+    def coordinate(self, name: str, opt: Optional[str] = None, at=None, **kwoptions):
+        self._add(Coordinate(name, at, make_options(opt, kwoptions)))
+
+    def style(self, name: str, opt: Optional[str] = None, **kwoptions):
+        self._add(Style(name, make_options(opt, kwoptions)))
+
+    def scope(self, opt: Optional[str] = None, **kwoptions) -> "Scope":
+        scope = Scope(opt, **kwoptions)
+        self._add(scope)
+        return scope
+
+    def add(self, code: str):
+        self._add(Raw(code))
+
+    def write(self, out: io.StringIO):
+        out.write(f"\\begin{{{self.environment}}}")
+        out.write(fmt_options(self.options))
+        out.write("\n")
+        for item in self.items:
+            item.write(out)
+        out.write(f"\\end{{{self.environment}}}\n")
+
+    def code(self) -> str:
+        out = io.StringIO()
+        self.write(out)
+        return out.getvalue()
+
+
+class Picture(Scope):
+    environment = "tikzpicture"
@@ -0,0 +1,231 @@
+"""
+Frames drawn in worker processes.
+
+Once the states of an animation are known, drawing a frame, checking
+it, running the passes and serialising it does not depend on the other
+frames. ``render`` spreads these jobs over a pool of ``WORKERS``
+processes and returns their results in frame order.
+
+Everything a frame leaves in module state while being drawn (declared
+requirements, citations, level of detail counts, pending assets) is
+reset before the frame and returned with its code, together with its
+own style, pic and placeholder tables. The caller merges them in frame
+order, so the document does not depend on the number of workers: style
+and pic names are hashes of their bodies, two workers defining the
+same style define the same name, and ``random`` is seeded with the
+number of the frame before drawing it.
+
+States that cannot be pickled (lambdas, generators...) are drawn in the
+calling process, and so are the frames of a worker that died or whose
+results could not be sent back (``UNSENT``); any other error raised
+while drawing comes back from the worker with its traceback. Workers are forked, where
+fork is not available every frame is drawn in the calling process.
+"""
+
+import concurrent.futures
+import concurrent.futures.process
+import dataclasses
+import multiprocessing
+import os
+import pickle
+import random
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from tikz_presentations_aliaume import (
+    assets,
+    bibliography,
+    ir,
+    preamble,
+    sourcemap,
+    validate,
+)
+from tikz_presentations_aliaume.components import lod
+from tikz_presentations_aliaume.passes.dead import DeadElements
+from tikz_presentations_aliaume.passes.pics import PicRegistry
+from tikz_presentations_aliaume.passes.styles import StyleRegistry
+
+# worker processes, None for one per CPU, 1 to draw every frame here
+WORKERS: Optional[int] = None
+
+# below that many frames, starting the pool costs more than it saves
+MIN_FRAMES = 16
+
+# jobs sent to a worker at once, per worker
+CHUNKS_PER_WORKER = 4
+
+# a worker that died, or results that could not come back from it
+UNSENT = (
+    concurrent.futures.process.BrokenProcessPool,
+    pickle.PicklingError,
+    AttributeError,
+)
+
+
+def set_workers(workers: Optional[int]):
+    global WORKERS
+    WORKERS = workers
+
+
+@dataclasses.dataclass
+class Job:
+    number: int
+    depth: int
+    state: Any
+    # utils.Progress of the frame
+    progress: Any
+    # (picture, progress) -> framed picture
+    frame: Callable[[Any, Any], Any]
+    new_picture: Callable[[], Any]
+    # passes run after the placeholders, styles and pics ones
+    passes: List[Callable[[ir.Scope], None]]
+
+
+@dataclasses.dataclass
+class Result:
+    number: int
+    depth: int
+    # module.qualname of the state
+    component: str
+    code: str
+    origins: List[str]
+    needs: Set[str]
+    nocite: Set[str]
+    pending: Dict[str, str]
+    report: lod.DetailReport
+    dead: DeadElements
+    styles: StyleRegistry
+    pics: PicRegistry
+    errors: List[validate.Issue]
+    warnings: List[validate.Issue]
+
+
+def render_frame(job: Job) -> Result:
+    """draw, check, optimise and serialise a frame"""
+    preamble.reset()
+    bibliography.reset()
+    assets.PENDING.clear()
+    lod.REPORT = lod.DetailReport()
+    lod.start_frame()
+    # random drawings do not depend on the worker drawing the frame
+    random.seed(job.number)
+
+    pic = job.new_picture()
+    if isinstance(pic, ir.Scope):
+        pic.origin = type(job.state).__qualname__
+    job.state.draw(pic)
+    pic = job.frame(pic, job.progress)
+
+    validator = validate.Validator()
+    dead = DeadElements()
+    styles = StyleRegistry()
+    pics = PicRegistry()
+    if isinstance(pic, ir.Scope):
+        if validate.ENABLED:
+            validator.check(pic, job.number)
+        for optimize in [dead.eliminate, styles.hoist, pics.extract, *job.passes]:
+            optimize(pic)
+        code, origins = sourcemap.code(pic)
+    else:
+        code, origins = pic.code(), []
+
+    return Result(
+        job.number,
+        job.depth,
+        f"{type(job.state).__module__}.{type(job.state).__qualname__}",
+        code,
+        origins,
+        set(preamble.NEEDED),
+        set(bibliography.NOCITE),
+        dict(assets.PENDING),
+        lod.REPORT,
+        dead,
+        styles,
+        pics,
+        validator.errors,
+        validator.warnings,
+    )
+
+
+def _render_pickled(jobs: List[bytes]) -> List[Result]:
+    return [render_frame(pickle.loads(job)) for job in jobs]
+
+
+def _pickled(job: Job) -> Optional[bytes]:
+    try:
+        return pickle.dumps(job)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return None
+
+
+def _workers() -> int:
+    return WORKERS if WORKERS is not None else os.cpu_count() or 1
+
+
+def _draw(jobs: List[Job]) -> List[Result]:
+    workers = _workers()
+    if (
+        workers <= 1
+        or len(jobs) < MIN_FRAMES
+        or "fork" not in multiprocessing.get_all_start_methods()
+    ):
+        return [render_frame(job) for job in jobs]
+
+    results: List[Optional[Result]] = [None] * len(jobs)
+    remote, local = [], []
+    for k, job in enumerate(jobs):
+        data = _pickled(job)
+        if data is None:
+            local.append(k)
+        else:
+            remote.append((k, data))
+    size = max(1, len(remote) // (workers * CHUNKS_PER_WORKER))
+    chunks = [remote[start : start + size] for start in range(0, len(remote), size)]
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("fork")
+    ) as pool:
+        futures = [
+            pool.submit(_render_pickled, [data for _, data in chunk])
+            for chunk in chunks
+        ]
+        # unpicklable states are drawn while the workers run
+        for k in local:
+            results[k] = render_frame(jobs[k])
+        redrawn, failure = 0, None
+        for chunk, future in zip(chunks, futures):
+            try:
+                drawn = future.result()
+            except UNSENT as error:
+                redrawn, failure = redrawn + len(chunk), error
+                drawn = [render_frame(jobs[k]) for k, _ in chunk]
+            for (k, _), result in zip(chunk, drawn):
+                results[k] = result
+    if failure is not None:
+        print(f"{redrawn} frames drawn here, a worker failed: {failure!r}")
+    return results
+
+
+def render(jobs: List[Job]) -> List[Result]:
+    """results of the jobs in order, their module state merged back here"""
+    needed = set(preamble.NEEDED)
+    nocite = set(bibliography.NOCITE)
+    pending = dict(assets.PENDING)
+    report = lod.REPORT
+    state = random.getstate()
+    try:
+        results = _draw(jobs)
+    finally:
+        random.setstate(state)
+        lod.REPORT = report
+        preamble.NEEDED.clear()
+        preamble.NEEDED.update(needed)
+        bibliography.NOCITE.clear()
+        bibliography.NOCITE.update(nocite)
+        assets.PENDING.clear()
+        assets.PENDING.update(pending)
+    for result in results:
+        preamble.NEEDED.update(result.needs)
+        bibliography.NOCITE.update(result.nocite)
+        assets.PENDING.update(result.pending)
+        report.merge(result.report)
+    return results
@@ -0,0 +1,213 @@
+"""
+Dead-element elimination.
+
+Components keep invisible elements (``opacity=0``) in their frames so
+that the layout does not move when they appear. TeX still typesets and
+draws them. This pass rewrites the fully transparent elements of a
+frame into placeholders that are measured but not drawn:
+
+* nodes keep their options and size but their contents are replaced by
+  a phantom, so no glyph nor image reaches the page;
+* paths become ``\\path`` commands, without their paint options, and are
+  removed altogether when they lie inside a rectangle drawn at the top
+  of the frame (the border drawn by ``framing``), where they cannot
+  change the bounding box, unless their options or those of a scope
+  around them transform their coordinates.
+
+Elements with side effects (link targets, labels, citations...) are
+left untouched, and so are paths carrying nodes.
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+from tikz_presentations_aliaume import ir
+
+SIDE_EFFECTS = (
+    "\\hypertarget",
+    "\\hyperlink",
+    "\\label",
+    "\\ref",
+    "\\pageref",
+    "\\cite",
+    "\\footnote",
+)
+
+# options that only change how an element is painted
+PAINT_KEYS = frozenset(
+    [
+        "draw",
+        "fill",
+        "color",
+        "text",
+        "pattern",
+        "pattern color",
+        "shade",
+        "top color",
+        "bottom color",
+        "left color",
+        "right color",
+        "inner color",
+        "outer color",
+        "ball color",
+        "draw opacity",
+        "fill opacity",
+        "text opacity",
+    ]
+)
+
+# options under which coordinates are still those of the picture
+UNTRANSFORMED = PAINT_KEYS | {"opacity"}
+
+# paragraphs can not go in a \phantom, they are measured in a \vbox
+PHANTOM_PARAGRAPH = (
+    r"\newcommand{\tpaparphantom}[1]"
+    r"{\setbox0\vbox{#1}\leavevmode\vrule width0pt height\ht0 depth\dp0}"
+)
+
+# path operations whose extent is the hull of their coordinates
+STRAIGHT = re.compile(
+    r"\s*(?:\(\s*-?[\d.]+\s*,\s*-?[\d.]+\s*\)|--|-\||\|-|\.\.|controls|and"
+    r"|rectangle|cycle)"
+)
+COORDINATE = re.compile(r"\(\s*(-?[\d.]+)\s*,\s*(-?[\d.]+)\s*\)")
+
+# distance kept to the border, for line widths and caps
+MARGIN = 0.1
+
+Box = Tuple[float, float, float, float]
+
+
+def _is_zero(value) -> bool:
+    if isinstance(value, bool):
+        return False
+    try:
+        return float(value) == 0
+    except (TypeError, ValueError):
+        return False
+
+
+def transparent(options: ir.Options, inherited: bool = False) -> bool:
+    """whether an element is invisible, ``inherited`` from its scope if unset"""
+    for key, value in options:
+        if key == "opacity":
+            return _is_zero(value)
+    return inherited
+
+
+def _untransformed(options: ir.Options) -> bool:
+    return {key for key, _ in options} <= UNTRANSFORMED
+
+
+def _unpainted(options: ir.Options) -> ir.Options:
+    return tuple((key, value) for key, value in options if key not in PAINT_KEYS)
+
+
+def _path_box(path: ir.Path) -> Optional[Box]:
+    """bounding box of a path made of straight pieces, None otherwise"""
+    code = " ".join(ir.fmt_operation(op) for op in path.spec)
+    position = 0
+    while position < len(code.rstrip()):
+        m = STRAIGHT.match(code, position)
+        if m is None:
+            return None
+        position = m.end()
+    points = [(float(x), float(y)) for x, y in COORDINATE.findall(code)]
+    if not points:
+        return None
+    xs, ys = [x for x, _ in points], [y for _, y in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def borders(scope: ir.Scope) -> List[Box]:
+    """the rectangles drawn at the top of a picture"""
+    boxes = []
+    for item in scope.items:
+        if isinstance(item, ir.Path) and item.command in ("draw", "path", "fill"):
+            code = " ".join(ir.fmt_operation(op) for op in item.spec)
+            if "rectangle" in code:
+                box = _path_box(item)
+                if box is not None:
+                    boxes.append(box)
+    return boxes
+
+
+def _inside(box: Box, borders: List[Box]) -> bool:
+    return any(
+        b[0] + MARGIN <= box[0]
+        and b[1] + MARGIN <= box[1]
+        and box[2] <= b[2] - MARGIN
+        and box[3] <= b[3] - MARGIN
+        for b in borders
+    )
+
+
+class DeadElements:
+    def __init__(self):
+        self.paragraphs = False
+        self.removed = 0
+        self.replaced = 0
+
+    def eliminate(self, picture: ir.Scope):
+        """replace the invisible elements of a picture, in place"""
+        self._eliminate(picture, borders(picture), False)
+
+    def _eliminate(self, scope: ir.Scope, boxes: List[Box], dead: bool):
+        items = []
+        for item in scope.items:
+            if isinstance(item, ir.Scope):
+                # coordinates inside a transformed scope are not absolute
+                inner = boxes if _untransformed(item.options) else []
+                self._eliminate(item, inner, transparent(item.options, dead))
+            elif isinstance(item, ir.Node) and transparent(item.options, dead):
+                placeholder = self._node(item)
+                scope.inherit_origin(placeholder, item)
+                item = placeholder
+            elif isinstance(item, ir.Path) and transparent(item.options, dead):
+                placeholder = self._path(item, boxes)
+                if placeholder is None:
+                    self.removed += 1
+                    continue
+                scope.inherit_origin(placeholder, item)
+                item = placeholder
+            items.append(item)
+        scope.items = items
+
+    def _node(self, node: ir.Node) -> ir.Node:
+        contents = str(node.contents)
+        options = ir.fmt_options(node.options)
+        if any(s in contents or s in options for s in SIDE_EFFECTS):
+            return node
+        if "text width" in options:
+            self.paragraphs = True
+            contents = f"\\tpaparphantom{{{contents}}}"
+        elif "align" in options:
+            # lines broken by \\ can not be measured by a phantom
+            return node
+        else:
+            contents = f"\\phantom{{{contents}}}"
+        self.replaced += 1
+        return ir.Node(contents, node.name, node.at, _unpainted(node.options))
+
+    def _path(self, path: ir.Path, boxes: List[Box]) -> Optional[ir.Path]:
+        code = " ".join(ir.fmt_operation(op) for op in path.spec)
+        options = ir.fmt_options(path.options)
+        if any(s in code or s in options for s in SIDE_EFFECTS) or "node" in code:
+            return path
+        box = _path_box(path)
+        # shifted, scaled or rotated coordinates are not those of the borders
+        if box is not None and _untransformed(path.options) and _inside(box, boxes):
+            return None
+        if "<" in options or ">" in options:
+            # arrow tips count in the bounding box
+            return path
+        self.replaced += 1
+        return ir.Path("path", path.spec, _unpainted(path.options))
+
+    def merge(self, other: "DeadElements"):
+        self.paragraphs |= other.paragraphs
+        self.removed += other.removed
+        self.replaced += other.replaced
+
+    def preamble(self) -> str:
+        return PHANTOM_PARAGRAPH if self.paragraphs else ""
@@ -0,0 +1,439 @@
+"""
+Loop compression.
+
+Finds runs of consecutive commands of the same shape and rewrites each
+run as a single ``\\foreach``. Numbers in arithmetic progression
+(coordinates, node names such as ``A3``, labels) are computed from the
+loop counter:
+
+    \\draw (1,0) -- (1,10);
+    \\draw (2,0) -- (2,10);        \\foreach \\tpaI [evaluate=\\tpaI as \\tpaA
+    \\draw (3,0) -- (3,10);   =>        using int(1+1*\\tpaI)] in {0,...,3}
+    \\draw (4,0) -- (4,10);        {\\draw (\\tpaA,0) -- (\\tpaA,10);}
+
+and the other numbers, as well as the text of nodes, are listed with
+the counter:
+
+    \\node at (0,0) {Intro};        \\foreach \\tpaI/\\tpaB [evaluate=\\tpaI as
+    \\node at (3,0) {Logic};   =>       \\tpaA using int(0+3*\\tpaI)] in
+    \\node at (6,0) {Graphs};           {0/{Intro},1/{Logic},2/{Graphs}}
+                                     {\\node at (\\tpaA,0) {\\tpaB};}
+
+The run may repeat a group of up to ``MAX_GROUP`` commands, such as a
+grid line followed by its label, each command of the group having its
+own fields; the body of the loop is then the whole group.
+
+Integer progressions are evaluated with ``int`` so that they print
+exactly as before; other progressions only inside the coordinates of a
+path, where TikZ reads them as numbers, and not in the text of a node
+between braces. Text is only listed in the contents of ``\\node``
+commands, outside options and coordinates. Every loop is expanded back
+in Python and kept only when it reproduces the original commands and
+is shorter than them.
+"""
+
+import dataclasses
+import io
+import os
+import re
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from tikz_presentations_aliaume import ir
+
+# shortest run worth a loop, in commands
+MIN_RUN = 4
+
+# largest group of commands repeated by a loop
+MAX_GROUP = 4
+
+# fewest repetitions of a group of several commands worth a loop
+MIN_REPEATS = 3
+
+NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+# what structures a command: escaped characters, numbers, brackets
+TOKEN = re.compile(r"\\.|-?\d+(?:\.\d+)?|[][(){}]", re.DOTALL)
+OPENING = {")": "(", "]": "["}
+
+# a control word as TeX reads it, with the spaces or the empty group
+# ending it
+CONTROL_WORD = re.compile(r"(\\[A-Za-z]+)(?:\{\}| *)")
+
+# text ending in the middle of a control word
+OPEN_CONTROL_WORD = re.compile(r"\\[A-Za-z]*$")
+
+# what cannot be read as the argument of a macro, as the list and the
+# body of a \\foreach are
+UNREADABLE = re.compile(r"\\par(?![A-Za-z])|\n[ \t]*\n|\\verb|#|%")
+
+# letters naming the fields, \tpaI is the counter of the loop
+FIELD_LETTERS = "ABCDEFGHJKLMNOPQRSTUVWXYZ"
+
+
+@dataclasses.dataclass(frozen=True)
+class Number:
+    token: str
+    # read by TikZ as a number: in a coordinate of the path
+    in_coordinate: bool
+
+
+@dataclasses.dataclass(frozen=True)
+class Group:
+    """a brace group, text when it is (part of) the contents of a node"""
+
+    code: str
+    parts: Tuple["Part", ...]
+    text: bool
+
+
+Part = Union[str, Number, Group]
+
+
+def parse(code: str, text_start: int = -1) -> Optional[Tuple[Part, ...]]:
+    """a command as literal text, numbers and brace groups, None when its
+    braces are not balanced; the group opening at text_start is text"""
+    groups: List[List[Part]] = [[]]
+    # per enclosing group: brackets open in it, start, whether it is text
+    opened: List[List[str]] = [[]]
+    starts = [0]
+    texts = [False]
+    last = 0
+    for m in TOKEN.finditer(code):
+        token = m.group()
+        if token.startswith("\\"):
+            continue
+        if token in ("(", "["):
+            opened[-1].append(token)
+            continue
+        if token in (")", "]"):
+            if opened[-1] and opened[-1][-1] == OPENING[token]:
+                opened[-1].pop()
+            continue
+        if last < m.start():
+            groups[-1].append(code[last : m.start()])
+        last = m.end()
+        if token == "{":
+            texts.append(m.start() == text_start or (texts[-1] and not opened[-1]))
+            groups.append([])
+            opened.append([])
+            starts.append(m.end())
+        elif token == "}":
+            if len(groups) == 1:
+                return None
+            parts = groups.pop()
+            opened.pop()
+            groups[-1].append(
+                Group(code[starts.pop() : m.start()], tuple(parts), texts.pop())
+            )
+        else:
+            # (1.5) in the text of a node is printed, not read as a number
+            groups[-1].append(
+                Number(token, len(groups) == 1 and opened[-1][-1:] == ["("])
+            )
+    if len(groups) > 1:
+        return None
+    if last < len(code):
+        groups[0].append(code[last:])
+    return tuple(groups[0])
+
+
+def shape(parts: Tuple[Part, ...]) -> tuple:
+    """what commands of a loop have in common: the text of their nodes may
+    differ, and so may their numbers"""
+    return tuple(
+        (
+            part
+            if isinstance(part, str)
+            else (
+                part.in_coordinate
+                if isinstance(part, Number)
+                else None if part.text else shape(part.parts)
+            )
+        )
+        for part in parts
+    )
+
+
+def _is_int(token: str) -> bool:
+    return "." not in token
+
+
+def _field_name(index: int) -> str:
+    letters = ""
+    index += 1
+    while index:
+        index, r = divmod(index - 1, len(FIELD_LETTERS))
+        letters = FIELD_LETTERS[r] + letters
+    return "\\tpa" + letters
+
+
+def _variable(name: str, following: str) -> str:
+    """a variable written so that the text following it stays apart:
+    \\tpaA followed by cm would be \\tpaAcm, a space would be dropped"""
+    if following[:1].isalpha():
+        return name + " "
+    if following[:1].isspace():
+        return name + "{}"
+    return name
+
+
+def _balanced(text: str) -> bool:
+    depth = 0
+    for m in TOKEN.finditer(text):
+        if m.group() == "{":
+            depth += 1
+        elif m.group() == "}":
+            depth -= 1
+            if depth < 0:
+                return False
+    return depth == 0
+
+
+class Field:
+    """a number of the template, first + step * \\tpaI"""
+
+    def __init__(self, tokens: List[str], in_coordinate: bool):
+        self.integer = all(_is_int(t) for t in tokens)
+        values = [float(t) for t in tokens]
+        self.first = values[0]
+        self.step = values[1] - values[0]
+        self.in_coordinate = in_coordinate
+
+    def value(self, t: int) -> float:
+        return self.first + self.step * t
+
+    def expression(self) -> str:
+        sign = "+" if self.step >= 0 else "-"
+        if self.integer:
+            first, step = int(self.first), int(abs(self.step))
+            return f"int({first}{sign}{step}*\\tpaI)"
+        first, step = ir.fmt_number(self.first), ir.fmt_number(abs(self.step))
+        return f"{first}{sign}{step}*\\tpaI"
+
+    def reproduces(self, t: int, token: str) -> bool:
+        if self.integer:
+            return str(int(self.value(t))) == token
+        return abs(self.value(t) - float(token)) < 1e-4
+
+
+def _progression(tokens: List[str]) -> bool:
+    if all(t == tokens[0] for t in tokens):
+        return True
+    if all(_is_int(t) for t in tokens):
+        values = [int(t) for t in tokens]
+        step = values[1] - values[0]
+        return all(b - a == step for a, b in zip(values, values[1:]))
+    values = [float(t) for t in tokens]
+    step = values[1] - values[0]
+    return all(abs((b - a) - step) < 1e-6 for a, b in zip(values, values[1:]))
+
+
+def _affixes(values: List[str]) -> Tuple[str, str]:
+    """text common to the start and to the end of all the values, not
+    cutting a word or a control word"""
+    prefix = os.path.commonprefix(values)
+    while prefix and (
+        prefix[-1].isalnum()
+        or any(OPEN_CONTROL_WORD.search(v[: len(prefix)]) for v in values)
+    ):
+        prefix = prefix[:-1]
+    longest = min(len(v) for v in values) - len(prefix)
+    suffix = os.path.commonprefix([v[::-1] for v in values])[::-1]
+    suffix = suffix[max(0, len(suffix) - longest) :] if longest > 0 else ""
+    while suffix and (
+        suffix[0].isalnum()
+        or any(OPEN_CONTROL_WORD.search(v[: len(v) - len(suffix)]) for v in values)
+    ):
+        suffix = suffix[1:]
+    return prefix, suffix
+
+
+class Template:
+    """the body of a loop and its variables, taking their tokens in turn"""
+
+    def __init__(self, count: int):
+        self.count = count
+        self.pieces: List[str] = []
+        # indices of the pieces that are variables
+        self.variables: Set[int] = set()
+        self.evaluations: List[str] = []
+        self.listed: Dict[str, List[str]] = {}
+        # (kind, expression or values) -> variable, shared by the fields
+        self.names: Dict[tuple, str] = {}
+        # variable -> the tokens it takes
+        self.tokens: Dict[str, List[str]] = {}
+
+    def _name(self, key: tuple, tokens: List[str]) -> Tuple[str, bool]:
+        """the variable of a field, and whether it is new"""
+        if key in self.names:
+            return self.names[key], False
+        name = self.names[key] = _field_name(len(self.names))
+        self.tokens[name] = tokens
+        return name, True
+
+    def field(self, tokens: List[str], in_coordinate: bool = False) -> bool:
+        """add a field taking the tokens, False when they cannot be listed"""
+        if all(t == tokens[0] for t in tokens):
+            self.pieces.append(tokens[0])
+            return True
+        name = None
+        if all(NUMBER.fullmatch(t) for t in tokens) and _progression(tokens):
+            field = Field(tokens, in_coordinate)
+            if (field.integer or field.in_coordinate) and all(
+                field.reproduces(t, token) for t, token in enumerate(tokens)
+            ):
+                expression = field.expression()
+                name, new = self._name(("evaluate", expression), tokens)
+                if new:
+                    self.evaluations.append(
+                        f"evaluate=\\tpaI as {name} using {expression}"
+                    )
+        if name is None:
+            # other numbers and text are listed as they are
+            if not all(_balanced(t) and "..." not in t for t in tokens):
+                return False
+            name = self._name(("list", tuple(tokens)), tokens)[0]
+            self.listed[name] = tokens
+        self.variables.add(len(self.pieces))
+        self.pieces.append(name)
+        return True
+
+    def add(self, occurrences: List[Tuple[Part, ...]]) -> bool:
+        """add the parts of a command at each turn, False when they do not
+        make a loop"""
+        for k, part in enumerate(occurrences[0]):
+            if isinstance(part, str):
+                self.pieces.append(part)
+            elif isinstance(part, Number):
+                tokens = [parts[k].token for parts in occurrences]
+                if not self.field(tokens, part.in_coordinate):
+                    return False
+            else:
+                groups = [parts[k] for parts in occurrences]
+                self.pieces.append("{")
+                if all(g.code == part.code for g in groups):
+                    self.pieces.append(part.code)
+                elif all(shape(g.parts) == shape(part.parts) for g in groups):
+                    if not self.add([g.parts for g in groups]):
+                        return False
+                else:
+                    # the text of the node, listed with what all share apart
+                    values = [g.code for g in groups]
+                    prefix, suffix = _affixes(values)
+                    self.pieces.append(prefix)
+                    end = len(suffix)
+                    if not self.field([v[len(prefix) : len(v) - end] for v in values]):
+                        return False
+                    self.pieces.append(suffix)
+                self.pieces.append("}")
+        return True
+
+    def body(self) -> str:
+        code = ""
+        for k in reversed(range(len(self.pieces))):
+            if k in self.variables:
+                code = _variable(self.pieces[k], code) + code
+            else:
+                code = self.pieces[k] + code
+        return code
+
+    def loop(self, body: str) -> str:
+        options = f" [{', '.join(self.evaluations)}]" if self.evaluations else ""
+        if not self.listed:
+            return f"\\foreach \\tpaI{options} in {{0,...,{self.count - 1}}} {{{body}}}"
+        names = "".join(f"/{name}" for name in self.listed)
+        values = ",".join(
+            str(t)
+            + "".join(
+                "/" + (v[t] if NUMBER.fullmatch(v[t]) else f"{{{v[t]}}}")
+                for v in self.listed.values()
+            )
+            for t in range(self.count)
+        )
+        return f"\\foreach \\tpaI{names}{options} in {{{values}}} {{{body}}}"
+
+
+def repeats(shapes: List[Optional[tuple]], start: int, size: int) -> int:
+    """how many times a group of size commands of the same shapes repeats
+    from start"""
+    group = shapes[start : start + size]
+    if len(group) < size or any(s is None for s in group):
+        return 0
+    count = 1
+    while shapes[start + count * size : start + (count + 1) * size] == group:
+        count += 1
+    return count
+
+
+def make_loop(
+    codes: List[str], commands: List[Tuple[Part, ...]], size: int = 1
+) -> Optional[str]:
+    """the \\foreach equivalent to the commands, repeating groups of size
+    commands, None if there is none"""
+    count = len(codes) // size
+    template = Template(count)
+    for position in range(size):
+        if position:
+            template.pieces.append(" ")
+        if not template.add(commands[position::size]):
+            return None
+
+    # the loop must give back every original command, numbers and text
+    body = template.body()
+    for t in range(count):
+        tokens = {name: values[t] for name, values in template.tokens.items()}
+        expanded = CONTROL_WORD.sub(lambda m: tokens.get(m.group(1), m.group()), body)
+        if expanded != " ".join(codes[t * size : (t + 1) * size]):
+            return None
+    return template.loop(body)
+
+
+def _command(item) -> Tuple[Optional[str], Optional[Tuple[Part, ...]]]:
+    """code of a command of a loop and its parts"""
+    if not isinstance(item, (ir.Node, ir.Path, ir.Coordinate, ir.Pic)):
+        return None, None
+    out = io.StringIO()
+    item.write(out)
+    code = out.getvalue().rstrip("\n")
+    if UNREADABLE.search(code) or "\\tpa" in code:
+        return None, None
+    # the contents of a node end the command: " {contents};"
+    text_start = -1
+    if isinstance(item, ir.Node):
+        text_start = len(code) - len(str(item.contents)) - 3
+    return code, parse(code, text_start)
+
+
+def compress_loops(scope: ir.Scope):
+    """rewrite runs of regular commands of the scope into loops, in place"""
+    codes, commands = zip(*map(_command, scope.items)) if scope.items else ((), ())
+    shapes = [shape(c) if c is not None else None for c in commands]
+
+    items = []
+    i = 0
+    while i < len(scope.items):
+        if isinstance(scope.items[i], ir.Scope):
+            compress_loops(scope.items[i])
+
+        # the group size whose loop saves the most, the smallest on a tie
+        loop, j, saved = None, i + 1, 0
+        for size in range(1, MAX_GROUP + 1):
+            count = repeats(shapes, i, size)
+            end = i + count * size
+            if end - i < MIN_RUN or (size > 1 and count < MIN_REPEATS):
+                continue
+            found = make_loop(list(codes[i:end]), list(commands[i:end]), size)
+            if found is None:
+                continue
+            gain = len("\n".join(codes[i:end])) - len(found)
+            if gain > saved:
+                loop, j, saved = found, end, gain
+        if loop is None:
+            items.append(scope.items[i])
+            i += 1
+        else:
+            items.append(ir.Raw(loop))
+            scope.inherit_origin(items[-1], scope.items[i])
+            i = j
+
+    scope.items = items
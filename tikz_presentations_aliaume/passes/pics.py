@@ -0,0 +1,221 @@
+"""
+Pic templates.
+
+Components often draw the same small shape many times in a frame, each
+copy in its own shifted scope and only differing by its colours (the
+triangles of ``FreelyLabeled``, the columns of ``GraphWqo``...).
+``PicRegistry`` finds the scopes of a frame whose contents are equal up
+to the values of the colour keys and to a common suffix of their node
+names. Each such shape is defined once in the preamble as a TikZ pic
+taking the varying colours as arguments, and every copy becomes a
+``\\pic`` carrying the options of its scope:
+
+    \\begin{scope}[xshift=2cm]
+    \\node[fill=A1] (vcopy2) {};          \\pic[xshift=2cm,name suffix=copy2]
+    \\draw (vcopy2) -- (0,1);       =>        at (0,0) {tpaxxxxxxxx={A1}};
+    \\end{scope}
+"""
+
+import io
+import re
+from typing import Dict, List, Optional, Tuple
+
+from tikz_presentations_aliaume import ir
+from tikz_presentations_aliaume.passes.styles import content_suffix
+
+# fewest copies of a shape in a frame worth a pic
+MIN_COPIES = 2
+
+# option keys whose values become arguments of the pic
+PARAMETER_KEYS = frozenset(["fill", "draw", "color", "text"])
+
+# TeX macros take at most nine arguments
+MAX_ARGUMENTS = 9
+
+# stands for an argument in the skeleton of a shape
+HOLE = "\x00"
+
+REFERENCE = re.compile(r"\(\s*([A-Za-z_][\w\- ]*?)\s*(?:\.[^()]*)?\)")
+
+
+class Shape:
+    """a scope reduced to its code, with holes for its parameters"""
+
+    def __init__(self, skeleton: str, values: List[str], suffix: str):
+        self.skeleton = skeleton
+        self.values = values
+        self.suffix = suffix
+
+
+def _defined_names(scope: ir.Scope, names: List[str]):
+    for item in scope.items:
+        if isinstance(item, (ir.Node, ir.Coordinate)) and isinstance(item.name, str):
+            names.append(item.name)
+        elif isinstance(item, ir.Scope):
+            _defined_names(item, names)
+
+
+def _common_suffix(names: List[str]) -> str:
+    if len(names) < 2:
+        return ""
+    suffix = names[0]
+    for name in names[1:]:
+        while not name.endswith(suffix):
+            suffix = suffix[1:]
+    # every node keeps a name of its own
+    longest = min(len(name) for name in names) - 1
+    return suffix[len(suffix) - longest :] if len(suffix) > longest else suffix
+
+
+def _holed(options: ir.Options, values: List[str]) -> ir.Options:
+    holed = []
+    for key, value in options:
+        if key in PARAMETER_KEYS and isinstance(value, str):
+            values.append(value)
+            value = HOLE
+        holed.append((key, value))
+    return tuple(holed)
+
+
+def _skeleton_items(scope: ir.Scope, values: List[str]) -> list:
+    items = []
+    for item in scope.items:
+        if isinstance(item, ir.Node):
+            options = _holed(item.options, values)
+            item = ir.Node(item.contents, item.name, item.at, options)
+        elif isinstance(item, ir.Path):
+            options = _holed(item.options, values)
+            item = ir.Path(item.command, item.spec, options)
+        elif isinstance(item, ir.Coordinate):
+            options = _holed(item.options, values)
+            item = ir.Coordinate(item.name, item.at, options)
+        elif isinstance(item, ir.Scope):
+            inner = ir.Scope()
+            inner.options = _holed(item.options, values)
+            inner.items = _skeleton_items(item, values)
+            item = inner
+        items.append(item)
+    return items
+
+
+def shape(scope: ir.Scope) -> Optional[Shape]:
+    """the shape drawn by a scope, None when it cannot be made a pic"""
+    values: List[str] = []
+    out = io.StringIO()
+    for item in _skeleton_items(scope, values):
+        item.write(out)
+    code = out.getvalue()
+    if "#" in code:
+        return None
+
+    names: List[str] = []
+    _defined_names(scope, names)
+    suffix = _common_suffix(names)
+    if suffix:
+        # the suffix is added back to every reference, which must then
+        # all point inside the scope
+        if any(ref not in names for ref in REFERENCE.findall(code)):
+            return None
+        bases = {name: name[: -len(suffix)] for name in names}
+        pattern = re.compile(
+            r"(?<=\()(\s*)("
+            + "|".join(re.escape(n) for n in sorted(bases, key=len, reverse=True))
+            + r")(?=[\s.)])"
+        )
+        code = pattern.sub(lambda m: m.group(1) + bases[m.group(2)], code)
+        if any(name in code for name in names if name not in bases.values()):
+            return None
+    return Shape(code, values, suffix)
+
+
+class PicRegistry:
+    def __init__(self):
+        # pic name -> (number of arguments, body)
+        self.definitions: Dict[str, Tuple[int, str]] = {}
+
+    def define(self, shapes: List[Shape]) -> Optional[Tuple[str, List[int]]]:
+        """define the pic drawing the shapes, with the holes that vary"""
+        skeleton = shapes[0].skeleton
+        varying = [
+            k
+            for k in range(len(shapes[0].values))
+            if any(s.values[k] != shapes[0].values[k] for s in shapes)
+        ]
+        if len(varying) > MAX_ARGUMENTS:
+            return None
+        parts = skeleton.split(HOLE)
+        body = io.StringIO()
+        for k, part in enumerate(parts[:-1]):
+            body.write(part)
+            if k in varying:
+                body.write(f"#{varying.index(k) + 1}")
+            else:
+                body.write(shapes[0].values[k])
+        body.write(parts[-1])
+        code = body.getvalue()
+        name = "tpa" + content_suffix(f"{len(varying)}/{code}")
+        self.definitions[name] = (len(varying), code)
+        return name, varying
+
+    def extract(self, picture: ir.Scope):
+        """replace the repeated shapes of a picture by pics, in place"""
+        shapes: Dict[int, Shape] = {}
+        groups: Dict[str, List[ir.Scope]] = {}
+        ancestors: Dict[int, List[int]] = {}
+        self._collect(picture, [], shapes, groups, ancestors)
+
+        pics: Dict[int, ir.Pic] = {}
+        # outermost shapes first, their copies already contain the inner ones
+        for scopes in sorted(groups.values(), key=lambda g: len(ancestors[id(g[0])])):
+            scopes = [s for s in scopes if not any(a in pics for a in ancestors[id(s)])]
+            if len(scopes) < MIN_COPIES:
+                continue
+            defined = self.define([shapes[id(s)] for s in scopes])
+            if defined is None:
+                continue
+            name, varying = defined
+            for scope in scopes:
+                found = shapes[id(scope)]
+                options = scope.options
+                if found.suffix:
+                    options += (("name suffix", found.suffix),)
+                arguments = tuple(found.values[k] for k in varying)
+                pics[id(scope)] = ir.Pic(name, arguments, options)
+        if pics:
+            self._replace(picture, pics)
+
+    def _collect(self, scope: ir.Scope, path: list, shapes, groups, ancestors):
+        for item in scope.items:
+            if isinstance(item, ir.Scope) and item.items:
+                found = shape(item)
+                if found is not None:
+                    shapes[id(item)] = found
+                    groups.setdefault(found.skeleton, []).append(item)
+                    ancestors[id(item)] = path
+                self._collect(item, path + [id(item)], shapes, groups, ancestors)
+
+    def _replace(self, scope: ir.Scope, pics: Dict[int, ir.Pic]):
+        items = []
+        for item in scope.items:
+            if id(item) in pics:
+                scope.inherit_origin(pics[id(item)], item)
+                item = pics[id(item)]
+            elif isinstance(item, ir.Scope):
+                self._replace(item, pics)
+            items.append(item)
+        scope.items = items
+
+    def merge(self, other: "PicRegistry"):
+        self.definitions.update(other.definitions)
+
+    def preamble(self) -> str:
+        if not self.definitions:
+            return ""
+        pics = []
+        for name, (arguments, body) in sorted(self.definitions.items()):
+            if arguments:
+                key = f"pics/{name}/.style n args={{{arguments}}}"
+            else:
+                key = f"pics/{name}/.style="
+            pics.append(f"    {key}{{code={{\n{body}}}}}")
+        return "\\tikzset{\n" + ",\n".join(pics) + "\n}"
@@ -0,0 +1,131 @@
+"""
+Global style table.
+
+Components define their styles with ``pic.style(...)`` inside ``draw``,
+so the same definitions are repeated in every frame. ``StyleRegistry``
+removes these definitions from the frames, stores each one once under a
+name derived from its content, and rewrites the references that follow
+them. Two different definitions sharing a name therefore get different
+global names, and identical ones are stored once. The table is emitted
+in the preamble with ``StyleRegistry.preamble``.
+"""
+
+import hashlib
+import re
+from typing import Dict, Optional
+
+from tikz_presentations_aliaume import ir
+
+
+def content_suffix(text: str, length: int = 8) -> str:
+    """letters-only digest of a text, safe in TikZ keys and node names"""
+    n = int(hashlib.sha1(text.encode()).hexdigest(), 16)
+    letters = []
+    for _ in range(length):
+        n, r = divmod(n, 26)
+        letters.append(chr(ord("a") + r))
+    return "".join(letters)
+
+
+def _option_spans(code: str):
+    """(start, end) of the top-level [...] option lists of a command"""
+    depth = 0
+    start = None
+    for i, c in enumerate(code):
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+        elif c == "[" and depth == 0 and start is None:
+            start = i
+        elif c == "]" and depth == 0 and start is not None:
+            yield start, i + 1
+            start = None
+
+
+def rename_in_options(code: str, mapping: Dict[str, str]) -> str:
+    """rename style keys inside the option lists of some TikZ code"""
+    if not mapping:
+        return code
+    names = "|".join(re.escape(name) for name in sorted(mapping, key=len, reverse=True))
+    key = re.compile(r"(?<=[\[,{])(\s*)(" + names + r")(?=\s*[,\]=}])")
+    value = re.compile(r"(style\s*=\s*\{?\s*)(" + names + r")(?=\s*[,\]}])")
+
+    def rename(span: str) -> str:
+        span = key.sub(lambda m: m.group(1) + mapping[m.group(2)], span)
+        return value.sub(lambda m: m.group(1) + mapping[m.group(2)], span)
+
+    parts = []
+    last = 0
+    for start, end in _option_spans(code):
+        parts.append(code[last:start])
+        parts.append(rename(code[start:end]))
+        last = end
+    parts.append(code[last:])
+    return "".join(parts)
+
+
+def rename_options(options: ir.Options, mapping: Dict[str, str]) -> ir.Options:
+    renamed = []
+    for key, value in options:
+        if key == "":
+            value = rename_in_options(f"[{value}]", mapping)[1:-1]
+        elif key == "style" and isinstance(value, str):
+            value = rename_in_options(f"[style={value}]", mapping)[7:-1]
+        else:
+            key = mapping.get(key, key)
+        renamed.append((key, value))
+    return tuple(renamed)
+
+
+class StyleRegistry:
+    def __init__(self):
+        # global name -> style body
+        self.definitions: Dict[str, str] = {}
+
+    def define(self, style: ir.Style, mapping: Dict[str, str]) -> str:
+        body = ir.fmt_options(rename_options(style.options, mapping))[1:-1]
+        name = f"{style.name}-{content_suffix(style.name + '/' + body)}"
+        self.definitions[name] = body
+        return name
+
+    def hoist(self, scope: ir.Scope, mapping: Optional[Dict[str, str]] = None):
+        """move the style definitions of a picture to the table, in place"""
+        mapping = dict(mapping or {})
+        items = []
+        for item in scope.items:
+            if isinstance(item, ir.Style):
+                mapping[item.name] = self.define(item, mapping)
+                continue
+            if isinstance(item, ir.Scope):
+                item.options = rename_options(item.options, mapping)
+                self.hoist(item, mapping)
+            elif isinstance(item, (ir.Node, ir.Coordinate)):
+                item.options = rename_options(item.options, mapping)
+            elif isinstance(item, ir.Path) and mapping:
+                item.options = rename_options(item.options, mapping)
+                item.spec = tuple(
+                    (
+                        op
+                        if isinstance(op, tuple)
+                        else rename_in_options(ir.fmt_operation(op), mapping)
+                    )
+                    for op in item.spec
+                )
+            elif isinstance(item, ir.Raw) and mapping:
+                item.code = rename_in_options(item.code, mapping)
+            items.append(item)
+        scope.items = items
+
+    def merge(self, other: "StyleRegistry"):
+        # names are content hashes, the same name has the same body
+        self.definitions.update(other.definitions)
+
+    def preamble(self) -> str:
+        if not self.definitions:
+            return ""
+        styles = ",\n".join(
+            f"    {name}/.style={{{body}}}"
+            for name, body in sorted(self.definitions.items())
+        )
+        return "\\tikzset{\n" + styles + "\n}"
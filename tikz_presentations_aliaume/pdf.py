@@ -0,0 +1,744 @@
+"""
+Minimal PDF reading and writing.
+
+Frames compiled as separate documents are put together here, with the
+standard library only. ``Document.read`` loads every object of a PDF
+as produced by xdvipdfmx, compressed object streams included, without
+following the cross-reference table: objects are found by scanning the
+file, which is enough for the documents the engines write and for their
+incremental updates. ``Writer`` numbers objects and writes a file with
+a classic cross-reference table or with object streams, ``Merger``
+puts documents one after the other, their links and shared resources
+included.
+
+Objects are plain Python values: dictionaries with ``Name`` keys, lists,
+numbers, booleans, None, ``Name``, ``String``, ``Ref`` and ``Stream``,
+whose data is kept encoded.
+"""
+
+import dataclasses
+import hashlib
+import io
+import re
+import struct
+import zlib
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+WHITESPACE = b"\x00\t\n\x0c\r "
+DELIMITERS = b"()<>[]{}/%"
+
+# skipped between tokens
+_SPACE = re.compile(rb"(?:[\x00\t\n\x0c\r ]+|%[^\r\n]*)*")
+# a token after spaces, told by the group matching: 1 name, 2-3
+# reference, 4 integer, 5 real, 6 keyword, 7 delimiter
+_TOKEN = re.compile(
+    rb"(?:[\x00\t\n\x0c\r ]+|%[^\r\n]*)*(?:"
+    rb"/([^\x00\t\n\x0c\r ()<>\[\]{}/%]*)"
+    rb"|(\d+)[\x00\t\n\x0c\r ]+(\d+)[\x00\t\n\x0c\r ]+R(?![^\x00\t\n\x0c\r ()<>\[\]{}/%])"
+    rb"|([+-]?\d+)(?![.\d])"
+    rb"|([+-]?(?:\d+\.\d*|\.\d+))"
+    rb"|(true|false|null)\b"
+    rb"|(<<|>>|[\[\]<(]))"
+)
+_KEYWORDS = {b"true": True, b"false": False, b"null": None}
+_OBJ = re.compile(rb"(\d+)[\x00\t\n\x0c\r ]+(\d+)[\x00\t\n\x0c\r ]+obj\b")
+_STREAM = re.compile(rb"stream(?:\r\n|\n|\r)")
+_ENDSTREAM = re.compile(rb"(?:\r\n|\n|\r)?endstream")
+_TRAILER = re.compile(rb"[\r\n]trailer")
+_NAME_ESCAPE = re.compile(rb"#([0-9a-fA-F]{2})")
+_STRING_ESCAPES = {
+    ord("n"): b"\n",
+    ord("r"): b"\r",
+    ord("t"): b"\t",
+    ord("b"): b"\b",
+    ord("f"): b"\f",
+}
+
+
+class Name(str):
+    pass
+
+
+class String(bytes):
+    pass
+
+
+class Ref(NamedTuple):
+    number: int
+    generation: int = 0
+
+
+@dataclasses.dataclass
+class Stream:
+    dictionary: Dict[Name, Any]
+    # encoded with the filters of the dictionary
+    data: bytes
+
+
+class PDFError(ValueError):
+    pass
+
+
+def _literal_string(data: bytes, pos: int) -> Tuple[String, int]:
+    end = data.find(b")", pos)
+    plain = data[pos + 1 : end]
+    if end >= 0 and b"\\" not in plain and b"(" not in plain:
+        return String(plain), end + 1
+    out = bytearray()
+    depth = 1
+    pos += 1
+    while True:
+        c = data[pos]
+        if c == ord("\\"):
+            pos += 1
+            c = data[pos]
+            if c in _STRING_ESCAPES:
+                out += _STRING_ESCAPES[c]
+            elif ord("0") <= c <= ord("7"):
+                digits = re.match(rb"[0-7]{1,3}", data[pos : pos + 3]).group()
+                out.append(int(digits, 8) & 0xFF)
+                pos += len(digits) - 1
+            elif c == ord("\r"):
+                if data[pos + 1 : pos + 2] == b"\n":
+                    pos += 1
+            elif c != ord("\n"):
+                out.append(c)
+        elif c == ord("("):
+            depth += 1
+            out.append(c)
+        elif c == ord(")"):
+            depth -= 1
+            if depth == 0:
+                return String(out), pos + 1
+            out.append(c)
+        else:
+            out.append(c)
+        pos += 1
+
+
+def _token(data: bytes, pos: int) -> "re.Match[bytes]":
+    m = _TOKEN.match(data, pos)
+    if m is None:
+        raise PDFError(f"unexpected {data[pos:pos + 20]!r} at {pos}")
+    return m
+
+
+# names read so far, most names come back in every object
+_NAMES: Dict[bytes, Name] = {}
+
+
+def _object(data: bytes, m: "re.Match[bytes]") -> Tuple[Any, int]:
+    """the object starting with a token and the position after it"""
+    kind = m.lastindex
+    if kind == 1:
+        raw = m.group(1)
+        name = _NAMES.get(raw)
+        if name is None:
+            text = _NAME_ESCAPE.sub(lambda e: bytes([int(e.group(1), 16)]), raw)
+            name = _NAMES[raw] = Name(text.decode("latin-1"))
+        return name, m.end()
+    if kind == 3:
+        return Ref(int(m.group(2)), int(m.group(3))), m.end()
+    if kind == 4:
+        return int(m.group(4)), m.end()
+    if kind == 5:
+        return float(m.group(5)), m.end()
+    if kind == 6:
+        return _KEYWORDS[m.group(6)], m.end()
+    delimiter = m.group(7)
+    pos = m.end()
+    if delimiter == b"<<":
+        result: Dict[Name, Any] = {}
+        while True:
+            m = _token(data, pos)
+            if m.lastindex == 7 and m.group(7) == b">>":
+                return result, m.end()
+            if m.lastindex != 1:
+                raise PDFError(f"dictionary key at {m.start()}")
+            key, pos = _object(data, m)
+            result[key], pos = _object(data, _token(data, pos))
+    if delimiter == b"[":
+        items = []
+        while True:
+            m = _token(data, pos)
+            if m.lastindex == 7 and m.group(7) == b"]":
+                return items, m.end()
+            item, pos = _object(data, m)
+            items.append(item)
+    if delimiter == b"<":
+        end = data.index(b">", pos)
+        digits = re.sub(rb"[^0-9a-fA-F]", b"", data[pos:end])
+        if len(digits) % 2:
+            digits += b"0"
+        return String(bytes.fromhex(digits.decode())), end + 1
+    if delimiter == b"(":
+        return _literal_string(data, pos - 1)
+    raise PDFError(f"unexpected {delimiter!r} at {m.start(7)}")
+
+
+def parse_object(data: bytes, pos: int = 0) -> Tuple[Any, int]:
+    """the object starting at pos (after spaces) and the position after it"""
+    return _object(data, _token(data, pos))
+
+
+def decode(stream: Stream) -> bytes:
+    """data of a stream, Flate being the only filter the engines use"""
+    filters = stream.dictionary.get("Filter", [])
+    if isinstance(filters, str):
+        filters = [filters]
+    data = stream.data
+    for name in filters:
+        if name != "FlateDecode":
+            raise PDFError(f"unsupported filter {name}")
+        data = zlib.decompress(data)
+    return data
+
+
+def encode(dictionary: Dict[Name, Any], data: bytes) -> Stream:
+    """a Flate compressed stream"""
+    dictionary = {k: v for k, v in dictionary.items() if k != "DecodeParms"}
+    dictionary[Name("Filter")] = Name("FlateDecode")
+    return Stream(dictionary, zlib.compress(data))
+
+
+class Document:
+    def __init__(self):
+        self.objects: Dict[int, Any] = {}
+        self.trailer: Dict[Name, Any] = {}
+
+    @staticmethod
+    def read(data: bytes) -> "Document":
+        document = Document()
+        compressed: List[Stream] = []
+        pos = 0
+        while True:
+            m = _OBJ.search(data, pos)
+            if m is None:
+                break
+            obj, pos = parse_object(data, m.end())
+            after = _SPACE.match(data, pos).end()
+            s = _STREAM.match(data, after)
+            if s is not None:
+                length = obj.get("Length")
+                start = s.end()
+                if isinstance(length, int):
+                    end = start + length
+                else:
+                    end = _ENDSTREAM.search(data, start).start()
+                obj = Stream(obj, data[start:end])
+                pos = (
+                    _ENDSTREAM.match(data, end) or _ENDSTREAM.search(data, end)
+                ).end()
+            kind = obj.dictionary.get("Type") if isinstance(obj, Stream) else None
+            if kind == "ObjStm":
+                compressed.append(obj)
+            elif kind == "XRef":
+                document.trailer.update(obj.dictionary)
+            else:
+                document.objects[int(m.group(1))] = obj
+        for m in _TRAILER.finditer(data):
+            try:
+                trailer, _ = parse_object(data, m.end())
+            except PDFError:
+                # the word in some binary data
+                continue
+            document.trailer.update(trailer)
+        for stream in compressed:
+            content = decode(stream)
+            first = stream.dictionary["First"]
+            header = content[:first].split()
+            for k in range(0, 2 * stream.dictionary["N"], 2):
+                number, offset = int(header[k]), int(header[k + 1])
+                obj, _ = parse_object(content, first + offset)
+                document.objects.setdefault(number, obj)
+        if "Root" not in document.trailer:
+            raise PDFError("no document catalog")
+        return document
+
+    def resolve(self, obj: Any) -> Any:
+        while isinstance(obj, Ref):
+            obj = self.objects.get(obj.number)
+        return obj
+
+    @property
+    def catalog(self) -> Dict[Name, Any]:
+        return self.resolve(self.trailer["Root"])
+
+    def pages(self) -> List[Ref]:
+        """references of the pages in order"""
+        result: List[Ref] = []
+        stack = [self.catalog["Pages"]]
+        while stack:
+            ref = stack.pop()
+            node = self.resolve(ref)
+            if node.get("Type") == "Pages":
+                stack.extend(reversed(node["Kids"]))
+            else:
+                result.append(ref)
+        return result
+
+    def destinations(self) -> Dict[bytes, Any]:
+        """named destinations, from the name tree of the catalog or the
+        older Dests dictionary"""
+        result: Dict[bytes, Any] = {}
+        old = self.resolve(self.catalog.get("Dests"))
+        if isinstance(old, dict):
+            for name, value in old.items():
+                result[name.encode("latin-1")] = value
+        names = self.resolve(self.catalog.get("Names"))
+        stack = [names.get("Dests")] if isinstance(names, dict) else []
+        while stack:
+            node = self.resolve(stack.pop())
+            if not isinstance(node, dict):
+                continue
+            pairs = self.resolve(node.get("Names", []))
+            for k in range(0, len(pairs) - 1, 2):
+                result[bytes(self.resolve(pairs[k]))] = pairs[k + 1]
+            stack.extend(self.resolve(node.get("Kids", [])))
+        return result
+
+    def page(self, ref: Ref) -> Dict[Name, Any]:
+        """a page dictionary with its inherited attributes, without parent"""
+        page = dict(self.resolve(ref))
+        parent = page.pop("Parent", None)
+        while parent is not None:
+            node = self.resolve(parent)
+            for key in ("Resources", "MediaBox", "CropBox", "Rotate"):
+                if key in node and key not in page:
+                    page[Name(key)] = node[key]
+            parent = node.get("Parent")
+        return page
+
+
+# names written so far
+_WRITTEN_NAMES: Dict[str, bytes] = {}
+
+
+def _name(name: str) -> bytes:
+    written = _WRITTEN_NAMES.get(name)
+    if written is not None:
+        return written
+    out = bytearray(b"/")
+    for c in name.encode("latin-1"):
+        if c < 0x21 or c > 0x7E or c in DELIMITERS or c == ord("#"):
+            out += b"#%02X" % c
+        else:
+            out.append(c)
+    written = _WRITTEN_NAMES[name] = bytes(out)
+    return written
+
+
+def _string(value: bytes) -> bytes:
+    escaped = (
+        value.replace(b"\\", b"\\\\")
+        .replace(b"(", b"\\(")
+        .replace(b")", b"\\)")
+        .replace(b"\r", b"\\r")
+    )
+    return b"(" + escaped + b")"
+
+
+def serialise(obj: Any, out: io.BytesIO):
+    if isinstance(obj, Name):
+        out.write(_name(obj))
+    elif isinstance(obj, Ref):
+        out.write(b"%d %d R" % obj)
+    elif isinstance(obj, dict):
+        out.write(b"<<")
+        for key, value in obj.items():
+            out.write(_name(key))
+            out.write(b" ")
+            serialise(value, out)
+        out.write(b">>")
+    elif isinstance(obj, bool):
+        out.write(b"true" if obj else b"false")
+    elif isinstance(obj, int):
+        out.write(b"%d" % obj)
+    elif isinstance(obj, float):
+        out.write((f"{obj:.6f}".rstrip("0").rstrip(".") or "0").encode())
+    elif isinstance(obj, bytes):
+        out.write(_string(obj))
+    elif isinstance(obj, str):
+        out.write(_string(obj.encode("latin-1")))
+    elif obj is None:
+        out.write(b"null")
+    elif isinstance(obj, list):
+        out.write(b"[")
+        for k, item in enumerate(obj):
+            if k:
+                out.write(b" ")
+            serialise(item, out)
+        out.write(b"]")
+    elif isinstance(obj, Stream):
+        dictionary = dict(obj.dictionary)
+        dictionary[Name("Length")] = len(obj.data)
+        serialise(dictionary, out)
+        out.write(b"\nstream\n")
+        out.write(obj.data)
+        out.write(b"\nendstream")
+    else:
+        raise PDFError(f"cannot write {obj!r}")
+
+
+HEADER = b"%PDF-1.5\n%\xe2\xe3\xcf\xd3\n"
+
+# objects compressed together in an object stream
+OBJECTS_PER_STREAM = 200
+
+
+class Writer:
+    def __init__(self):
+        # object number - 1 -> object, None while reserved
+        self.objects: List[Any] = []
+        # object number -> serialised object, until it is set again
+        self.cache: Dict[int, bytes] = {}
+
+    def reserve(self) -> Ref:
+        self.objects.append(None)
+        return Ref(len(self.objects))
+
+    def set(self, ref: Ref, obj: Any):
+        self.objects[ref.number - 1] = obj
+        self.cache.pop(ref.number, None)
+
+    def add(self, obj: Any) -> Ref:
+        ref = self.reserve()
+        self.set(ref, obj)
+        return ref
+
+    def get(self, obj: Any) -> Any:
+        while isinstance(obj, Ref):
+            obj = self.objects[obj.number - 1]
+        return obj
+
+    def _serialised(self, number: int) -> bytes:
+        if number not in self.cache:
+            out = io.BytesIO()
+            serialise(self.objects[number - 1], out)
+            self.cache[number] = out.getvalue()
+        return self.cache[number]
+
+    def write(
+        self, root: Ref, info: Optional[Ref] = None, object_streams: bool = False
+    ) -> bytes:
+        """the document; objects are serialised once however many times
+        it is written, an object changed in place has to be set again.
+        Objects set to None are left out, their numbers are free. With
+        object streams, the objects that are not streams are written
+        compressed together (PDF 1.5)"""
+        if object_streams:
+            return self._write_compressed(root, info)
+        out = io.BytesIO()
+        out.write(HEADER)
+        offsets: Dict[int, int] = {}
+        for number in range(1, len(self.objects) + 1):
+            if self.objects[number - 1] is None:
+                continue
+            offsets[number] = out.tell()
+            out.write(b"%d 0 obj\n" % number)
+            out.write(self._serialised(number))
+            out.write(b"\nendobj\n")
+        start = out.tell()
+        free = self._free()
+        out.write(b"xref\n0 %d\n" % (len(self.objects) + 1))
+        out.write(b"%010d 65535 f \n" % free[0])
+        for number in range(1, len(self.objects) + 1):
+            if number in offsets:
+                out.write(b"%010d 00000 n \n" % offsets[number])
+            else:
+                out.write(b"%010d 00001 f \n" % free[number])
+        trailer = {Name("Size"): len(self.objects) + 1, Name("Root"): root}
+        if info is not None:
+            trailer[Name("Info")] = info
+        out.write(b"trailer\n")
+        serialise(trailer, out)
+        out.write(b"\nstartxref\n%d\n%%%%EOF\n" % start)
+        return out.getvalue()
+
+    def _free(self) -> Dict[int, int]:
+        """free object number -> the next one, a list starting at 0"""
+        free = [0] + [n for n, obj in enumerate(self.objects, 1) if obj is None]
+        return {n: free[(k + 1) % len(free)] for k, n in enumerate(free)}
+
+    def _write_compressed(self, root: Ref, info: Optional[Ref]) -> bytes:
+        out = io.BytesIO()
+        out.write(HEADER)
+        # object number -> (type, offset or object stream, generation or index)
+        free = self._free()
+        entries: Dict[int, Tuple[int, int, int]] = {0: (0, free[0], 0xFFFF)}
+        packed = []
+        for number in range(1, len(self.objects) + 1):
+            if self.objects[number - 1] is None:
+                entries[number] = (0, free[number], 1)
+            elif isinstance(self.objects[number - 1], Stream):
+                entries[number] = (1, out.tell(), 0)
+                out.write(b"%d 0 obj\n" % number)
+                out.write(self._serialised(number))
+                out.write(b"\nendobj\n")
+            else:
+                packed.append(number)
+        number = len(self.objects)
+        for k in range(0, len(packed), OBJECTS_PER_STREAM):
+            number += 1
+            offsets = []
+            body = io.BytesIO()
+            for index, packed_number in enumerate(packed[k : k + OBJECTS_PER_STREAM]):
+                offsets.append(b"%d %d" % (packed_number, body.tell()))
+                body.write(self._serialised(packed_number))
+                body.write(b"\n")
+                entries[packed_number] = (2, number, index)
+            head = b" ".join(offsets) + b"\n"
+            dictionary = {
+                Name("Type"): Name("ObjStm"),
+                Name("N"): len(offsets),
+                Name("First"): len(head),
+            }
+            entries[number] = (1, out.tell(), 0)
+            out.write(b"%d 0 obj\n" % number)
+            serialise(encode(dictionary, head + body.getvalue()), out)
+            out.write(b"\nendobj\n")
+
+        # the cross-reference stream is the last object
+        number += 1
+        start = out.tell()
+        entries[number] = (1, start, 0)
+        rows = b"".join(struct.pack(">BIH", *entries[k]) for k in range(number + 1))
+        dictionary = {
+            Name("Type"): Name("XRef"),
+            Name("Size"): number + 1,
+            Name("W"): [1, 4, 2],
+            Name("Root"): root,
+        }
+        if info is not None:
+            dictionary[Name("Info")] = info
+        out.write(b"%d 0 obj\n" % number)
+        serialise(encode(dictionary, rows), out)
+        out.write(b"\nendobj\nstartxref\n%d\n%%%%EOF\n" % start)
+        return out.getvalue()
+
+
+# dictionaries written once when several documents have the same, as
+# every stream is (fonts, images, colour profiles)
+SHARED_TYPES = {"Font", "FontDescriptor", "ExtGState", "Encoding"}
+
+# "ABCDEF+EBGaramond-Regular", the tag naming a subset of a font
+_SUBSET = re.compile(r"[A-Z]{6}\+")
+
+
+class Copier:
+    """copy objects of documents into a writer, each object once, and
+    identical streams and shared dictionaries once for all documents;
+    streams and shared dictionaries must not refer back to what refers
+    to them"""
+
+    def __init__(self, writer: Writer):
+        self.writer = writer
+        # document -> object number -> new reference
+        self.copied: Dict[Document, Dict[int, Ref]] = {}
+        # content of a shared object -> its reference
+        self.shared: Dict[bytes, Ref] = {}
+        # bytes of the objects written once instead of several times
+        self.saved = 0
+
+    def _tag(self, name: Any) -> Optional[str]:
+        if isinstance(name, Name) and _SUBSET.match(name):
+            return name[:7]
+        return None
+
+    def _retag(self, font: Dict[Name, Any]):
+        """name a font subset after its content: engines draw the tags at
+        random, two frames may use one tag for different subsets"""
+        if font.get("Type") == "FontDescriptor" and self._tag(font.get("FontName")):
+            out = io.BytesIO()
+            serialise({k: v for k, v in font.items() if k != "FontName"}, out)
+            digest = hashlib.sha1(out.getvalue()).digest()
+            tag = "".join(chr(ord("A") + b % 26) for b in digest[:6]) + "+"
+            font[Name("FontName")] = Name(tag + font["FontName"][7:])
+        elif font.get("Type") == "Font" and self._tag(font.get("BaseFont")):
+            # the tag of the descriptor, or of the descendant font
+            source = self.writer.get(font.get("FontDescriptor"))
+            descendants = self.writer.get(font.get("DescendantFonts"))
+            if isinstance(source, dict):
+                tag = self._tag(source.get("FontName"))
+            elif descendants:
+                tag = self._tag(self.writer.get(descendants[0]).get("BaseFont"))
+            else:
+                tag = None
+            if tag is not None:
+                font[Name("BaseFont")] = Name(tag + font["BaseFont"][7:])
+
+    def _shared(self, target: Any) -> bool:
+        if isinstance(target, Stream):
+            return True
+        return isinstance(target, dict) and target.get("Type") in SHARED_TYPES
+
+    def forget(self, document: Document):
+        """let a document go, its objects are copied again if needed"""
+        self.copied.pop(document, None)
+
+    def reference(self, document: Document, ref: Ref) -> Ref:
+        copied = self.copied.setdefault(document, {})
+        if ref.number in copied:
+            return copied[ref.number]
+        target = document.objects.get(ref.number)
+        if not self._shared(target):
+            # reserved first, the object may refer back to itself
+            copied[ref.number] = self.writer.reserve()
+            self.writer.set(copied[ref.number], self.copy(document, target))
+            return copied[ref.number]
+        copy = self.copy(document, target)
+        if isinstance(copy, dict):
+            self._retag(copy)
+        out = io.BytesIO()
+        if isinstance(copy, Stream):
+            serialise({k: v for k, v in copy.dictionary.items() if k != "Length"}, out)
+            out.write(hashlib.sha1(copy.data).digest())
+        else:
+            serialise(copy, out)
+        content = out.getvalue()
+        if content in self.shared:
+            self.saved += len(copy.data) if isinstance(copy, Stream) else len(content)
+        else:
+            self.shared[content] = self.writer.add(copy)
+        copied[ref.number] = self.shared[content]
+        return copied[ref.number]
+
+    def copy(self, document: Document, obj: Any) -> Any:
+        if isinstance(obj, Ref):
+            return self.reference(document, obj)
+        if isinstance(obj, dict):
+            return {key: self.copy(document, value) for key, value in obj.items()}
+        if isinstance(obj, list):
+            return [self.copy(document, item) for item in obj]
+        if isinstance(obj, Stream):
+            return Stream(self.copy(document, obj.dictionary), obj.data)
+        return obj
+
+
+def _link_target(annotation: Any, writer: Writer) -> Optional[bytes]:
+    """the destination name a link annotation goes to, if named"""
+    if not isinstance(annotation, dict) or annotation.get("Subtype") != "Link":
+        return None
+    target = writer.get(annotation.get("Dest"))
+    action = writer.get(annotation.get("A"))
+    if target is None and isinstance(action, dict) and action.get("S") == "GoTo":
+        target = writer.get(action.get("D"))
+    if isinstance(target, Name):
+        return target.encode("latin-1")
+    if isinstance(target, bytes):
+        return bytes(target)
+    return None
+
+
+class Merger:
+    """documents appended one after the other into one
+
+    Each document is copied once however many times the result is
+    written, and identical fonts and images once for all documents (see
+    ``Copier``). The destinations named by every document go to the
+    name tree of the result, the first document naming one has it, and
+    links going to a named destination are rewritten to go to its page
+    directly, which every viewer follows. The outline, page labels and
+    other entries of the catalog, and the document information, are
+    those of the documents appended with keep."""
+
+    def __init__(self):
+        self.writer = Writer()
+        self.copier = Copier(self.writer)
+        self.root = self.writer.reserve()
+        self.tree = self.writer.reserve()
+        self.kids: List[Ref] = []
+        self.destinations: Dict[bytes, Any] = {}
+        # (object holding the annotation, annotation, name) of the links
+        # to a destination not named yet
+        self.links: List[Tuple[Ref, Dict[Name, Any], bytes]] = []
+        # entries of the catalog besides the pages and destinations
+        self.catalog: Dict[Name, Any] = {}
+        self.info: Optional[Ref] = None
+
+    def append(self, document: Document, keep: bool = False):
+        refs = document.pages()
+        # pages first, annotations refer back to them
+        copied = self.copier.copied.setdefault(document, {})
+        for ref in refs:
+            copied[ref.number] = self.writer.reserve()
+        for ref in refs:
+            page = self.copier.copy(document, document.page(ref))
+            page[Name("Parent")] = self.tree
+            new = copied[ref.number]
+            self.writer.set(new, page)
+            self.kids.append(new)
+            annotations = page.get("Annots", [])
+            # the object to set again once a link is rewritten
+            owner = annotations if isinstance(annotations, Ref) else new
+            for annotation in self.writer.get(annotations):
+                holder = annotation if isinstance(annotation, Ref) else owner
+                annotation = self.writer.get(annotation)
+                name = _link_target(annotation, self.writer)
+                if name is not None:
+                    self.links.append((holder, annotation, name))
+        # every frame names its first page (page.1, Doc-Start)
+        for name, value in document.destinations().items():
+            if name not in self.destinations:
+                self.destinations[name] = self.copier.copy(document, value)
+        if keep:
+            self._keep(document)
+        self.copier.forget(document)
+
+    def _keep(self, document: Document):
+        """copy what the catalog has besides the pages, while the pages it
+        may refer to are still those copied"""
+        for key, value in document.catalog.items():
+            if key in ("Type", "Pages", "Dests"):
+                continue
+            if key == "Names":
+                # the destinations are those of every document
+                names = document.resolve(value)
+                value = {k: v for k, v in names.items() if k != "Dests"}
+                if not value:
+                    continue
+            self.catalog[Name(key)] = self.copier.copy(document, value)
+        if isinstance(document.trailer.get("Info"), Ref):
+            self.info = self.copier.reference(document, document.trailer["Info"])
+
+    def _resolve_links(self):
+        waiting = []
+        for holder, annotation, name in self.links:
+            destination = self.writer.get(self.destinations.get(name))
+            if isinstance(destination, dict):
+                destination = self.writer.get(destination.get("D"))
+            if not isinstance(destination, list):
+                waiting.append((holder, annotation, name))
+                continue
+            annotation.pop("A", None)
+            annotation[Name("Dest")] = destination
+            self.writer.set(holder, self.writer.get(holder))
+        self.links = waiting
+
+    def write(self, object_streams: bool = False) -> bytes:
+        """the documents appended so far, as one document"""
+        self._resolve_links()
+        self.writer.set(
+            self.tree,
+            {
+                Name("Type"): Name("Pages"),
+                Name("Kids"): list(self.kids),
+                Name("Count"): len(self.kids),
+            },
+        )
+        catalog = {
+            **self.catalog,
+            Name("Type"): Name("Catalog"),
+            Name("Pages"): self.tree,
+        }
+        if self.destinations:
+            # a name tree of a single node, names in order
+            pairs: List[Any] = []
+            for name in sorted(self.destinations):
+                pairs += [String(name), self.destinations[name]]
+            catalog[Name("Names")] = {
+                **self.catalog.get("Names", {}),
+                Name("Dests"): {Name("Names"): pairs},
+            }
+        self.writer.set(self.root, catalog)
+        return self.writer.write(self.root, self.info, object_streams)
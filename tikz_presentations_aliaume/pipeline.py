@@ -0,0 +1,375 @@
+"""
+Streaming build.
+
+``preview`` writes the whole document before the engine starts, so
+drawing and compiling never overlap and the first page shows up after
+the whole deck is compiled. Here every frame is compiled as its own
+standalone document as soon as it is drawn:
+
+* the calling thread draws the frames in order (``framefile.records``)
+  and puts their documents in a queue of ``QUEUE_SIZE`` frames; when the
+  compilers fall behind, drawing waits for them;
+* compiler threads run the engine on one frame each (or hand it to a
+  compile farm or a compile daemon and wait for it, see farm.py and
+  daemon.py), compiled frames
+  are kept in ``FRAME_DIR`` by hash of their document, a frame that did
+  not change since the last build is not compiled again;
+* the frames compiled so far are assembled in order into the output
+  (``pdf.Merger``, which copies each frame once and the fonts and
+  images the frames share once for all), at most every
+  ``ASSEMBLE_EVERY`` seconds but as soon as the first frame is there,
+  so the first page costs a frame; once every frame is there, the
+  output can be compacted (``--compact``, see compact.py).
+
+Frames that depend on the whole deck, citations and the bibliography,
+are compiled once every frame is drawn, their labels depend on all the
+citations of the deck. Links between frames resolve in the assembled
+output, the destinations named by each frame are kept.
+
+A handout (``utils.frame_jobs(..., handout=True)``) streams the last
+frame of every slide only; its frames are cached as any other, so a
+handout built again only compiles the slides that changed.
+
+``stream`` can also keep the drawn frames in a frame file, and
+``compile_file`` compiles a frame file drawn elsewhere, possibly while
+it is being written (``--follow``):
+
+    uv run python -m tikz_presentations_aliaume.pipeline deck.frames
+"""
+
+import argparse
+import os
+import queue
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from tikz_presentations_aliaume import (
+    assets,
+    build,
+    framefile,
+    parallel,
+    pdf,
+    sourcemap,
+)
+
+FRAME_DIR = "frames"
+
+# frames drawn ahead of the compilers
+QUEUE_SIZE = 8
+
+# seconds between two writes of the output
+ASSEMBLE_EVERY = 2.0
+
+# seconds between two looks at a frame file being written
+FOLLOW_EVERY = 0.5
+
+# number, document, map of the document
+Task = Tuple[int, str, sourcemap.SourceMap]
+
+# (document, map, engine) -> path of the compiled frame
+Compiler = Callable[[str, Optional[sourcemap.SourceMap], str], str]
+
+
+def frame_path(key: str) -> str:
+    return os.path.join(FRAME_DIR, key + ".pdf")
+
+
+def compile_frame(
+    document: str,
+    source_map: Optional[sourcemap.SourceMap] = None,
+    engine: str = "xelatex",
+) -> str:
+    """path of the compiled frame, compiled unless cached"""
+    key = framefile.content_hash(document)
+    path = frame_path(key)
+    if os.path.exists(path):
+        return path
+    source = os.path.join(FRAME_DIR, key + ".tex")
+    log = os.path.join(FRAME_DIR, key + ".log")
+    with open(source, "w") as f:
+        f.write(document)
+    # the engine writes the frame as it goes, an interrupted run must not
+    # leave a frame that looks compiled
+    with tempfile.TemporaryDirectory(dir=FRAME_DIR) as directory:
+        partial_log = os.path.join(directory, key + ".log")
+        try:
+            # run from here, where the colour scheme and assets are
+            build.run(
+                [
+                    engine,
+                    "-interaction=nonstopmode",
+                    "-halt-on-error",
+                    "-file-line-error",
+                    f"-output-directory={directory}",
+                    source,
+                ],
+                ".",
+                partial_log,
+                build.TIMEOUT,
+                source_map,
+            )
+        except build.CompileError as error:
+            if not error.log:
+                raise
+            raise build.CompileError(
+                f"{engine} failed, see {log}", error.errors, error.log
+            ) from None
+        finally:
+            if os.path.exists(partial_log):
+                os.replace(partial_log, log)
+        os.replace(os.path.join(directory, key + ".pdf"), path)
+    return path
+
+
+class Pipeline:
+    def __init__(
+        self,
+        output: str,
+        total: Optional[int],
+        engine: str = "xelatex",
+        on_first_page: Optional[Callable[[], None]] = None,
+        compile_document: Optional[Compiler] = None,
+    ):
+        self.output = output
+        self.total = total
+        self.engine = engine
+        self.compile_document = compile_document or compile_frame
+        self.on_first_page = on_first_page
+        self.tasks: "queue.Queue[Optional[Task]]" = queue.Queue(QUEUE_SIZE)
+        # compiled frames not assembled yet
+        self.compiled: Dict[int, pdf.Document] = {}
+        self.merger = pdf.Merger()
+        self.errors: Dict[int, Exception] = {}
+        self.changed = threading.Condition()
+        self.done = False
+        self.written = 0
+
+    def submit(
+        self,
+        record: framefile.Record,
+        hypersetup: Optional[List[str]] = None,
+        packages: Iterable[str] = (),
+    ):
+        """queue a frame, waits while the queue is full"""
+        # the assets of a frame are there before it is compiled
+        assets.PENDING.update(record.assets)
+        assets.compile_pending(self.engine)
+        document, source_map = framefile.document(record, hypersetup, packages)
+        self.tasks.put((record.index, document, source_map))
+
+    def compiler(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+            number, document, source_map = task
+            if self.errors:
+                continue
+            try:
+                path = self.compile_document(document, source_map, self.engine)
+                with open(path, "rb") as f:
+                    compiled = pdf.Document.read(f.read())
+            except Exception as error:
+                with self.changed:
+                    self.errors[number] = error
+                    self.changed.notify()
+                continue
+            with self.changed:
+                self.compiled[number] = compiled
+                self.changed.notify()
+
+    def _prefix(self) -> int:
+        ready = self.written
+        while ready in self.compiled:
+            ready += 1
+        return ready
+
+    def _write(self, frames: int):
+        with self.changed:
+            documents = [self.compiled.pop(k) for k in range(self.written, frames)]
+        for document in documents:
+            self.merger.append(document)
+        data = self.merger.write()
+        with open(self.output + ".part", "wb") as f:
+            f.write(data)
+        os.replace(self.output + ".part", self.output)
+        if not self.written and self.on_first_page is not None:
+            self.on_first_page()
+        self.written = frames
+        print(f"{self.output}: {frames}/{self.total or '?'} frames")
+
+    def assembler(self):
+        last: Optional[float] = None
+        while True:
+            with self.changed:
+                while True:
+                    if self.errors:
+                        return
+                    ready = self._prefix()
+                    if ready == self.written:
+                        if self.done:
+                            return
+                        self.changed.wait()
+                        continue
+                    # the first pages and the last ones are written at once
+                    if last is None or self.done:
+                        break
+                    wait = ASSEMBLE_EVERY - (time.monotonic() - last)
+                    if wait <= 0:
+                        break
+                    self.changed.wait(wait)
+            self._write(ready)
+            last = time.monotonic()
+
+    def finish(self):
+        with self.changed:
+            self.done = True
+            self.changed.notify()
+
+
+def _compile(
+    produce: Callable[[Pipeline], None],
+    total: Optional[int],
+    output: str,
+    engine: str,
+    workers: Optional[int],
+    on_first_page: Optional[Callable[[], None]],
+    compile_document: Optional[Compiler],
+):
+    os.makedirs(FRAME_DIR, exist_ok=True)
+    pipeline = Pipeline(output, total, engine, on_first_page, compile_document)
+    threads = [
+        threading.Thread(target=pipeline.compiler, daemon=True)
+        for _ in range(workers or os.cpu_count() or 1)
+    ]
+    assembler = threading.Thread(target=pipeline.assembler, daemon=True)
+    for thread in [*threads, assembler]:
+        thread.start()
+    try:
+        produce(pipeline)
+    finally:
+        for _ in threads:
+            pipeline.tasks.put(None)
+        for thread in threads:
+            thread.join()
+        pipeline.finish()
+        assembler.join()
+    if pipeline.errors:
+        raise pipeline.errors[min(pipeline.errors)]
+
+
+def stream(
+    jobs: List[parallel.Job],
+    output: str = "preview.pdf",
+    hypersetup: Optional[List[str]] = None,
+    packages: Iterable[str] = (),
+    engine: str = "xelatex",
+    workers: Optional[int] = None,
+    on_first_page: Optional[Callable[[], None]] = None,
+    frames_file: Optional[str] = None,
+    compile_document: Optional[Compiler] = None,
+) -> int:
+    """draw and compile frames at once into output, returns the frames;
+    the frames are also written to frames_file when given, and compiled
+    by compile_document instead of here when given (see farm.py)"""
+    writer = None
+    if frames_file is not None:
+        writer = framefile.FrameWriter(frames_file, hypersetup, packages, len(jobs))
+
+    def produce(pipeline: Pipeline):
+        records = framefile.records(jobs)
+        try:
+            for record in records:
+                if pipeline.errors:
+                    break
+                if writer is not None:
+                    writer.write(record)
+                pipeline.submit(record, hypersetup, packages)
+        finally:
+            records.close()
+
+    try:
+        _compile(
+            produce,
+            len(jobs),
+            output,
+            engine,
+            workers,
+            on_first_page,
+            compile_document,
+        )
+    finally:
+        if writer is not None:
+            writer.close()
+    return len(jobs)
+
+
+def compile_file(
+    path: str,
+    output: str,
+    engine: str = "xelatex",
+    workers: Optional[int] = None,
+    follow: bool = False,
+    compile_document: Optional[Compiler] = None,
+) -> int:
+    """compile a frame file into output, returns the frames; when
+    following, wait for the frames still being written"""
+    with framefile.FrameReader(path) as reader:
+
+        def produce(pipeline: Pipeline):
+            submitted = set()
+            while True:
+                for index in reader.indices():
+                    if pipeline.errors:
+                        return
+                    if index not in submitted:
+                        submitted.add(index)
+                        pipeline.submit(
+                            reader[index], reader.hypersetup, reader.packages
+                        )
+                if not follow or len(submitted) == reader.frames:
+                    return
+                time.sleep(FOLLOW_EVERY)
+                reader.refresh()
+
+        _compile(
+            produce, reader.frames, output, engine, workers, None, compile_document
+        )
+        return len(reader)
+
+
+def main(argv: Optional[List[str]] = None):
+    from tikz_presentations_aliaume import compact, daemon
+
+    parser = argparse.ArgumentParser(description="compile a frame file")
+    parser.add_argument("frames")
+    parser.add_argument("-o", "--output", default=None)
+    parser.add_argument("--engine", default="xelatex")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--follow", action="store_true")
+    parser.add_argument(
+        "--daemon",
+        nargs="?",
+        const=daemon.SOCKET,
+        default=None,
+        help="compile with the compile daemon listening there",
+    )
+    parser.add_argument(
+        "--compact", action="store_true", help="compact the output, see compact.py"
+    )
+    args = parser.parse_args(argv)
+    output = args.output or os.path.splitext(args.frames)[0] + ".pdf"
+    compile_document = None
+    if args.daemon is not None:
+        compile_document = daemon.Client(args.daemon).compile
+    compile_file(
+        args.frames, output, args.engine, args.workers, args.follow, compile_document
+    )
+    if args.compact:
+        compact.main([output])
+
+
+if __name__ == "__main__":
+    main()
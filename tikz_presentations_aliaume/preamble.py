@@ -0,0 +1,198 @@
+"""
+Needs-based preamble.
+
+The preamble of a deck is assembled from the requirements of its
+frames instead of always loading every package and TikZ library.
+Requirements come from two places:
+
+* components declare them while drawing, with ``need("automata")``;
+* ``detect`` finds the usual commands and keys in the generated code
+  (``\\cite``, ``\\toprule``, ``\\cmark``, ``decoration=snake``...).
+
+The packages every frame relies on (fonts, colours, maths) are always
+loaded. Run as a module to measure the startup time saved per deck:
+
+    uv run python -m tikz_presentations_aliaume.preamble
+"""
+
+import argparse
+import importlib
+import os
+import re
+import subprocess
+import tempfile
+import time
+from typing import Iterable, List, Optional, Set
+
+# (requirement, code) in loading order, None for what is always loaded
+ENTRIES = [
+    (None, r"\documentclass[tikz,9pt]{standalone}"),
+    (
+        "biblatex",
+        r"""\usepackage[maxbibnames=99,
+    style=alphabetic,
+    backend=biber,
+    sorting=ydnt,
+]{biblatex}""",
+    ),
+    ("hyperref", r"\usepackage{{hyperref}}" + "\n" + r"\hypersetup{{{hypersetup}}}"),
+    (None, r"\usepackage[french]{babel}"),
+    ("csquotes", r"\usepackage{csquotes}"),
+    (None, r"\usepackage{fontspec}"),
+    ("booktabs", r"\usepackage{booktabs}"),
+    (None, r"\setmainfont{EB Garamond}"),
+    ("decorations.markings", r"\usetikzlibrary{decorations.markings}"),
+    ("decorations.pathmorphing", r"\usetikzlibrary{decorations.pathmorphing}"),
+    ("decorations.pathreplacing", r"\usetikzlibrary{decorations.pathreplacing}"),
+    ("shapes", r"\usetikzlibrary{shapes}"),
+    ("arrows", r"\usetikzlibrary{arrows}"),
+    ("automata", r"\usetikzlibrary{automata}"),
+    ("biblatex", r"\addbibresource{papers.bib}"),
+    (
+        "pifont",
+        r"""\usepackage{pifont}% http://ctan.org/pkg/pifont
+\newcommand{\cmark}{\ding{51}}%
+\newcommand{\xmark}{\ding{55}}%""",
+    ),
+    (None, r"\usepackage{ensps-colorscheme}"),
+    (None, r"\usepackage{amsmath}"),
+    (None, r"\usepackage{amsfonts}"),
+    (None, r"\usepackage{amssymb}"),
+]
+
+REQUIREMENTS = {name for name, _ in ENTRIES if name is not None}
+
+# requirements of requirements
+IMPLIES = {"biblatex": {"csquotes"}}
+
+HYPERSETUP = ["colorlinks", "anchorcolor=A2", "linkcolor=A4", "citecolor=Prune"]
+
+_SHAPES = (
+    "ellipse|diamond|star|trapezium|regular polygon|rectangle split|cloud"
+    "|cylinder|isosceles triangle|kite|dart|circle split|signal|tape"
+)
+
+# patterns of the generated code -> requirement
+DETECT = [
+    (r"\\(?:cite|textcite|parencite|fullcite|printbibliography)\b", "biblatex"),
+    (r"\\(?:hyperlink|hypertarget|href|url)\b", "hyperref"),
+    (r"\\(?:toprule|midrule|bottomrule|cmidrule)\b", "booktabs"),
+    (r"\\(?:cmark|xmark|ding)\b", "pifont"),
+    (r"\\(?:enquote|textquote|blockquote)\b", "csquotes"),
+    (r"markings", "decorations.markings"),
+    (
+        r"decoration\s*=\s*\{?\s*(?:snake|zigzag|coil|saw|bumps|random steps)",
+        "decorations.pathmorphing",
+    ),
+    (
+        r"decoration\s*=\s*\{?\s*(?:brace|ticks|waves|expanding waves|border)",
+        "decorations.pathreplacing",
+    ),
+    (r"[\[,]\s*(?:shape\s*=\s*)?(?:" + _SHAPES + r")\s*[,\]]", "shapes"),
+    (r"[\[,]\s*(?:state|initial|accepting)(?:\s*=[^,\]]*)?\s*[,\]]", "automata"),
+    (
+        r"stealth'|latex'|triangle (?:45|60|90)|angle (?:45|60|90)|open triangle",
+        "arrows",
+    ),
+]
+_DETECT = [(re.compile(pattern), name) for pattern, name in DETECT]
+
+# requirements declared by the components drawn since the last reset
+NEEDED: Set[str] = set()
+
+
+def need(*requirements: str):
+    """declare requirements of the component being drawn"""
+    for requirement in requirements:
+        if requirement not in REQUIREMENTS:
+            raise ValueError(f"unknown preamble requirement {requirement!r}")
+        NEEDED.add(requirement)
+
+
+def reset():
+    NEEDED.clear()
+
+
+def detect(code: str) -> Set[str]:
+    """requirements of some generated code"""
+    return {name for pattern, name in _DETECT if pattern.search(code)}
+
+
+def close(requirements: Iterable[str]) -> Set[str]:
+    result = set(requirements)
+    for requirement in list(result):
+        result |= IMPLIES.get(requirement, set())
+    return result
+
+
+def assemble(
+    requirements: Optional[Iterable[str]] = None,
+    hypersetup: Optional[List[str]] = None,
+    packages: Iterable[str] = (),
+) -> str:
+    """preamble loading what is required, everything if None"""
+    needs = REQUIREMENTS if requirements is None else close(requirements)
+    options = ",\n    ".join(HYPERSETUP if hypersetup is None else hypersetup)
+    lines = [
+        code.format(hypersetup=f"\n    {options},\n") if name == "hyperref" else code
+        for name, code in ENTRIES
+        if name is None or name in needs
+    ]
+    lines += [f"\\usepackage{{{p}}}" for p in packages]
+    return "\n".join(lines)
+
+
+def _startup_time(preamble: str, repeat: int) -> float:
+    document = (
+        preamble
+        + "\n\\begin{document}\n\\begin{tikzpicture}\\node{x};\\end{tikzpicture}"
+        + "\n\\end{document}\n"
+    )
+    best = float("inf")
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "startup.tex")
+        with open(source, "w") as f:
+            f.write(document)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(
+                [
+                    "xelatex",
+                    "-interaction=batchmode",
+                    f"-output-directory={directory}",
+                    source,
+                ],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                check=True,
+            )
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv: Optional[List[str]] = None):
+    from tikz_presentations_aliaume.bench import DECKS
+    from tikz_presentations_aliaume.components import utils
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("decks", nargs="*", default=DECKS)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    full = _startup_time(assemble(), args.repeat)
+    print(f"{'deck':<18}{'needs':<60}{'startup':>9}{'saved':>9}")
+    print(f"{'(everything)':<18}{'':<60}{full:>8.2f}s")
+    for name in args.decks:
+        deck = importlib.import_module(name).deck()
+        reset()
+        code = utils.tikz_of_animation(deck)
+        needs = sorted(close(NEEDED | detect(code)))
+        startup = _startup_time(assemble(needs), args.repeat)
+        print(
+            f"{name:<18}{', '.join(needs):<60}{startup:>8.2f}s"
+            f"{(full - startup) / full:>8.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
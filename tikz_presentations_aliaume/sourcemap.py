@@ -0,0 +1,98 @@
+"""
+Map from lines of the generated document back to the Python code.
+
+A TeX error points to a line of a document made of thousands of frames.
+While the frames are serialised, ``write`` records for every line the
+function that emitted the command (``ir.TRACE_ORIGINS``), e.g.
+``MonoidTree.draw`` or ``framing``, and ``SourceMap`` remembers where
+each frame starts, so that ``locate`` turns a line number into the
+frame, its animation depth and that function.
+
+The map of the last generated document is kept in ``LAST`` for the
+build driver, see ``build.build``.
+"""
+
+import dataclasses
+import io
+from typing import List, Optional, Tuple
+
+from tikz_presentations_aliaume import ir
+
+
+def write(scope: ir.Scope, out: io.StringIO, origins: List[str], default: str = ""):
+    """serialise a picture as Scope.write does, with the origin of every line"""
+    default = scope.origin or default
+    out.write(f"\\begin{{{scope.environment}}}")
+    out.write(ir.fmt_options(scope.options))
+    out.write("\n")
+    origins.append(default)
+    for item in scope.items:
+        origin = scope.origins.get(id(item), default)
+        if isinstance(item, ir.Scope):
+            write(item, out, origins, origin)
+            continue
+        start = out.tell()
+        item.write(out)
+        out.seek(start)
+        origins.extend([origin] * out.read().count("\n"))
+    out.write(f"\\end{{{scope.environment}}}\n")
+    origins.append(default)
+
+
+def code(scope: ir.Scope) -> Tuple[str, List[str]]:
+    """code of a picture and the origin of each of its lines"""
+    out = io.StringIO()
+    origins: List[str] = []
+    write(scope, out, origins)
+    return out.getvalue(), origins
+
+
+@dataclasses.dataclass
+class Frame:
+    number: int
+    depth: int
+    # line of the document holding the first line of the picture
+    first_line: int
+    origins: List[str]
+
+
+@dataclasses.dataclass
+class Location:
+    frame: int
+    depth: int
+    origin: str
+
+    def __str__(self):
+        where = f"frame {self.frame}, animation depth {self.depth}"
+        return f"{where}, emitted by {self.origin}" if self.origin else where
+
+
+@dataclasses.dataclass
+class SourceMap:
+    frames: List[Frame] = dataclasses.field(default_factory=list)
+
+    def locate(self, line: int) -> Optional[Location]:
+        """where a line of the document comes from, None outside frames"""
+        for frame in reversed(self.frames):
+            if frame.first_line - 1 <= line:
+                offset = line - frame.first_line
+                if offset < 0:
+                    # the comment announcing the frame
+                    return Location(frame.number, frame.depth, "")
+                if offset < len(frame.origins):
+                    return Location(frame.number, frame.depth, frame.origins[offset])
+                return None
+        return None
+
+
+LAST: Optional[SourceMap] = None
+
+
+def document_map(document: str, code: str, frames: List[Frame]) -> SourceMap:
+    """place frames numbered from the start of ``code`` in the document"""
+    global LAST
+    shift = document[: document.index(code)].count("\n")
+    for frame in frames:
+        frame.first_line += shift
+    LAST = SourceMap(frames)
+    return LAST
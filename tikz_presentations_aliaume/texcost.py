@@ -0,0 +1,222 @@
+"""
+Per-frame TeX cost.
+
+A deck compiles as one document, so the log does not tell which frames
+the time goes to. This profiler cuts the generated document into one
+standalone document per frame (same preamble and definitions, using the
+source map of ``sourcemap.LAST``), compiles them in parallel and records
+for every frame:
+
+* the wall time of the engine, and the time above the empty frame;
+* the TeX memory statistics printed at the end of the log
+  (``\\tracingstats``), e.g. words of memory and strings;
+* the size of the PDF produced.
+
+Frames are ranked by wall time, with the component class that drew them
+and their animation depth, followed by the total per component:
+
+    uv run python -m tikz_presentations_aliaume.texcost mcf_bordeaux --top 20
+"""
+
+import argparse
+import concurrent.futures
+import dataclasses
+import importlib
+import os
+import re
+import subprocess
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from tikz_presentations_aliaume import sourcemap
+from tikz_presentations_aliaume.build import TIMEOUT
+
+BEGIN = "\\begin{document}"
+END = "\\end{document}"
+
+# the empty frame, compiled to measure what every frame pays
+EMPTY_FRAME = "\\begin{tikzpicture}\\node{x};\\end{tikzpicture}\n"
+
+# " 36398 strings out of 477984" at the end of the log
+MEMORY = re.compile(r"^ (\d+) ([a-z ]+?) out of \d+", re.MULTILINE)
+
+# statistic shown in the report
+MAIN_MEMORY = "words of memory"
+
+
+@dataclasses.dataclass
+class FrameCost:
+    frame: int
+    depth: int
+    component: str
+    seconds: float
+    # statistic -> amount used
+    memory: Dict[str, int] = dataclasses.field(default_factory=dict)
+    pdf_bytes: Optional[int] = None
+    error: str = ""
+
+
+def frame_documents(
+    document: str, source_map: sourcemap.SourceMap
+) -> List[Tuple[sourcemap.Frame, str]]:
+    """a standalone document per frame of a generated document"""
+    head = document[: document.index(BEGIN)]
+    lines = document.split("\n")
+    # a frame goes up to the comment opening the next one, the last one
+    # up to the end of the document (pictures drawn by pytikz have no
+    # origins to count their lines)
+    ends = [frame.first_line - 2 for frame in source_map.frames[1:]]
+    ends.append(document[: document.rindex(END)].count("\n"))
+    documents = []
+    for frame, end in zip(source_map.frames, ends):
+        body = "\n".join(lines[frame.first_line - 1 : end]).strip("\n")
+        documents.append((frame, standalone(head, body)))
+    return documents
+
+
+def standalone(head: str, body: str) -> str:
+    return f"\\tracingstats=1\n{head}{BEGIN}\n{body}\n\\end{{document}}\n"
+
+
+def memory_usage(log: str) -> Dict[str, int]:
+    """TeX memory statistics of a log"""
+    return {name: int(used) for used, name in MEMORY.findall(log)}
+
+
+def compile_frame(
+    document: str, name: str, engine: str = "xelatex", timeout: float = TIMEOUT
+) -> Tuple[float, Dict[str, int], Optional[int], str]:
+    """wall time, memory statistics, PDF size and error of a document"""
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, name + ".tex")
+        with open(source, "w") as f:
+            f.write(document)
+        start = time.perf_counter()
+        error = ""
+        try:
+            # run from here, where the colour scheme and assets are
+            result = subprocess.run(
+                [
+                    engine,
+                    "-interaction=nonstopmode",
+                    "-halt-on-error",
+                    f"-output-directory={directory}",
+                    source,
+                ],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=timeout,
+            )
+            if result.returncode != 0:
+                error = f"{engine} failed"
+        except subprocess.TimeoutExpired:
+            error = f"timed out after {timeout}s"
+        seconds = time.perf_counter() - start
+        try:
+            with open(os.path.join(directory, name + ".log"), errors="replace") as f:
+                memory = memory_usage(f.read())
+        except FileNotFoundError:
+            memory = {}
+        try:
+            pdf_bytes = os.path.getsize(os.path.join(directory, name + ".pdf"))
+        except FileNotFoundError:
+            pdf_bytes = None
+    return seconds, memory, pdf_bytes, error
+
+
+def profile(
+    document: str,
+    source_map: sourcemap.SourceMap,
+    workers: Optional[int] = None,
+    engine: str = "xelatex",
+) -> Tuple[FrameCost, List[FrameCost]]:
+    """cost of the empty frame and of every frame, compiled in parallel"""
+    documents = frame_documents(document, source_map)
+    head = document[: document.index(BEGIN)]
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=workers or os.cpu_count() or 1
+    ) as pool:
+        empty = pool.submit(
+            compile_frame, standalone(head, EMPTY_FRAME), "empty", engine
+        )
+        futures = [
+            pool.submit(compile_frame, code, f"frame-{frame.number}", engine)
+            for frame, code in documents
+        ]
+        baseline = FrameCost(-1, 0, "(empty frame)", *empty.result())
+        costs = [
+            FrameCost(frame.number, frame.depth, _component(frame), *future.result())
+            for (frame, _), future in zip(documents, futures)
+        ]
+    return baseline, costs
+
+
+def _component(frame: sourcemap.Frame) -> str:
+    # the picture is opened by the state that draws the frame
+    return frame.origins[0] if frame.origins else "?"
+
+
+def _size(pdf_bytes: Optional[int]) -> str:
+    return "-" if pdf_bytes is None else f"{pdf_bytes / 1024:.1f}k"
+
+
+def report(baseline: FrameCost, costs: List[FrameCost], top: int = 20) -> str:
+    """frames ranked by wall time, then the total per component"""
+    lines = [
+        f"empty frame: {baseline.seconds:.2f}s, "
+        f"{baseline.memory.get(MAIN_MEMORY, 0)} {MAIN_MEMORY}",
+        "",
+        f"{'rank':>4} {'frame':>5} {'depth':>5}  {'component':<28}"
+        f"{'time':>8}{'extra':>8}{'memory':>10}{'pdf':>9}",
+    ]
+    ranked = sorted(costs, key=lambda cost: cost.seconds, reverse=True)
+    for rank, cost in enumerate(ranked[:top], 1):
+        lines.append(
+            f"{rank:>4} {cost.frame:>5} {cost.depth:>5}  {cost.component:<28}"
+            f"{cost.seconds:>7.2f}s{cost.seconds - baseline.seconds:>7.2f}s"
+            f"{cost.memory.get(MAIN_MEMORY, 0):>10}{_size(cost.pdf_bytes):>9}"
+            + (f"  {cost.error}" if cost.error else "")
+        )
+
+    components: Dict[str, List[FrameCost]] = {}
+    for cost in costs:
+        components.setdefault(cost.component, []).append(cost)
+    total = sum(cost.seconds - baseline.seconds for cost in costs) or 1.0
+    lines += ["", f"{'component':<28}{'frames':>7}{'extra':>9}{'share':>7}"]
+    for component, group in sorted(
+        components.items(), key=lambda item: -sum(c.seconds for c in item[1])
+    ):
+        extra = sum(cost.seconds - baseline.seconds for cost in group)
+        lines.append(
+            f"{component:<28}{len(group):>7}{extra:>8.2f}s{extra / total:>7.0%}"
+        )
+    failed = [cost for cost in costs if cost.error]
+    if failed:
+        lines += ["", f"{len(failed)} frames failed to compile alone"]
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    from tikz_presentations_aliaume.bench import DECKS
+    from tikz_presentations_aliaume.components import utils
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("decks", nargs="*", default=DECKS)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--engine", default="xelatex")
+    args = parser.parse_args(argv)
+
+    for name in args.decks:
+        document = utils.tikz_of_animation(importlib.import_module(name).deck())
+        baseline, costs = profile(
+            document, sourcemap.LAST, workers=args.workers, engine=args.engine
+        )
+        print(f"== {name}: {len(costs)} frames")
+        print(report(baseline, costs, args.top))
+
+
+if __name__ == "__main__":
+    main()
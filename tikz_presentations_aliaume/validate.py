@@ -0,0 +1,439 @@
+"""
+Frame validation before TeX.
+
+Components name colours, styles and nodes with bare strings, and a typo
+only shows up at the end of a long xelatex run. ``Validator`` walks the
+recorded frames (before the optimisation passes) and reports:
+
+* colours of the colour options and of ``\\textcolor``-like commands
+  that are neither in the palette of ``ensps-colorscheme.sty`` (parsed
+  once, ``\\foreach`` loops included) nor base xcolor colours;
+* bare keys that are no known TikZ key, colour or style defined
+  earlier in the picture (warnings, the list of TikZ keys is not
+  exhaustive);
+* unbalanced braces in node contents, options and verbatim code;
+* references ``(name)`` and ``(name.anchor)`` to nodes that the
+  picture has not defined yet.
+
+Errors raise a ``ValidationError`` naming the frame and the function
+that emitted the faulty command, warnings are printed.
+"""
+
+import dataclasses
+import functools
+import re
+from typing import FrozenSet, List, Optional, Set, Tuple
+
+from tikz_presentations_aliaume import ir
+
+PALETTE_FILE = "ensps-colorscheme.sty"
+
+BASE_COLOURS = frozenset(
+    "red green blue cyan magenta yellow black white gray darkgray lightgray"
+    " brown lime olive orange pink purple teal violet none".split()
+)
+
+COLOUR_KEYS = frozenset(
+    [
+        "color",
+        "fill",
+        "draw",
+        "text",
+        "pattern color",
+        "top color",
+        "bottom color",
+        "left color",
+        "right color",
+        "inner color",
+        "outer color",
+        "ball color",
+    ]
+)
+
+# bare TikZ keys used by the decks, styles and colours aside
+TIKZ_KEYS = frozenset(
+    [
+        "draw",
+        "fill",
+        "thick",
+        "thin",
+        "very thick",
+        "very thin",
+        "ultra thick",
+        "ultra thin",
+        "semithick",
+        "dashed",
+        "dotted",
+        "densely dashed",
+        "densely dotted",
+        "loosely dashed",
+        "loosely dotted",
+        "double",
+        "circle",
+        "rectangle",
+        "ellipse",
+        "diamond",
+        "coordinate",
+        "state",
+        "initial",
+        "accepting",
+        "mirror",
+        "clip",
+        "sloped",
+        "midway",
+        "near start",
+        "near end",
+        "very near start",
+        "very near end",
+        "at start",
+        "at end",
+        "above",
+        "below",
+        "left",
+        "right",
+        "above left",
+        "above right",
+        "below left",
+        "below right",
+        "auto",
+        "swap",
+        "rounded corners",
+        "sharp corners",
+        "transform shape",
+        "overlay",
+        "smooth",
+        "decorate",
+        "reverse",
+    ]
+)
+
+DEFINITION = re.compile(r"\\(?:definecolor|colorlet)\s*\{([^}]*)\}")
+FOREACH = re.compile(r"\\foreach\s*((?:\\\w+\s*/?\s*)+)\s*in\s*\{")
+COLOUR_COMMAND = re.compile(r"\\(?:textcolor|color|colorbox|pagecolor)\s*\{([^}]*)\}")
+FCOLORBOX = re.compile(r"\\fcolorbox\s*\{([^}]*)\}\s*\{([^}]*)\}")
+REFERENCE = re.compile(r"\(\s*([A-Za-z_][\w\- ]*?)\s*(?:\.[^()]*)?\)")
+PATH_NAME = re.compile(r"\b(?:node|coordinate)\s*(?:\[[^\]]*\])?\s*\(([^)]+)\)")
+NAME_OPTION = re.compile(r"\bname\s*=\s*\{?([^,\]}]+)")
+PATH_OPTIONS = re.compile(r"\b(?:node|coordinate|pic)\s*\[([^\]]*)\]")
+
+# names TikZ defines in every picture
+BUILTIN_NAMES = frozenset(["current bounding box", "current page"])
+
+ENABLED = True
+
+
+def set_validation(enabled: bool):
+    global ENABLED
+    ENABLED = enabled
+
+
+def _group(text: str, start: int) -> int:
+    """index after the brace group opening at start"""
+    depth = 0
+    for i in range(start, len(text)):
+        if text[i] == "{":
+            depth += 1
+        elif text[i] == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    raise ValueError("unbalanced braces")
+
+
+def _expand(text: str) -> str:
+    """unroll the \\foreach loops of some TeX code"""
+    m = FOREACH.search(text)
+    if m is None:
+        return text
+    variables = re.findall(r"\\(\w+)", m.group(1))
+    end_list = _group(text, m.end() - 1)
+    values = [v.strip() for v in text[m.end() : end_list - 1].split(",")]
+    start_body = text.index("{", end_list)
+    end_body = _group(text, start_body)
+    body = text[start_body + 1 : end_body - 1]
+    unrolled = []
+    for value in values:
+        code = body
+        parts = value.split("/")
+        # longest names first, \name must not eat \names
+        for variable, part in sorted(
+            zip(variables, parts), key=lambda vp: len(vp[0]), reverse=True
+        ):
+            code = re.sub(r"\\" + variable + r"(?![A-Za-z])\s*", part, code)
+        unrolled.append(_expand(code))
+    return text[: m.start()] + "".join(unrolled) + _expand(text[end_body:])
+
+
+@functools.lru_cache(maxsize=None)
+def palette(path: str = PALETTE_FILE) -> Optional[FrozenSet[str]]:
+    """colours defined by a package, None when it cannot be read"""
+    try:
+        with open(path) as f:
+            code = "\n".join(
+                line for line in f.read().splitlines() if not line.startswith("%")
+            )
+    except FileNotFoundError:
+        return None
+    return frozenset(DEFINITION.findall(_expand(code)))
+
+
+@functools.lru_cache(maxsize=None)
+def colour_names(expression: str) -> Tuple[str, ...]:
+    """colours mixed by an xcolor expression such as A1!50!white"""
+    expression = expression.strip().lstrip("-")
+    if not expression or any(c in expression for c in "{:\\#"):
+        return ()
+    return tuple(
+        part.strip()
+        for part in expression.split("!")
+        if part and not part.strip().replace(".", "").isdigit()
+    )
+
+
+BRACE = re.compile(r"\\.|[{}]", re.DOTALL)
+TOKEN = re.compile(r"\\.|[{}]|[^\\{}]+", re.DOTALL)
+
+
+@functools.lru_cache(maxsize=None)
+def balanced(code: str) -> bool:
+    depth = 0
+    for m in BRACE.finditer(code):
+        if m.group() == "{":
+            depth += 1
+        elif m.group() == "}":
+            depth -= 1
+            if depth < 0:
+                return False
+    return depth == 0
+
+
+def _without_groups(code: str) -> str:
+    """code without its brace groups (node contents, option values)"""
+    out, depth = [], 0
+    for m in TOKEN.finditer(code):
+        if m.group() == "{":
+            depth += 1
+        elif m.group() == "}":
+            depth -= 1
+        elif depth == 0:
+            out.append(m.group())
+    return "".join(out)
+
+
+@functools.lru_cache(maxsize=None)
+def _code_colours(code: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """colours used and colours defined by some TeX code"""
+    used = [m.group(1) for m in COLOUR_COMMAND.finditer(code)]
+    for m in FCOLORBOX.finditer(code):
+        used += [m.group(1), m.group(2)]
+    return tuple(used), tuple(DEFINITION.findall(code))
+
+
+@functools.lru_cache(maxsize=None)
+def _path_facts(code: str) -> Tuple[FrozenSet[str], Tuple[str, ...], Tuple[str, ...]]:
+    """names defined, names referenced and verbatim options of a path"""
+    defined = frozenset(
+        name.strip() for name in PATH_NAME.findall(code) + NAME_OPTION.findall(code)
+    )
+    references = tuple(REFERENCE.findall(_without_groups(code)))
+    return defined, references, tuple(PATH_OPTIONS.findall(code))
+
+
+@functools.lru_cache(maxsize=None)
+def _split_options(text: str) -> Tuple[Tuple[str, object], ...]:
+    """(key, value) pairs of verbatim options, True for bare keys"""
+    pairs = []
+    depth, start = 0, 0
+    for i, c in enumerate(text + ","):
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+        elif c == "," and depth == 0:
+            part = text[start:i].strip()
+            start = i + 1
+            if part:
+                key, _, value = part.partition("=")
+                pairs.append((key.strip(), value.strip() if value else True))
+    return tuple(pairs)
+
+
+@functools.lru_cache(maxsize=None)
+def _option_facts(
+    options: ir.Options,
+) -> Tuple[Tuple[str, ...], Tuple[str, ...], Tuple[str, ...]]:
+    """bare keys, colour expressions and unbalanced values of options"""
+    keys: List[str] = []
+    colours: List[str] = []
+    unbalanced: List[str] = []
+    for key, value in options:
+        if key == "":
+            if not balanced(str(value)):
+                unbalanced.append(f"[{value}]")
+                continue
+            inner = _option_facts(_split_options(str(value)))
+            keys += inner[0]
+            colours += inner[1]
+            unbalanced += inner[2]
+        elif value is True:
+            keys.append(key)
+        elif key in COLOUR_KEYS and isinstance(value, str):
+            colours.append(value)
+        elif isinstance(value, str) and not balanced(value):
+            unbalanced.append(f"{key}={value}")
+    return tuple(keys), tuple(colours), tuple(unbalanced)
+
+
+@dataclasses.dataclass
+class Issue:
+    frame: int
+    origin: str
+    message: str
+
+    def __str__(self):
+        origin = f", emitted by {self.origin}" if self.origin else ""
+        return f"frame {self.frame}{origin}: {self.message}"
+
+
+class ValidationError(ValueError):
+    def __init__(self, errors: List[Issue]):
+        super().__init__(
+            f"{len(errors)} errors in the frames:\n"
+            + "\n".join(f"  {error}" for error in errors)
+        )
+        self.errors = errors
+
+
+class Validator:
+    def __init__(self, colours: Optional[FrozenSet[str]] = None):
+        self.colours = palette() if colours is None else colours
+        self.known = BASE_COLOURS | (self.colours or frozenset())
+        self.errors: List[Issue] = []
+        self.warnings: List[Issue] = []
+
+    def check(self, picture: ir.Scope, frame: int):
+        """record the issues of a frame"""
+        self.frame = frame
+        self.defined_colours: Set[str] = set()
+        self.styles: Set[str] = set()
+        self.names: Set[str] = set(BUILTIN_NAMES)
+        # names computed by TeX loops cannot be followed
+        self.dynamic_names = False
+        self._scope(picture, picture.origin)
+
+    def _error(self, origin: str, message: str):
+        self.errors.append(Issue(self.frame, origin, message))
+
+    def _warning(self, origin: str, message: str):
+        self.warnings.append(Issue(self.frame, origin, message))
+
+    def _scope(self, scope: ir.Scope, default: str):
+        self._options(scope.options, default)
+        for item in scope.items:
+            origin = scope.origins.get(id(item), default)
+            if isinstance(item, ir.Scope):
+                self._scope(item, origin)
+            elif isinstance(item, ir.Style):
+                self._options(item.options, origin)
+                self.styles.add(item.name)
+            elif isinstance(item, ir.Node):
+                self._options(item.options, origin)
+                self._code(str(item.contents), origin)
+                if isinstance(item.at, str):
+                    self._references(REFERENCE.findall(item.at), origin)
+                if item.name is not None:
+                    self.names.add(str(item.name))
+            elif isinstance(item, ir.Coordinate):
+                self._options(item.options, origin)
+                if isinstance(item.at, str):
+                    self._references(REFERENCE.findall(item.at), origin)
+                self.names.add(str(item.name))
+            elif isinstance(item, ir.Path):
+                self._options(item.options, origin)
+                # numeric coordinates neither name nor colour anything
+                code = " ".join(
+                    ir.fmt_operation(op)
+                    for op in item.spec
+                    if not isinstance(op, tuple)
+                )
+                if not balanced(code):
+                    self._code(code, origin)
+                    continue
+                defined, references, options = _path_facts(code)
+                self._references(references, origin, defined)
+                for text in options:
+                    self._options((("", text),), origin)
+                self._code(code, origin)
+                self.names |= defined
+            elif isinstance(item, ir.Raw):
+                self._code(item.code, origin)
+                self.names |= self._define(item.code)
+
+    def _options(self, options: ir.Options, origin: str):
+        try:
+            keys, colours, unbalanced = _option_facts(options)
+        except TypeError:
+            # unhashable values
+            keys, colours, unbalanced = _option_facts.__wrapped__(options)
+        for key in keys:
+            self._bare_key(key, origin)
+        for expression in colours:
+            self._colour(expression, origin)
+        for text in unbalanced:
+            self._error(origin, f"unbalanced braces in {text}")
+
+    def _bare_key(self, key: str, origin: str):
+        if (
+            key in TIKZ_KEYS
+            or key in self.styles
+            or "-" in key
+            or self.colours is None
+            or not colour_names(key)
+        ):
+            return
+        if all(self._known_colour(name) for name in colour_names(key)):
+            return
+        self._warning(origin, f"unknown key or style {key!r}")
+
+    def _known_colour(self, name: str) -> bool:
+        return name in self.known or name in self.defined_colours
+
+    def _colour(self, expression: str, origin: str):
+        if self.colours is None:
+            return
+        for name in colour_names(expression):
+            if not self._known_colour(name):
+                self._error(origin, f"unknown colour {name!r}")
+
+    def _code(self, code: str, origin: str):
+        if not balanced(code):
+            shown = code if len(code) < 60 else code[:57] + "..."
+            self._error(origin, f"unbalanced braces in {shown!r}")
+            return
+        used, defined = _code_colours(code)
+        self.defined_colours.update(defined)
+        for expression in used:
+            self._colour(expression, origin)
+
+    def _define(self, code: str) -> FrozenSet[str]:
+        """names defined by some code"""
+        defined = _path_facts(code)[0]
+        if any("\\" in name for name in defined):
+            self.dynamic_names = True
+        return defined
+
+    def _references(
+        self, references: Tuple[str, ...], origin: str, defined=frozenset()
+    ):
+        if self.dynamic_names:
+            return
+        for name in references:
+            if name not in self.names and name not in defined:
+                self._error(origin, f"reference to undefined node ({name})")
+
+    def report(self):
+        """print the warnings, raise the errors"""
+        for warning in self.warnings:
+            print(f"warning: {warning}")
+        if self.errors:
+            raise ValidationError(self.errors)